@@ -91,6 +91,19 @@ class PyBridgeNode(Node):
         """
         return Conversions.serialize_py_to_gd(self.game_state.state())
 
+    def characters_state(self):
+        """
+        Returns a serialized Dictionary of the characters and the selection only
+        """
+        return Conversions.serialize_py_to_gd(self.game_state.characters_state())
+
+    def meta_grid_delta(self):
+        """
+        Returns the meta grid cells changed since the last call as [Vector3, tile]
+        pairs, removed cells having the EMPTY_TILE (-1) tile
+        """
+        return Conversions.serialize_py_to_gd(self.game_state.pop_meta_grid_delta())
+
     def notify(self, signal_name, *args):
         """Receive GDScript signals"""
         print("receiving signal: ", signal_name)
@@ -95,6 +95,8 @@ func _handle_game_state_ready():
         char_id_to_idx[c['id']] = idx
         idx += 1
 
+    # the first meta grid delta holds every cell, so start from an empty grid
+    meta_grid.clear()
     draw_board()
     
 
@@ -107,14 +109,14 @@ func _handle_player_move_failed(a: Vector3, b: Vector3):
     draw_board()
 
 func draw_board():
-    # get board:  grids + character positions
-    game_state = pyb.state()
+    # get character positions only, the grids are drawn from deltas
+    game_state = pyb.characters_state()
     var selected_character_data = game_state['selected_character']
     var player_pos = selected_character_data['position']
-    var _meta_grid = game_state['meta_grid']
-    meta_grid.clear()
+    # only redraw the cells that changed. removed cells have tile -1 (GridMap.INVALID_CELL_ITEM)
+    var _meta_grid_delta = pyb.meta_grid_delta()
 
-    for item in _meta_grid:
+    for item in _meta_grid_delta:
         var vec = item[0]
         var tile = item[1]
         meta_grid.set_cell_item(vec.x, vec.y, vec.z, tile)
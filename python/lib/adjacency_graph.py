@@ -0,0 +1,145 @@
+from typing import List, Tuple
+import numpy as np
+
+
+class AdjacencyGraph:
+    """CSR (compressed sparse row) adjacency structure over terrain nodes"""
+
+    # the neighbors of node i are indices[offsets[i]:offsets[i + 1]], with matching
+    # edge costs, in the order of the directions they were built from
+
+    NULL_INDEX = -1
+
+    def __init__(self, node_positions, directions, y_weight, cache_node_tuples=True):
+        self.node_positions = np.asarray(node_positions, dtype=np.int32).reshape(-1, 3)
+        self.num_nodes = len(self.node_positions)
+
+        self._set_key_encoding()
+        self._keys = self.encode(self.node_positions)
+        self._key_order = np.argsort(self._keys, kind="stable")
+        self._sorted_keys = self._keys[self._key_order]
+
+        # Python-side lookups are much faster on small boards, but cost a tuple per node
+        self.node_tuples = None
+        self._node_index = None
+        if cache_node_tuples:
+            self.node_tuples = [tuple(p) for p in self.node_positions.tolist()]
+            self._node_index = {p: i for i, p in enumerate(self.node_tuples)}
+
+        self._build_edges(directions, y_weight)
+
+    def _set_key_encoding(self):
+        if self.num_nodes:
+            self._key_min = self.node_positions.min(axis=0).astype(np.int64)
+            span = self.node_positions.max(axis=0).astype(np.int64) - self._key_min
+        else:
+            self._key_min = np.zeros(3, dtype=np.int64)
+            span = np.zeros(3, dtype=np.int64)
+        # pad by one on each side so that direction offsets always encode in range
+        self._key_dims = span + 3
+
+    def encode(self, positions) -> np.ndarray:
+        """Encodes an (N, 3) array of positions into int64 keys, -1 when out of range"""
+        local = np.asarray(positions, dtype=np.int64).reshape(-1, 3) - self._key_min + 1
+        dx, dy, dz = self._key_dims
+        in_range = np.all((local >= 0) & (local < self._key_dims), axis=1)
+        keys = (local[:, 0] * dy + local[:, 1]) * dz + local[:, 2]
+        return np.where(in_range, keys, -1)
+
+    def lookup(self, positions) -> np.ndarray:
+        """Returns the node index of each position in an (N, 3) array, or NULL_INDEX"""
+        keys = self.encode(positions)
+        if self.num_nodes == 0:
+            return np.full(len(keys), AdjacencyGraph.NULL_INDEX, dtype=np.int32)
+        found_at = np.clip(
+            np.searchsorted(self._sorted_keys, keys), 0, self.num_nodes - 1
+        )
+        found = (self._sorted_keys[found_at] == keys) & (keys >= 0)
+        return np.where(
+            found, self._key_order[found_at], AdjacencyGraph.NULL_INDEX
+        ).astype(np.int32)
+
+    def _build_edges(self, directions, y_weight):
+        sources = []
+        targets = []
+        costs = []
+        node_range = np.arange(self.num_nodes, dtype=np.int32)
+        for direction in directions:
+            dx, dy, dz = direction
+            target_idx = self.lookup(self.node_positions + np.array(direction))
+            found = target_idx != AdjacencyGraph.NULL_INDEX
+            sources.append(node_range[found])
+            targets.append(target_idx[found])
+            cost = abs(dx) + (abs(dy) * y_weight) + abs(dz)
+            costs.append(np.full(np.count_nonzero(found), cost, dtype=np.float32))
+
+        sources = np.concatenate(sources) if sources else np.zeros(0, np.int32)
+        # a stable sort keeps each node's edges in direction order
+        edge_order = np.argsort(sources, kind="stable")
+        self.indices = (
+            np.concatenate(targets)[edge_order].astype(np.int32)
+            if targets
+            else np.zeros(0, np.int32)
+        )
+        self.costs = (
+            np.concatenate(costs)[edge_order] if costs else np.zeros(0, np.float32)
+        )
+        self.offsets = np.zeros(self.num_nodes + 1, dtype=np.int32)
+        np.cumsum(np.bincount(sources, minlength=self.num_nodes), out=self.offsets[1:])
+        # plain lists make single edge lookups (see edge_cost) cheap, at a cost per edge
+        self._indices_list = None
+        if self.node_tuples is not None:
+            self._offsets_list = self.offsets.tolist()
+            self._indices_list = self.indices.tolist()
+            self._costs_list = self.costs.tolist()
+
+    def index_of(self, position) -> int:
+        """Returns the node index of an (x, y, z) position, or NULL_INDEX"""
+        if self._node_index is not None:
+            try:
+                return self._node_index.get(tuple(position), AdjacencyGraph.NULL_INDEX)
+            except TypeError:
+                return AdjacencyGraph.NULL_INDEX
+        return int(self.lookup([position])[0])
+
+    def position_of(self, index) -> Tuple[int, int, int]:
+        if self.node_tuples is not None:
+            return self.node_tuples[index]
+        return tuple(self.node_positions[index].tolist())
+
+    def positions_of(self, indices) -> List[Tuple[int, int, int]]:
+        if self.node_tuples is not None:
+            node_tuples = self.node_tuples
+            return [node_tuples[i] for i in indices]
+        return [tuple(p) for p in self.node_positions[indices].tolist()]
+
+    def neighbor_indices(self, index) -> np.ndarray:
+        return self.indices[self.offsets[index] : self.offsets[index + 1]]
+
+    def neighbor_costs(self, index) -> np.ndarray:
+        return self.costs[self.offsets[index] : self.offsets[index + 1]]
+
+    def neighbors(self, position) -> List[Tuple[int, int, int]]:
+        """Returns the neighboring positions of a node, or None for other positions"""
+        index = self.index_of(position)
+        if index == AdjacencyGraph.NULL_INDEX:
+            return None
+        return self.positions_of(self.neighbor_indices(index).tolist())
+
+    def edge_cost(self, source, target) -> float:
+        """Returns the cost of the edge between two positions, or None"""
+        source_index = self.index_of(source)
+        target_index = self.index_of(target)
+        if AdjacencyGraph.NULL_INDEX in (source_index, target_index):
+            return None
+        if self._indices_list is None:
+            start = self.offsets[source_index]
+            edges = np.flatnonzero(self.neighbor_indices(source_index) == target_index)
+            return float(self.costs[start + edges[0]]) if len(edges) else None
+        start = self._offsets_list[source_index]
+        end = self._offsets_list[source_index + 1]
+        try:
+            edge = self._indices_list.index(target_index, start, end)
+        except ValueError:
+            return None
+        return self._costs_list[edge]
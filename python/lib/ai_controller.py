@@ -0,0 +1,146 @@
+import math
+import random
+import time
+
+from .tactical_state import TacticalState
+
+
+class SearchNode:
+    """Node of the Monte Carlo search tree, reached by `action` played by `team`"""
+
+    __slots__ = ("action", "team", "visits", "value", "children", "untried_actions")
+
+    def __init__(self, action, team, untried_actions):
+        self.action = action
+        self.team = team
+        self.visits = 0
+        # sum of rewards from the point of view of the team that played the action
+        self.value = 0.0
+        self.children = []
+        self.untried_actions = untried_actions
+
+
+class AIController:
+    """Time-budgeted Monte Carlo tree search (UCT) over move + attack actions"""
+
+    # every iteration walks the tree on a single forked TacticalState, plays a short
+    # random playout and then undoes every action, so no state is copied after the fork
+
+    DEFAULT_TIME_BUDGET = 0.25
+    DEFAULT_PLAYOUT_DEPTH = 8
+    EXPLORATION = 1.4
+
+    def __init__(
+        self,
+        team_id,
+        time_budget=DEFAULT_TIME_BUDGET,
+        playout_depth=DEFAULT_PLAYOUT_DEPTH,
+        max_iterations=None,
+        rng=None,
+    ):
+        self.team_id = team_id
+        self.time_budget = time_budget
+        self.playout_depth = playout_depth
+        self.max_iterations = max_iterations
+        self.rng = rng if rng is not None else random.Random()
+        # statistics of the last search
+        self.iterations = 0
+        self.playouts_per_second = 0.0
+
+    def search(self, state: TacticalState):
+        """Returns the most visited (move to, target index) action of the unit"""
+        actions = state.legal_actions()
+        if len(actions) <= 1:
+            return actions[0] if actions else None
+
+        root = SearchNode(None, None, actions)
+        self.rng.shuffle(root.untried_actions)
+        started = time.perf_counter()
+        iterations = 0
+        while True:
+            if self.max_iterations is not None and iterations >= self.max_iterations:
+                break
+            if (
+                self.max_iterations is None
+                and time.perf_counter() - started >= self.time_budget
+            ):
+                break
+            self._iterate(root, state)
+            iterations += 1
+
+        elapsed = time.perf_counter() - started
+        self.iterations = iterations
+        self.playouts_per_second = iterations / elapsed if elapsed > 0 else 0.0
+        best = max(root.children, key=lambda child: child.visits)
+        return best.action
+
+    def _iterate(self, root, state):
+        node = root
+        path = [root]
+        depth = 0
+
+        # selection
+        while not node.untried_actions and node.children:
+            node = self._select_child(node)
+            state.apply(node.action)
+            path.append(node)
+            depth += 1
+
+        # expansion
+        if node.untried_actions and not state.is_terminal():
+            action = node.untried_actions.pop()
+            team = state.current_team()
+            state.apply(action)
+            depth += 1
+            untried_actions = [] if state.is_terminal() else state.legal_actions()
+            self.rng.shuffle(untried_actions)
+            child = SearchNode(action, team, untried_actions)
+            node.children.append(child)
+            node = child
+            path.append(node)
+
+        # playout
+        playout_moves = 0
+        while playout_moves < self.playout_depth and not state.is_terminal():
+            state.apply(state.random_action(self.rng))
+            playout_moves += 1
+        reward = state.evaluate(self.team_id)
+        for _ in range(playout_moves + depth):
+            state.undo()
+
+        # backpropagation
+        for n in path:
+            n.visits += 1
+            if n.team is not None:
+                n.value += reward if n.team == self.team_id else -reward
+
+    def _select_child(self, node):
+        log_visits = math.log(node.visits)
+        exploration = AIController.EXPLORATION
+        return max(
+            node.children,
+            key=lambda c: c.value / c.visits
+            + exploration * math.sqrt(log_visits / c.visits),
+        )
+
+    def take_turn(self, game_state, character):
+        """Searches from the current game state and plays character's chosen action"""
+        state, characters = game_state.fork()
+        state.current_unit = game_state.get_character_index(character)
+        action = self.search(state)
+        if action is None:
+            return None
+        move_to, target = action
+        target_character = (
+            None if target == TacticalState.NO_TARGET else characters[target]
+        )
+        game_state.perform_action(character, move_to, target_character)
+        return move_to, target_character
+
+
+class RandomController(AIController):
+    """Baseline controller that plays the playout policy's action without searching"""
+
+    def search(self, state: TacticalState):
+        self.iterations = 0
+        return state.random_action(self.rng)
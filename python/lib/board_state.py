@@ -1,7 +1,20 @@
+from collections import OrderedDict
+from heapq import heappush, heappop
 from typing import List, Tuple
 from astar import AStar
 import numpy as np
 
+from .adjacency_graph import AdjacencyGraph
+from .chunked_terrain import ChunkedTerrain
+from .column_heightmap import ColumnHeightmap
+from .flow_field import FlowField
+from .occupancy import OccupancyLayer
+from .path_cache import PathCache
+from .spatial_index import SpatialIndex
+from .subscribable import Subscribable
+from .terrain_file import TerrainFile
+from .voxel_grid import VoxelGrid
+
 
 class BoardState(AStar):
     ALLOW_INVALID_MOVES = True
@@ -15,9 +28,22 @@ class BoardState(AStar):
     ENEMY_TILE = 2
     NEIGHBOR_TILE = 3
 
+    # meta grid layers, lowest precedence first
+    META_GRID_LAYER_ORDER = [MOVABLE_TILE, NEIGHBOR_TILE, FRIENDLY_TILE, ENEMY_TILE]
+
+    # invalidation events, sent with (old version, new version, changed region)
+    TERRAIN_CHANGED = "TERRAIN_CHANGED"
+    OCCUPANCY_CHANGED = "OCCUPANCY_CHANGED"
+    CHARACTERS_CHANGED = "CHARACTERS_CHANGED"
+    INVALIDATION_EVENTS = [TERRAIN_CHANGED, OCCUPANCY_CHANGED, CHARACTERS_CHANGED]
+
     DEFAULT_DISTANCE_BUDGET = 3
+    FLOW_FIELD_CACHE_SIZE = 16
     DEFAULT_GROUND_LEVEL_Y = 0
     MASK_DEFAULT_PIVOT_VALUE = -1
+    # mask content -> offsets, least recently used first, see compile_2d_mask
+    _COMPILED_MASK_CACHE = OrderedDict()
+    MAX_COMPILED_MASKS = 256
 
     NEIGHBORING_DIRECTIONS_MASK = [
         # forward,backward,left,right - own level
@@ -53,6 +79,13 @@ class BoardState(AStar):
                     grid[pos] = tile
         return grid
 
+    @staticmethod
+    def from_terrain_file(path, **kwargs):
+        """Create a BoardState over a memory-mapped terrain file from TerrainFile"""
+        # extra keyword arguments are passed on to ChunkedTerrain
+        heightfield, origin = TerrainFile.open(path)
+        return BoardState(ChunkedTerrain(heightfield, origin=origin, **kwargs))
+
     @staticmethod
     def create_2d_position_list_from_2d_mask(
         array_2d_mask, mask_shape_tup, grid_pivot_pos=(0, 0)
@@ -92,17 +125,181 @@ class BoardState(AStar):
                     grid_map[out_pos] = mask_val
         return grid_map
 
-    def __init__(self, _grid_map):
+    @staticmethod
+    def compile_2d_mask(mask_2d) -> np.ndarray:
+        """Compiles a 2D mask into a cached, read-only (K, 2) array of pivot offsets"""
+        key = (
+            tuple(tuple(row) for row in mask_2d["mask"]),
+            tuple(mask_2d["shape"]),
+        )
+        cache = BoardState._COMPILED_MASK_CACHE
+        offsets = cache.get(key)
+        if offsets is not None:
+            cache.move_to_end(key)
+            return offsets
+
+        positions_2d_mask = BoardState.create_2d_position_list_from_2d_mask(
+            mask_2d["mask"], mask_2d["shape"]
+        )
+        offsets = np.array(list(positions_2d_mask.keys()), dtype=np.int16)
+        offsets = offsets.reshape(-1, 2)
+        offsets.setflags(write=False)
+        cache[key] = offsets
+        while len(cache) > BoardState.MAX_COMPILED_MASKS:
+            cache.popitem(last=False)
+        return offsets
+
+    def __init__(self, _grid_map, dense=False):
         self.grid_map = _grid_map
+        # when dense, terrain is stored in a bounded occupancy volume instead of a dict
+        self.dense = dense
+        # chunked terrain is loaded lazily from disk, so no board-wide indices are built
+        self.chunked = isinstance(_grid_map, ChunkedTerrain)
         self.terrain_grid = {}
         self.terrain_grid_2d = {}
         self.meta_grid = {}
+        self.meta_grid_layers = {
+            tile: set() for tile in BoardState.META_GRID_LAYER_ORDER
+        }
+        self.meta_grid_delta = {}
+
+        # increasing versions of the terrain, the units on it and their state
+        self.terrain_version = 0
+        self.character_version = 0
+        # derived caches register here to be told which region a change touched
+        self.invalidation_bus = Subscribable()
+        self.occupancy = OccupancyLayer(on_change=self._on_occupancy_changed)
+        # team whose passability neighbors() applies during a search, None ignores units
+        self.moving_team = None
+        self.path_cache = PathCache(distance=self.dist)
+        # (goals, team, terrain_version, occupancy key) -> FlowField, in LRU order
+        self.flow_fields = OrderedDict()
+        self.register_cache(self)
 
         # initialize the immutable terrain grid
         self._set_terrain_grid(self.grid_map)
 
+    @property
+    def occupancy_version(self):
+        return self.occupancy.version
+
+    def _occupancy_key(self, team_id):
+        """Searches that ignore units stay valid however the units move"""
+        if team_id is None:
+            return None
+        return (team_id, self.occupancy.version)
+
+    # Cache invalidation
+
+    def register_cache(self, cache):
+        """Attaches a cache to the invalidation bus"""
+        # cache.invalidate(event, old_version, new_version, region) is called after
+        # every change, region being the changed positions (or character ids) or None
+        self.invalidation_bus.subscribe(
+            {event: cache.invalidate for event in BoardState.INVALIDATION_EVENTS}
+        )
+
+    def unregister_cache(self, cache):
+        self.invalidation_bus.unsubscribe(
+            {event: cache.invalidate for event in BoardState.INVALIDATION_EVENTS}
+        )
+
+    def _on_occupancy_changed(self, old_version, new_version, changed_positions):
+        self.invalidation_bus.send(
+            BoardState.OCCUPANCY_CHANGED,
+            BoardState.OCCUPANCY_CHANGED,
+            old_version,
+            new_version,
+            changed_positions,
+        )
+
+    def mark_characters_changed(self, character_ids=None):
+        """Bumps character_version after characters took damage or switched teams"""
+        old_version = self.character_version
+        self.character_version += 1
+        self.invalidation_bus.send(
+            BoardState.CHARACTERS_CHANGED,
+            BoardState.CHARACTERS_CHANGED,
+            old_version,
+            self.character_version,
+            None if character_ids is None else list(character_ids),
+        )
+
+    def invalidate(self, event, old_version, new_version, region):
+        """Carries the path cache and flow fields over a change"""
+        if event == BoardState.TERRAIN_CHANGED:
+            if region is None:
+                self.path_cache.clear()
+            else:
+                self.path_cache.carry_over(
+                    lambda key: key[:2] + (new_version,) + key[3:]
+                    if key[2] == old_version
+                    else None,
+                    region,
+                )
+            # flow fields cover the whole connected board, so always drop them
+            self.flow_fields.clear()
+        elif event == BoardState.OCCUPANCY_CHANGED:
+            # only searches for a team read the occupancy
+            def rekey_path(key):
+                if key[3] is None or key[3][1] != old_version:
+                    return None
+                return key[:3] + ((key[3][0], new_version),)
+
+            self.path_cache.carry_over(rekey_path, region)
+            self._carry_over_flow_fields(old_version, new_version, region)
+
+    def _carry_over_flow_fields(
+        self, old_occupancy_version, new_occupancy_version, region
+    ):
+        fields = OrderedDict()
+        for key, flow_field in self.flow_fields.items():
+            goals, team_id, terrain_version, occupancy_key = key
+            if occupancy_key is None or occupancy_key[1] != old_occupancy_version:
+                fields[key] = flow_field
+                continue
+            if not flow_field.is_affected_by(region):
+                new_key = (
+                    goals,
+                    team_id,
+                    terrain_version,
+                    (team_id, new_occupancy_version),
+                )
+                fields[new_key] = flow_field
+        self.flow_fields = fields
+
+    def update_terrain(self, added=[], removed=[]):
+        """Adds and removes terrain tiles, caches only drop what the tiles can affect"""
+        if self.chunked:
+            raise ValueError("chunked terrain is read-only")
+        added = [tuple(p) for p in added]
+        removed = set(tuple(p) for p in removed)
+        positions = [p for p in self.terrain_grid if p not in removed]
+        positions += [p for p in added if p not in self.terrain_grid]
+        self._set_terrain_grid(positions, region=list(removed) + added)
+
     # Astar methods
 
+    def astar(self, start, goal, reversePath=False, team_id=None):
+        """A* search answered from the path cache whenever possible"""
+        # when team_id is given, paths go through friendly units but not enemy units
+        start = tuple(start)
+        goal = tuple(goal)
+        occupancy_key = self._occupancy_key(team_id)
+        path = self.path_cache.get(start, goal, self.terrain_version, occupancy_key)
+        if path is PathCache.NOT_CACHED:
+            previous_team = self.moving_team
+            self.moving_team = team_id
+            try:
+                found_path = super().astar(start, goal)
+            finally:
+                self.moving_team = previous_team
+            path = None if found_path is None else tuple(found_path)
+            self.path_cache.put(start, goal, self.terrain_version, occupancy_key, path)
+        if path is None:
+            return None
+        return list(reversed(path)) if reversePath else list(path)
+
     def dist(self, n1, n2):
         return self.manhattan_dist(n1, n2)
 
@@ -119,31 +316,123 @@ class BoardState(AStar):
         self, pivot_position, mask_2d
     ) -> List[Tuple[int, int, int]]:
         x, _, z = pivot_position
-        grid_pivot_pos_2d = (x, z)
-        positions_2d_mask = BoardState.create_2d_position_list_from_2d_mask(
-            mask_2d["mask"], mask_2d["shape"], grid_pivot_pos=grid_pivot_pos_2d
+        positions_2d = BoardState.compile_2d_mask(mask_2d) + np.array(
+            [x, z], dtype=np.int64
+        )
+        positions_3d, valid = self.get_grid_pos_2d_batch(positions_2d)
+        return [tuple(p) for p in positions_3d[valid].tolist()]
+
+    def get_attack_areas(
+        self, pivot_positions, masks_2d
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Batched get_neighbors_by_2d_mask, returns (M, 3) tiles and their units"""
+        pivots = np.asarray(pivot_positions, dtype=np.int64).reshape(-1, 3)
+        pivots_2d = pivots[:, [0, 2]]
+        # one vectorized pass per distinct mask
+        units_by_mask = {}
+        for unit_idx, mask_2d in enumerate(masks_2d):
+            units_by_mask.setdefault(id(mask_2d), (mask_2d, []))[1].append(unit_idx)
+
+        positions_2d = [np.zeros((0, 2), dtype=np.int64)]
+        owners = [np.zeros(0, dtype=np.int64)]
+        for mask_2d, unit_indices in units_by_mask.values():
+            offsets = BoardState.compile_2d_mask(mask_2d)
+            unit_indices = np.array(unit_indices, dtype=np.int64)
+            tiles_2d = (
+                pivots_2d[unit_indices, np.newaxis, :] + offsets[np.newaxis, :, :]
+            )
+            positions_2d.append(tiles_2d.reshape(-1, 2))
+            owners.append(np.repeat(unit_indices, len(offsets)))
+
+        positions_3d, valid = self.get_grid_pos_2d_batch(np.concatenate(positions_2d))
+        return positions_3d[valid], np.concatenate(owners)[valid]
+
+    def get_attack_pairs(
+        self, pivot_positions, masks_2d, target_positions=None
+    ) -> np.ndarray:
+        """Returns a (P, 2) array of (attacker, target) index pairs in range"""
+        # targets default to the attackers themselves
+        pivot_positions = np.asarray(pivot_positions, dtype=np.int64).reshape(-1, 3)
+        targets_are_attackers = target_positions is None
+        if targets_are_attackers:
+            target_positions = pivot_positions
+        target_positions = np.asarray(target_positions, dtype=np.int64).reshape(-1, 3)
+
+        tiles, owners = self.get_attack_areas(pivot_positions, masks_2d)
+        if len(tiles) == 0 or len(target_positions) == 0:
+            return np.zeros((0, 2), dtype=np.int64)
+
+        # give every distinct position an id, then map tile ids to the target there
+        _, position_ids = np.unique(
+            np.concatenate([target_positions, tiles]), axis=0, return_inverse=True
         )
-        positions_3d = []
-        for pos_2d in positions_2d_mask:
-            pos_3d = self.get_grid_pos_2d(pos_2d)
-            if pos_3d:
-                positions_3d.append(pos_3d)
-        return positions_3d
+        position_ids = position_ids.reshape(-1)
+        target_ids = position_ids[: len(target_positions)]
+        tile_ids = position_ids[len(target_positions) :]
+        target_at = np.full(position_ids.max() + 1, -1, dtype=np.int64)
+        target_at[target_ids] = np.arange(len(target_positions))
+
+        tile_targets = target_at[tile_ids]
+        hit = tile_targets >= 0
+        if targets_are_attackers:
+            hit &= tile_targets != owners
+        return np.stack([owners[hit], tile_targets[hit]], axis=1)
 
     def get_nearest_node_from_position(self, position):
-        all_positions = list(self.terrain_grid.keys())
-        return self.get_nearest_node_from_nodes(position, all_positions)
+        if self.chunked:
+            nearest = self.terrain_grid.k_nearest(
+                position, k=1, y_weight=BoardState.Y_WEIGHT_EUCLID
+            )
+            return nearest[0] if nearest else (None, float("INF"))
+        node_index, distance = self.spatial_index.nearest_index(position)
+        if node_index is None:
+            return None, distance
+        return self.adjacency.position_of(node_index), distance
+
+    def get_k_nearest_nodes_from_position(self, position, k):
+        """Returns up to k (node, distance) pairs, nearest first"""
+        if self.chunked:
+            return self.terrain_grid.k_nearest(
+                position, k=k, y_weight=BoardState.Y_WEIGHT_EUCLID
+            )
+        return [
+            (self.adjacency.position_of(node_index), distance)
+            for node_index, distance in self.spatial_index.k_nearest_indices(
+                position, k
+            )
+        ]
 
     def get_nearest_node_from_nodes(self, position, nodes_list):
         # TODO: make this configurable in which distance function it uses
-        min_distance = float("INF")
-        min_distance_pos = None
-        for neighbor_position in nodes_list:
-            n_dist = self.euclidean_distance(position, neighbor_position)
-            if n_dist <= min_distance:
-                min_distance = n_dist
-                min_distance_pos = neighbor_position
-        return min_distance_pos, min_distance
+        if len(nodes_list) == 0:
+            return None, float("INF")
+        distances = self.euclidean_distances(nodes_list, position)
+        # pick the last of any tied nodes, matching a linear `<=` scan
+        nearest_idx = len(distances) - 1 - int(np.argmin(distances[::-1]))
+        return nodes_list[nearest_idx], distances[nearest_idx]
+
+    @staticmethod
+    def _node_deltas(nodes, others):
+        """Per-axis differences between nodes and one point or an (M, 3) array"""
+        nodes_np = np.asarray(nodes, dtype=np.float64).reshape(-1, 3)
+        others_np = np.asarray(others, dtype=np.float64)
+        if others_np.ndim == 1:
+            deltas = others_np - nodes_np
+        else:
+            deltas = (
+                others_np.reshape(-1, 3)[np.newaxis, :, :] - nodes_np[:, np.newaxis, :]
+            )
+        return deltas[..., 0], deltas[..., 1], deltas[..., 2]
+
+    def euclidean_distances(self, nodes, others) -> np.ndarray:
+        """Vectorized euclidean_distance against one point or an (M, 3) array"""
+        dx, dy, dz = BoardState._node_deltas(nodes, others)
+        return np.sqrt((dx**2) + ((dy**2) * BoardState.Y_WEIGHT_EUCLID) + (dz**2))
+
+    def manhattan_distances(self, nodes, others) -> np.ndarray:
+        """Vectorized manhattan_dist against one point or an (M, 3) array"""
+        dx, dy, dz = BoardState._node_deltas(nodes, others)
+        return np.abs(dx) + (np.abs(dy) * BoardState.Y_WEIGHT) + np.abs(dz)
 
     def manhattan_dist(self, n1, n2):
         (x1, y1, z1) = n1
@@ -155,53 +444,194 @@ class BoardState(AStar):
         return self.dist(n1, n2)
 
     def distance_between(self, n1, n2):
-        """this method always returns 1, as two 'neighbors' are always adajcent"""
+        """cost of the edge between two neighbors, from the adjacency graph if built"""
+        if self.adjacency is not None:
+            cost = self.adjacency.edge_cost(n1, n2)
+            if cost is not None:
+                return cost
         return self.dist(n1, n2)
 
     def neighbors(self, node):
-        """for a given coordinate in the maze, returns up to 4 adjacent(north,east,south,west)
-        nodes that can be reached (=any adjacent coordinate that is not a wall)
+        """for a given coordinate in the maze, returns up to 12 adjacent nodes
+        that can be reached (see NEIGHBORING_DIRECTIONS_MASK)
         """
-        node_np = np.array(node)
+        if self.adjacency is None:
+            neighbors = self._neighbors_by_directions(node)
+        else:
+            neighbors = self.adjacency.neighbors(node)
+            if neighbors is None:
+                # node is not on the terrain, so it has no precomputed edges
+                neighbors = self._neighbors_by_directions(node)
+        if self.moving_team is not None and len(self.occupancy):
+            neighbors = [
+                n for n in neighbors if self.occupancy.is_passable(n, self.moving_team)
+            ]
+        return neighbors
+
+    def _neighbors_by_directions(self, node):
+        x, y, z = (int(v) for v in node)
         neighbors = []
-        for direction in BoardState.NEIGHBORING_DIRECTIONS_MASK:
-            dir_np = np.array(direction)
-            dir_tup = tuple(dir_np + node_np)
+        for dx, dy, dz in BoardState.NEIGHBORING_DIRECTIONS_MASK:
+            dir_tup = (x + dx, y + dy, z + dz)
             if not self.is_empty_tile(dir_tup):
                 neighbors.append(dir_tup)
         return neighbors
 
-    def movable_area(self, root, distance_budget=DEFAULT_DISTANCE_BUDGET):
-        """BFS algo for creating a movable area"""
-        q = [root]
-        discovered = set([root])
-        # set.add(root)
-        while len(q):
-            v = q.pop(0)
-            if self.distance_between(v, root) >= distance_budget:
-                return list(discovered)
+    def get_flow_field(self, goals, team_id=None) -> FlowField:
+        """Returns a FlowField towards goals, shared by every unit seeking them"""
+        # when team_id is given, tiles held by other teams are impassable
+        if self.adjacency is None:
+            raise ValueError(
+                "flow fields need a board with a precomputed adjacency graph"
+            )
+        goals = tuple(sorted(set(tuple(g) for g in goals)))
+        key = (goals, team_id, self.terrain_version, self._occupancy_key(team_id))
+        if key in self.flow_fields:
+            self.flow_fields.move_to_end(key)
+            return self.flow_fields[key]
+
+        blocked = None
+        if team_id is not None and len(self.occupancy):
+            enemy_positions = self.occupancy.blocked_positions(team_id)
+            blocked = np.zeros(self.adjacency.num_nodes, dtype=bool)
+            if enemy_positions:
+                enemy_indices = self.adjacency.lookup(enemy_positions)
+                found = enemy_indices != AdjacencyGraph.NULL_INDEX
+                blocked[enemy_indices[found]] = True
+
+        flow_field = FlowField(self.adjacency, goals, blocked=blocked)
+        self.flow_fields[key] = flow_field
+        while len(self.flow_fields) > BoardState.FLOW_FIELD_CACHE_SIZE:
+            self.flow_fields.popitem(last=False)
+        return flow_field
+
+    def movable_area(self, root, distance_budget=DEFAULT_DISTANCE_BUDGET, team_id=None):
+        """Returns every node within distance_budget path cost from root"""
+        # when team_id is given, nodes held by other units are left out
+        costs, _ = self.reachable_area(
+            root, distance_budget=distance_budget, team_id=team_id
+        )
+        if team_id is None:
+            return list(costs.keys())
+        root = tuple(root)
+        return [n for n in costs if n == root or n not in self.occupancy]
+
+    def reachable_area(
+        self, root, distance_budget=DEFAULT_DISTANCE_BUDGET, team_id=None
+    ):
+        """Dijkstra flood fill, returns Dict[node, cost] and Dict[node, predecessor]"""
+        # costs include the Y_WEIGHT elevation penalty and are in settling order; when
+        # team_id is given, the fill passes through friendly units but not enemy units
+        previous_team = self.moving_team
+        self.moving_team = team_id
+        try:
+            return self._reachable_area(root, distance_budget)
+        finally:
+            self.moving_team = previous_team
+
+    def _reachable_area(self, root, distance_budget):
+        costs = {}
+        predecessors = {root: None}
+        tentative_costs = {root: 0}
+        # the counter breaks cost ties in discovery order, so results are deterministic
+        counter = 0
+        q = [(0, counter, root)]
+        while q:
+            cost, _, v = heappop(q)
+            if v in costs:
+                continue
+            costs[v] = cost
             for neighbor in self.neighbors(v):
-                if neighbor not in discovered:
-                    discovered.add(neighbor)
-                    q.append(neighbor)
-        return list(discovered)
+                if neighbor in costs:
+                    continue
+                neighbor_cost = cost + self.distance_between(v, neighbor)
+                if neighbor_cost > distance_budget:
+                    continue
+                if neighbor_cost < tentative_costs.get(neighbor, float("INF")):
+                    tentative_costs[neighbor] = neighbor_cost
+                    predecessors[neighbor] = v
+                    counter += 1
+                    heappush(q, (neighbor_cost, counter, neighbor))
+        return costs, predecessors
+
+    @staticmethod
+    def path_from_predecessors(predecessors, target) -> List[Tuple[int, int, int]]:
+        """Walks a predecessor map from reachable_area back to its root, or None"""
+        if target not in predecessors:
+            return None
+        path = []
+        node = target
+        while node is not None:
+            path.append(node)
+            node = predecessors[node]
+        path.reverse()
+        return path
 
     def setup(self):
         pass
 
-    def _set_terrain_grid(self, grid_map_position_list):
+    def _set_terrain_grid(self, grid_map_position_list, region=None):
         print("creating terrain grid")
 
-        self.terrain_grid = {}
-        self.terrain_grid_2d = {}
-        for p in grid_map_position_list:
-            self.set_grid_pos(self.terrain_grid, p, BoardState.FILLED_TILE)
-            x, y, z = p
-            pos_2d = (x, z)
-            if pos_2d not in self.terrain_grid_2d:
-                self.terrain_grid_2d[pos_2d] = []
-            # adds a 2D-representation of the board for certain 2-d only operations
-            self.terrain_grid_2d[pos_2d].append(p)
+        self._build_terrain_grid(grid_map_position_list)
+        old_version = self.terrain_version
+        self.terrain_version += 1
+        self.invalidation_bus.send(
+            BoardState.TERRAIN_CHANGED,
+            BoardState.TERRAIN_CHANGED,
+            old_version,
+            self.terrain_version,
+            region,
+        )
+
+    def _build_terrain_grid(self, grid_map_position_list):
+        if self.chunked:
+            self.terrain_grid = grid_map_position_list
+            self.terrain_grid_2d = self.terrain_grid.columns()
+            # chunked terrain answers column queries, neighbors are found on demand
+            self.adjacency = None
+            self.heightmap = self.terrain_grid
+            self.spatial_index = None
+            return
+
+        if self.dense:
+            self.terrain_grid = VoxelGrid.from_positions(
+                list(grid_map_position_list), BoardState.FILLED_TILE
+            )
+            # 2D columns are derived from the occupancy volume on demand
+            self.terrain_grid_2d = self.terrain_grid.columns()
+        else:
+            self.terrain_grid = {}
+            self.terrain_grid_2d = {}
+            for p in grid_map_position_list:
+                self.set_grid_pos(self.terrain_grid, p, BoardState.FILLED_TILE)
+                x, y, z = p
+                pos_2d = (x, z)
+                if pos_2d not in self.terrain_grid_2d:
+                    self.terrain_grid_2d[pos_2d] = []
+                # adds a 2D-representation of the board for certain 2-d only operations
+                self.terrain_grid_2d[pos_2d].append(p)
+
+        self._build_terrain_indices()
+
+    def _build_terrain_indices(self):
+        """Precomputes the lookup structures of the (immutable) terrain grid"""
+        if self.dense:
+            node_positions = self.terrain_grid.positions()
+        else:
+            node_positions = list(self.terrain_grid.keys())
+
+        # node indices follow the iteration order of the terrain grid
+        self.adjacency = AdjacencyGraph(
+            node_positions,
+            BoardState.NEIGHBORING_DIRECTIONS_MASK,
+            BoardState.Y_WEIGHT,
+            cache_node_tuples=not self.dense,
+        )
+        self.heightmap = ColumnHeightmap(self.adjacency.node_positions)
+        self.spatial_index = SpatialIndex(
+            self.adjacency.node_positions, y_weight=BoardState.Y_WEIGHT_EUCLID
+        )
 
     def is_empty_tile(self, pos):
         grid_value = self.get_grid_pos(self.terrain_grid, pos)
@@ -218,13 +648,12 @@ class BoardState(AStar):
         return True
 
     def get_grid_pos_2d(self, position: Tuple[int, int]) -> Tuple[int, int, int]:
-        if position in self.terrain_grid_2d:
-            # return the max y (i.e. hieghest position in vertical stack)
-            max_y_pos = max(self.terrain_grid_2d[position], key=lambda x: x[1])
-            if max_y_pos in self.terrain_grid:
-                return max_y_pos
-        else:
-            return None
+        # return the max y (i.e. hieghest position in vertical stack)
+        return self.heightmap.top(position)
+
+    def get_grid_pos_2d_batch(self, positions_2d) -> Tuple[np.ndarray, np.ndarray]:
+        """Batched get_grid_pos_2d, returns (K, 3) column tops and a (K,) exists mask"""
+        return self.heightmap.top_batch(positions_2d)
 
     def get_grid_pos(self, grid, position):
         if position in grid:
@@ -246,23 +675,42 @@ class BoardState(AStar):
         enemy_tiles=[],
         self_tiles=[],
     ):
-
-        # Clear meta grid
-        self.meta_grid = {}
-
-        for t in movable_tiles:
-            self.set_grid_pos(self.meta_grid, t, BoardState.MOVABLE_TILE)
-
+        """Updates the layered meta grid, returns the Dict[(x, y, z), tile] changed"""
+        # removed cells map to EMPTY_TILE, changes pile up for pop_meta_grid_delta()
         # TODO: update this to support "long-range" attacks
-        for t in attackable_tiles:
-            self.set_grid_pos(self.meta_grid, t, BoardState.NEIGHBOR_TILE)
-
-        for t in friendly_tiles:
-            self.set_grid_pos(self.meta_grid, t, BoardState.FRIENDLY_TILE)
-
-        for t in enemy_tiles:
-            self.set_grid_pos(self.meta_grid, t, BoardState.ENEMY_TILE)
-
         # TODO: come up with a tile color for self tiles
-        # for t in self_tiles:
-        #     self.set_grid_pos(self.meta_grid, t, BoardState.EMPTY_TILE)
\ No newline at end of file
+        next_layers = {
+            BoardState.MOVABLE_TILE: set(movable_tiles),
+            BoardState.NEIGHBOR_TILE: set(attackable_tiles),
+            BoardState.FRIENDLY_TILE: set(friendly_tiles),
+            BoardState.ENEMY_TILE: set(enemy_tiles),
+        }
+
+        # only cells whose layer membership changed can change tile
+        changed_positions = set()
+        for tile, next_layer in next_layers.items():
+            changed_positions |= next_layer ^ self.meta_grid_layers[tile]
+        self.meta_grid_layers = next_layers
+
+        delta = {}
+        for pos in changed_positions:
+            tile = BoardState.EMPTY_TILE
+            for layer_tile in BoardState.META_GRID_LAYER_ORDER:
+                if pos in next_layers[layer_tile]:
+                    tile = layer_tile
+            if tile == self.get_grid_pos(self.meta_grid, pos):
+                continue
+            if tile == BoardState.EMPTY_TILE:
+                del self.meta_grid[pos]
+            else:
+                self.set_grid_pos(self.meta_grid, pos, tile)
+            delta[pos] = tile
+
+        self.meta_grid_delta.update(delta)
+        return delta
+
+    def pop_meta_grid_delta(self):
+        """Returns every meta grid change since the last call and starts a new delta"""
+        delta = self.meta_grid_delta
+        self.meta_grid_delta = {}
+        return delta
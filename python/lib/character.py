@@ -1,7 +1,12 @@
 import uuid
 
+from .character_store import CharacterStore
+
 
 class Character:
+    """Lightweight view over one row of a CharacterStore"""
+
+    __slots__ = ("_store", "_row")
 
     NULL_ID = "-1"
 
@@ -14,35 +19,98 @@ class Character:
         "team_id": NULL_ID,
     }
 
-    def __init__(self, properties={}):
-        self.id = (
-            properties["id"] if "id" in properties else str(uuid.uuid4())
-        )  # generates a uuid
-        self.position = (
+    def __init__(self, properties={}, store=None):
+        # characters created on their own get a private single-row store
+        store = store if store is not None else CharacterStore(capacity=1)
+        row = store.add(
+            # generates a uuid
+            properties["id"] if "id" in properties else str(uuid.uuid4()),
             properties["position"]
             if "position" in properties
-            else Character.DEFAULT_PROPERTIES["position"]
-        )
-        self.last_position = (
+            else Character.DEFAULT_PROPERTIES["position"],
             properties["last_position"]
             if "last_position" in properties
-            else Character.DEFAULT_PROPERTIES["last_position"]
-        )
-        self.name = (
+            else Character.DEFAULT_PROPERTIES["last_position"],
             properties["name"]
             if "name" in properties
-            else Character.DEFAULT_PROPERTIES["name"]
-        )
-        self.hit_points = (
+            else Character.DEFAULT_PROPERTIES["name"],
             properties["hit_points"]
             if "hit_points" in properties
-            else Character.DEFAULT_PROPERTIES["hit_points"]
-        )
-        self.team_id = (
+            else Character.DEFAULT_PROPERTIES["hit_points"],
             properties["team_id"]
             if "team_id" in properties
-            else Character.DEFAULT_PROPERTIES["team_id"]
+            else Character.DEFAULT_PROPERTIES["team_id"],
         )
+        self._store = store
+        self._row = row
+        store.views[row] = self
+
+    @staticmethod
+    def view(store, row):
+        """Returns the Character view of a store row, creating it on first use"""
+        character = store.views[row]
+        if character is None:
+            character = Character.__new__(Character)
+            character._store = store
+            character._row = row
+            store.views[row] = character
+        return character
+
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def row(self):
+        return self._row
+
+    @property
+    def id(self):
+        return self._store.ids[self._row]
+
+    @id.setter
+    def id(self, value):
+        self._store.set_id(self._row, value)
+
+    @property
+    def position(self):
+        return tuple(self._store.positions[self._row].tolist())
+
+    @position.setter
+    def position(self, value):
+        self._store.set_position(self._row, value)
+
+    @property
+    def last_position(self):
+        return tuple(self._store.last_positions[self._row].tolist())
+
+    @last_position.setter
+    def last_position(self, value):
+        self._store.set_last_position(self._row, value)
+
+    @property
+    def name(self):
+        return self._store.names[self._row]
+
+    @name.setter
+    def name(self, value):
+        self._store.set_name(self._row, value)
+
+    @property
+    def hit_points(self):
+        return int(self._store.hit_points[self._row])
+
+    @hit_points.setter
+    def hit_points(self, value):
+        self._store.set_hit_points(self._row, value)
+
+    @property
+    def team_id(self):
+        return self._store.team_id_of(self._row)
+
+    @team_id.setter
+    def team_id(self, value):
+        self._store.set_team_id(self._row, value)
 
     def __iter__(self):
         """
@@ -56,4 +124,4 @@ class Character:
         yield "last_position", self.last_position
 
     def __str__(self) -> str:
-        return str(dict(self))
\ No newline at end of file
+        return str(dict(self))
@@ -0,0 +1,233 @@
+import sys
+from typing import Dict, List, Set
+import numpy as np
+
+
+class CharacterStore:
+    """Struct-of-arrays storage for characters, one row per character"""
+
+    # writes go through the set_* methods, which keep the id, position and team indexes
+    # current and journal the rows they change for GameState's undo steps
+
+    INITIAL_CAPACITY = 16
+    # per-row NumPy columns
+    COLUMNS = ("positions", "last_positions", "hit_points", "team_indices", "alive")
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.size = 0
+        self.positions = np.zeros((capacity, 3), dtype=np.int32)
+        self.last_positions = np.zeros((capacity, 3), dtype=np.int32)
+        self.hit_points = np.zeros(capacity, dtype=np.int32)
+        self.team_indices = np.zeros(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.ids = []
+        self.names = []
+        # interned team ids, referenced by team_indices
+        self.team_ids = []
+        self._team_index = {}
+        # id -> row
+        self._row_index = {}
+        # position -> set of rows standing there
+        self._position_index = {}
+        # team index -> set of rows on that team
+        self._team_members = {}
+        # one Character view per row, created on demand by Character.view
+        self.views = []
+        # row -> row_state before its first change, None when changes are not journaled
+        self.journal = None
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = max(CharacterStore.INITIAL_CAPACITY, 2 * len(self.hit_points))
+        for name in CharacterStore.COLUMNS:
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[: self.size] = array[: self.size]
+            setattr(self, name, grown)
+
+    @staticmethod
+    def intern(value):
+        return sys.intern(value) if isinstance(value, str) else value
+
+    def team_index_of(self, team_id) -> int:
+        team_id = CharacterStore.intern(team_id)
+        if team_id not in self._team_index:
+            self._team_index[team_id] = len(self.team_ids)
+            self.team_ids.append(team_id)
+        return self._team_index[team_id]
+
+    def add(
+        self, character_id, position, last_position, name, hit_points, team_id
+    ) -> int:
+        """Appends a character and returns its row"""
+        if self.size == len(self.hit_points):
+            self._grow()
+        row = self.size
+        self.size += 1
+        character_id = CharacterStore.intern(character_id)
+        self.ids.append(character_id)
+        self.names.append(name)
+        self._row_index[character_id] = row
+        self.last_positions[row] = last_position
+        self.hit_points[row] = hit_points
+        self.alive[row] = hit_points > 0
+        self.views.append(None)
+        self._set_position(row, position)
+        self._set_team_index(row, self.team_index_of(team_id))
+        return row
+
+    def _set_position(self, row, position):
+        self.positions[row] = position
+        rows = self._position_index.setdefault(
+            tuple(self.positions[row].tolist()), set()
+        )
+        rows.add(row)
+
+    def _journal_row(self, row):
+        if self.journal is not None and row not in self.journal:
+            self.journal[row] = self.row_state(row)
+
+    def row_state(self, row):
+        """Returns (id, name, position, last position, hit points, team index)"""
+        return (
+            self.ids[row],
+            self.names[row],
+            tuple(self.positions[row].tolist()),
+            tuple(self.last_positions[row].tolist()),
+            int(self.hit_points[row]),
+            int(self.team_indices[row]),
+        )
+
+    def set_row_state(self, row, state):
+        character_id, name, position, last_position, hit_points, team_index = state
+        if self.ids[row] != character_id:
+            self.set_id(row, character_id)
+        self.set_name(row, name)
+        if tuple(self.positions[row].tolist()) != position:
+            self.set_position(row, position)
+        self.set_last_position(row, last_position)
+        self.set_hit_points(row, hit_points)
+        if self.team_indices[row] != team_index:
+            self.set_team_id(row, self.team_ids[team_index])
+
+    def set_position(self, row, position):
+        self._journal_row(row)
+        old_position = tuple(self.positions[row].tolist())
+        rows = self._position_index[old_position]
+        rows.discard(row)
+        if not rows:
+            del self._position_index[old_position]
+        self._set_position(row, position)
+
+    def _set_team_index(self, row, team_index):
+        self.team_indices[row] = team_index
+        self._team_members.setdefault(team_index, set()).add(row)
+
+    def set_last_position(self, row, last_position):
+        self._journal_row(row)
+        self.last_positions[row] = last_position
+
+    def set_name(self, row, name):
+        self._journal_row(row)
+        self.names[row] = name
+
+    def set_team_id(self, row, team_id):
+        self._journal_row(row)
+        self._team_members[self.team_indices[row]].discard(row)
+        self._set_team_index(row, self.team_index_of(team_id))
+
+    def set_hit_points(self, row, hit_points):
+        self._journal_row(row)
+        self.hit_points[row] = hit_points
+        self.alive[row] = hit_points > 0
+
+    def set_id(self, row, character_id):
+        self._journal_row(row)
+        character_id = CharacterStore.intern(character_id)
+        if self._row_index.get(self.ids[row]) == row:
+            del self._row_index[self.ids[row]]
+        self.ids[row] = character_id
+        self._row_index[character_id] = row
+
+    def row_of(self, character_id) -> int:
+        return self._row_index.get(character_id)
+
+    def rows_at(self, position) -> Set[int]:
+        """Rows of the characters standing on a tile, alive or not"""
+        return self._position_index.get(tuple(position), set())
+
+    def team_id_of(self, row):
+        return self.team_ids[self.team_indices[row]]
+
+    def team_rows(self, team_id) -> np.ndarray:
+        """Rows of the characters on a team"""
+        team_index = self._team_index.get(team_id)
+        if team_index is None:
+            return np.zeros(0, dtype=np.int64)
+        return np.array(sorted(self._team_members[team_index]), dtype=np.int64)
+
+    def alive_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.alive[: self.size])
+
+    def snapshot(self) -> Dict:
+        """Copies every row, see restore"""
+        snapshot = {
+            name: getattr(self, name)[: self.size].copy()
+            for name in CharacterStore.COLUMNS
+        }
+        snapshot["ids"] = list(self.ids)
+        snapshot["names"] = list(self.names)
+        snapshot["team_ids"] = list(self.team_ids)
+        return snapshot
+
+    def restore(self, snapshot):
+        """Replaces every row with a snapshot's, views of kept rows stay valid"""
+        for name in CharacterStore.COLUMNS:
+            setattr(
+                self, name, np.array(snapshot[name], dtype=getattr(self, name).dtype)
+            )
+        self.ids = list(map(CharacterStore.intern, snapshot["ids"]))
+        self.names = list(snapshot["names"])
+        self.team_ids = list(map(CharacterStore.intern, snapshot["team_ids"]))
+        self.size = len(self.ids)
+        self.views = self.views[: self.size] + [None] * (self.size - len(self.views))
+
+        self._team_index = {team_id: i for i, team_id in enumerate(self.team_ids)}
+        self._row_index = {
+            character_id: row for row, character_id in enumerate(self.ids)
+        }
+        self._position_index = {}
+        for row, position in enumerate(map(tuple, self.positions.tolist())):
+            rows = self._position_index.get(position)
+            if rows is None:
+                self._position_index[position] = {row}
+            else:
+                rows.add(row)
+        self._team_members = {
+            team_index: set(np.flatnonzero(self.team_indices == team_index).tolist())
+            for team_index in range(len(self.team_ids))
+        }
+
+    def serialize(self, rows=None) -> List[Dict]:
+        """Same dicts as dict(character) for every row, built column by column"""
+        rows = (
+            np.arange(self.size) if rows is None else np.asarray(rows, dtype=np.int64)
+        )
+        positions = [tuple(p) for p in self.positions[rows].tolist()]
+        last_positions = [tuple(p) for p in self.last_positions[rows].tolist()]
+        hit_points = self.hit_points[rows].tolist()
+        team_ids = [self.team_ids[t] for t in self.team_indices[rows].tolist()]
+        rows = rows.tolist()
+        return [
+            {
+                "id": self.ids[row],
+                "position": positions[i],
+                "name": self.names[row],
+                "hit_points": hit_points[i],
+                "team_id": team_ids[i],
+                "last_position": last_positions[i],
+            }
+            for i, row in enumerate(rows)
+        ]
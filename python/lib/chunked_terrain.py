@@ -0,0 +1,218 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import List, Tuple
+import numpy as np
+
+from .spatial_index import SpatialIndex
+
+
+class ChunkedTerrain(Mapping):
+    """Read-only Dict[(x, y, z), tile] over an on-disk heightfield, loaded in chunks"""
+
+    # the heightfield is an int16 [x, z] array, usually a TerrainFile memmap, holding
+    # the y of each column's single tile or EMPTY_HEIGHT; at most max_loaded_chunks
+    # chunks are kept in memory, least recently used first out
+
+    EMPTY_HEIGHT = np.iinfo(np.int16).min
+    DEFAULT_CHUNK_SIZE = 64
+    DEFAULT_MAX_LOADED_CHUNKS = 64
+
+    def __init__(
+        self,
+        heightfield,
+        origin=(0, 0),
+        tile_value=1,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        max_loaded_chunks=DEFAULT_MAX_LOADED_CHUNKS,
+    ):
+        self.heightfield = heightfield
+        self.origin = (int(origin[0]), int(origin[1]))
+        # same bounding box attributes as ColumnHeightmap
+        self.min_xz = np.array(self.origin, dtype=np.int64)
+        self.tile_value = tile_value
+        self.chunk_size = chunk_size
+        self.max_loaded_chunks = max_loaded_chunks
+        self.shape = tuple(int(d) for d in heightfield.shape)
+
+        self.chunk_loads = 0
+        self.chunk_evictions = 0
+        self._chunks = OrderedDict()
+        self._size = None
+
+    @staticmethod
+    def create_heightfield(position_list) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """Converts (x, y, z) positions into an int16 heightfield and its origin"""
+        positions = np.asarray(position_list, dtype=np.int64).reshape(-1, 3)
+        if len(positions) == 0:
+            return np.zeros((0, 0), dtype=np.int16), (0, 0)
+        positions = np.unique(positions, axis=0)
+        xz = positions[:, [0, 2]]
+        min_xz = xz.min(axis=0)
+        shape = tuple((xz.max(axis=0) - min_xz + 1).tolist())
+        local = xz - min_xz
+        if len(np.unique(local[:, 0] * shape[1] + local[:, 1])) != len(positions):
+            raise ValueError("chunked terrain holds a single tile per (x, z) column")
+        heightfield = np.full(shape, ChunkedTerrain.EMPTY_HEIGHT, dtype=np.int16)
+        heightfield[local[:, 0], local[:, 1]] = positions[:, 1]
+        return heightfield, (int(min_xz[0]), int(min_xz[1]))
+
+    def _get_chunk(self, chunk_key):
+        chunk = self._chunks.get(chunk_key)
+        if chunk is not None:
+            self._chunks.move_to_end(chunk_key)
+            return chunk
+        cx, cz = chunk_key
+        size = self.chunk_size
+        chunk = np.array(
+            self.heightfield[cx * size : (cx + 1) * size, cz * size : (cz + 1) * size]
+        )
+        self.chunk_loads += 1
+        self._chunks[chunk_key] = chunk
+        while len(self._chunks) > self.max_loaded_chunks:
+            self._chunks.popitem(last=False)
+            self.chunk_evictions += 1
+        return chunk
+
+    def loaded_chunks(self) -> List[Tuple[int, int]]:
+        return list(self._chunks.keys())
+
+    def height_at(self, x, z):
+        """Returns the y of the tile in column (x, z), or None"""
+        lx = int(x) - self.origin[0]
+        lz = int(z) - self.origin[1]
+        if not (0 <= lx < self.shape[0] and 0 <= lz < self.shape[1]):
+            return None
+        size = self.chunk_size
+        h = self._get_chunk((lx // size, lz // size))[lx % size, lz % size]
+        if h == ChunkedTerrain.EMPTY_HEIGHT:
+            return None
+        return int(h)
+
+    def top(self, position_2d) -> Tuple[int, int, int]:
+        x, z = position_2d
+        y = self.height_at(x, z)
+        if y is None:
+            return None
+        return (int(x), y, int(z))
+
+    def top_batch(self, xz) -> Tuple[np.ndarray, np.ndarray]:
+        """Same as ColumnHeightmap.top_batch, read through the chunk cache"""
+        xz = np.asarray(xz, dtype=np.int64).reshape(-1, 2)
+        local = xz - np.array(self.origin)
+        in_bounds = np.all((local >= 0) & (local < np.array(self.shape)), axis=1)
+        ys = np.full(len(xz), ChunkedTerrain.EMPTY_HEIGHT, dtype=np.int64)
+        indices = np.flatnonzero(in_bounds)
+        if len(indices):
+            size = self.chunk_size
+            chunk_xz = local[indices] // size
+            chunk_keys, chunk_of = np.unique(chunk_xz, axis=0, return_inverse=True)
+            for i, (cx, cz) in enumerate(chunk_keys.tolist()):
+                members = indices[chunk_of == i]
+                chunk = self._get_chunk((cx, cz))
+                ys[members] = chunk[local[members, 0] % size, local[members, 1] % size]
+        valid = ys != ChunkedTerrain.EMPTY_HEIGHT
+        ys = np.where(valid, ys, 0)
+        return np.stack([xz[:, 0], ys, xz[:, 1]], axis=1), valid
+
+    def column(self, position_2d):
+        position_3d = self.top(position_2d)
+        return [position_3d] if position_3d else []
+
+    def columns(self):
+        return ChunkedColumns(self)
+
+    def k_nearest(self, point, k=1, y_weight=0.0):
+        """Returns up to k (position, distance) pairs, see SpatialIndex.k_nearest"""
+        if 0 in self.shape or k <= 0:
+            return []
+        qx, qy, qz = point
+        cx = int(np.floor(qx + 0.5))
+        cz = int(np.floor(qz + 0.5))
+        min_xz = np.array(self.origin)
+        r_min, r_max = SpatialIndex.ring_limits(
+            cx, cz, min_xz, min_xz + np.array(self.shape) - 1
+        )
+
+        found = []
+        kth_distance = float("INF")
+        for r in range(r_min, r_max + 1):
+            if r - 0.5 > kth_distance:
+                break
+            positions, valid = self.top_batch(SpatialIndex.ring_cells(cx, cz, r))
+            positions = positions[valid]
+            if len(positions) == 0:
+                continue
+            distances = np.sqrt(
+                ((positions[:, 0] - qx) ** 2)
+                + (((positions[:, 1] - qy) ** 2) * y_weight)
+                + ((positions[:, 2] - qz) ** 2)
+            )
+            found.extend(
+                zip(distances.tolist(), [tuple(p) for p in positions.tolist()])
+            )
+            if len(found) >= k:
+                found.sort()
+                kth_distance = found[k - 1][0]
+        found.sort()
+        return [(p, d) for d, p in found[:k]]
+
+    def _iter_chunk_arrays(self):
+        """Streams every chunk without caching it, for whole-world scans"""
+        size = self.chunk_size
+        for cx in range(0, self.shape[0], size):
+            for cz in range(0, self.shape[1], size):
+                yield cx, cz, np.array(self.heightfield[cx : cx + size, cz : cz + size])
+
+    def __getitem__(self, position):
+        if position not in self:
+            raise KeyError(position)
+        return self.tile_value
+
+    def __contains__(self, position):
+        try:
+            x, y, z = position
+            return self.height_at(x, z) == int(y)
+        except (TypeError, ValueError):
+            return False
+
+    def __iter__(self):
+        ox, oz = self.origin
+        for cx, cz, chunk in self._iter_chunk_arrays():
+            filled = np.argwhere(chunk != ChunkedTerrain.EMPTY_HEIGHT)
+            ys = chunk[filled[:, 0], filled[:, 1]]
+            for (lx, lz), y in zip(filled.tolist(), ys.tolist()):
+                yield (lx + cx + ox, y, lz + cz + oz)
+
+    def __len__(self):
+        if self._size is None:
+            self._size = sum(
+                int(np.count_nonzero(chunk != ChunkedTerrain.EMPTY_HEIGHT))
+                for _, _, chunk in self._iter_chunk_arrays()
+            )
+        return self._size
+
+
+class ChunkedColumns(Mapping):
+    """Read-only Dict[(x, z), List[(x, y, z)]] over the columns of a ChunkedTerrain"""
+
+    def __init__(self, chunked_terrain: ChunkedTerrain):
+        self.chunked_terrain = chunked_terrain
+
+    def __getitem__(self, position_2d):
+        column = self.chunked_terrain.column(position_2d)
+        if not column:
+            raise KeyError(position_2d)
+        return column
+
+    def __contains__(self, position_2d):
+        try:
+            return self.chunked_terrain.top(position_2d) is not None
+        except (TypeError, ValueError):
+            return False
+
+    def __iter__(self):
+        for x, _, z in self.chunked_terrain:
+            yield (x, z)
+
+    def __len__(self):
+        return len(self.chunked_terrain)
@@ -0,0 +1,58 @@
+from typing import Tuple
+import numpy as np
+
+
+class ColumnHeightmap:
+    """Precomputed (x, z) -> y index over the columns of the terrain"""
+
+    # the top surface is a 2D array of heights with a validity mask over the bounding
+    # box; columns with several levels (bridges, overhangs) keep their highest one
+
+    def __init__(self, node_positions):
+        positions = np.asarray(node_positions, dtype=np.int64).reshape(-1, 3)
+
+        if len(positions) == 0:
+            self.min_xz = np.zeros(2, dtype=np.int64)
+            self.shape = (0, 0)
+        else:
+            xz = positions[:, [0, 2]]
+            self.min_xz = xz.min(axis=0)
+            self.shape = tuple((xz.max(axis=0) - self.min_xz + 1).tolist())
+
+        num_cells = self.shape[0] * self.shape[1]
+        cells = self._cell_ids(positions[:, [0, 2]])
+
+        self.valid = (np.bincount(cells, minlength=num_cells) > 0).reshape(self.shape)
+        top_y = np.full(num_cells, np.iinfo(np.int32).min, dtype=np.int32)
+        np.maximum.at(top_y, cells, positions[:, 1].astype(np.int32))
+        self.top_y = np.where(self.valid, top_y.reshape(self.shape), 0)
+
+    def _cell_ids(self, xz):
+        local = np.asarray(xz, dtype=np.int64).reshape(-1, 2) - self.min_xz
+        return local[:, 0] * self.shape[1] + local[:, 1]
+
+    def _lookup_cells(self, xz):
+        """Returns the cell id of every (x, z) and whether it is in the bounding box"""
+        xz = np.asarray(xz, dtype=np.int64).reshape(-1, 2)
+        local = xz - self.min_xz
+        in_bounds = np.all((local >= 0) & (local < np.array(self.shape)), axis=1)
+        cells = np.where(in_bounds, local[:, 0] * self.shape[1] + local[:, 1], 0)
+        return xz, cells, in_bounds
+
+    def top_batch(self, xz) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the (K, 3) top positions of K columns and a (K,) exists mask"""
+        xz, cells, in_bounds = self._lookup_cells(xz)
+        if self.valid.size == 0:
+            return np.zeros((len(xz), 3), dtype=np.int64), np.zeros(len(xz), dtype=bool)
+        valid = in_bounds & self.valid.reshape(-1)[cells]
+        ys = np.where(valid, self.top_y.reshape(-1)[cells], 0)
+        return np.stack([xz[:, 0], ys, xz[:, 1]], axis=1), valid
+
+    def top(self, position_2d) -> Tuple[int, int, int]:
+        """Returns the highest (x, y, z) position in a column, or None"""
+        x, z = position_2d
+        lx = int(x) - int(self.min_xz[0])
+        lz = int(z) - int(self.min_xz[1])
+        if 0 <= lx < self.shape[0] and 0 <= lz < self.shape[1] and self.valid[lx, lz]:
+            return (int(x), int(self.top_y[lx, lz]), int(z))
+        return None
@@ -0,0 +1,181 @@
+import bisect
+import struct
+from typing import Iterator, Tuple
+
+
+class CommandLog:
+    """Append-only binary log of the commands applied to a GameState"""
+
+    # every record is a one byte opcode and a fixed-size little-endian payload, with
+    # characters referred to by their store row; snapshots are taken every
+    # snapshot_interval turns so that a Replay only applies the commands after one
+    #
+    # file layout: header, the log itself, then per snapshot its turn, log offset,
+    # size and GameSnapshot blob
+
+    # payload: (dx, dy, dz) of the requested move
+    PLAYER_MOVE = 1
+    CURSOR_MOVE = 2
+    # payload: character row, (x, y, z) moved to, target row or NO_TARGET
+    ACTION = 3
+    # no payload: the selected character's turn ended
+    NEXT_TURN = 4
+    # payload: row of the newly selected character
+    SELECT = 5
+    # payload: number of steps undone or redone, turn the game is at afterwards
+    UNDO = 6
+    REDO = 7
+    # payload: number of commands before it that the game recorded as one undo step
+    STEP = 8
+
+    NO_TARGET = -1
+    OPCODE_FORMAT = struct.Struct("<B")
+    PAYLOAD_FORMATS = {
+        PLAYER_MOVE: struct.Struct("<3i"),
+        CURSOR_MOVE: struct.Struct("<3i"),
+        ACTION: struct.Struct("<I3ii"),
+        NEXT_TURN: struct.Struct("<"),
+        SELECT: struct.Struct("<I"),
+        UNDO: struct.Struct("<II"),
+        REDO: struct.Struct("<II"),
+        STEP: struct.Struct("<I"),
+    }
+    DEFAULT_SNAPSHOT_INTERVAL = 50
+
+    MAGIC = b"GPCL"
+    VERSION = 2
+    HEADER_FORMAT = struct.Struct("<4sHHIIII")
+    SNAPSHOT_FORMAT = struct.Struct("<III")
+
+    def __init__(
+        self, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL, compress_snapshots=False
+    ):
+        self.snapshot_interval = snapshot_interval
+        self.compress_snapshots = compress_snapshots
+        self.data = bytearray()
+        self.num_commands = 0
+        # sorted by turn: (turn, log offset, snapshot blob)
+        self.snapshots = []
+
+    def __len__(self):
+        return self.num_commands
+
+    def append(self, opcode, *args):
+        self.data += CommandLog.OPCODE_FORMAT.pack(opcode)
+        self.data += CommandLog.PAYLOAD_FORMATS[opcode].pack(*args)
+        self.num_commands += 1
+
+    def should_snapshot(self, turn) -> bool:
+        return turn % self.snapshot_interval == 0
+
+    def add_snapshot(self, turn, snapshot):
+        """Records a snapshot of the game as it is after every command logged so far"""
+        # a snapshot taken again for a turn, e.g. after setup, replaces the older one
+        while self.snapshots and self.snapshots[-1][0] >= turn:
+            self.snapshots.pop()
+        self.snapshots.append((turn, len(self.data), snapshot))
+
+    def drop_snapshots_after(self, turn):
+        """Forgets the snapshots of turns an undo took the game back from"""
+        while self.snapshots and self.snapshots[-1][0] > turn:
+            self.snapshots.pop()
+
+    def nearest_snapshot(self, turn):
+        """Returns the (turn, log offset, snapshot) of the last snapshot up to a turn"""
+        i = bisect.bisect_right([t for t, _, _ in self.snapshots], turn)
+        if i == 0:
+            raise ValueError("no snapshot was taken before turn {}".format(turn))
+        return self.snapshots[i - 1]
+
+    def commands(self, offset=0, end=None) -> Iterator[Tuple[int, Tuple]]:
+        """Yields the (opcode, payload) of every command between two byte offsets"""
+        for opcode, payload, _ in self._records(offset, end):
+            yield opcode, payload
+
+    def _records(self, offset=0, end=None):
+        """Yields (opcode, payload, offset after the command)"""
+        data = bytes(self.data)
+        end = len(data) if end is None else end
+        opcode_size = CommandLog.OPCODE_FORMAT.size
+        while offset < end:
+            (opcode,) = CommandLog.OPCODE_FORMAT.unpack_from(data, offset)
+            offset += opcode_size
+            payload_format = CommandLog.PAYLOAD_FORMATS[opcode]
+            payload = payload_format.unpack_from(data, offset)
+            offset += payload_format.size
+            yield opcode, payload, offset
+
+    def turn_offset(self, turn, start_turn=0, offset=0):
+        """Returns the byte offset at which the game last entered a turn for good"""
+        # i.e. no undo took it back to an earlier turn afterwards; None when the game is
+        # not at that turn at the end of the log.  start_turn is the turn at offset
+        current_turn = start_turn
+        turn_offset = offset if start_turn >= turn else None
+        for opcode, payload, end in self._records(offset):
+            previous_turn = current_turn
+            if opcode == CommandLog.NEXT_TURN:
+                current_turn += 1
+            elif opcode in (CommandLog.UNDO, CommandLog.REDO):
+                current_turn = payload[1]
+            if current_turn < turn:
+                turn_offset = None
+            elif previous_turn < turn:
+                turn_offset = end
+        return turn_offset
+
+    def write(self, path):
+        """Writes the log and its snapshots to a file"""
+        with open(path, "wb") as f:
+            f.write(
+                CommandLog.HEADER_FORMAT.pack(
+                    CommandLog.MAGIC,
+                    CommandLog.VERSION,
+                    0,
+                    self.snapshot_interval,
+                    self.num_commands,
+                    len(self.data),
+                    len(self.snapshots),
+                )
+            )
+            f.write(self.data)
+            for turn, offset, snapshot in self.snapshots:
+                f.write(CommandLog.SNAPSHOT_FORMAT.pack(turn, offset, len(snapshot)))
+                f.write(snapshot)
+
+    @staticmethod
+    def read(path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < CommandLog.HEADER_FORMAT.size:
+            raise ValueError(f"{path} is too short to be a command log")
+        (
+            magic,
+            version,
+            flags,
+            snapshot_interval,
+            num_commands,
+            log_size,
+            num_snapshots,
+        ) = CommandLog.HEADER_FORMAT.unpack_from(data)
+        if magic != CommandLog.MAGIC:
+            raise ValueError(f"{path} is not a command log")
+        if version != CommandLog.VERSION:
+            raise ValueError(f"unsupported command log version {version} in {path}")
+
+        command_log = CommandLog(snapshot_interval=snapshot_interval)
+        offset = CommandLog.HEADER_FORMAT.size
+        command_log.data = bytearray(data[offset : offset + log_size])
+        command_log.num_commands = num_commands
+        offset += log_size
+        for _ in range(num_snapshots):
+            turn, log_offset, size = CommandLog.SNAPSHOT_FORMAT.unpack_from(
+                data, offset
+            )
+            offset += CommandLog.SNAPSHOT_FORMAT.size
+            command_log.snapshots.append(
+                (turn, log_offset, data[offset : offset + size])
+            )
+            offset += size
+        if offset != len(data):
+            raise ValueError(f"{path} is truncated or corrupt")
+        return command_log
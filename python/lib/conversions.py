@@ -1,9 +1,11 @@
+from collections.abc import Mapping
 from math import floor
 import numpy as np
 import os
 
-if os.getenv("PY_ENV") == "test":
-    from python.test.mocks import Vector3, Array, Dictionary
+# tests and headless simulations (see Simulator) run without the Godot runtime
+if os.getenv("PY_ENV") in ("test", "headless"):
+    from .headless import Vector3, Array, Dictionary
 else:
     from godot import Vector3, Array, Dictionary
 
@@ -38,7 +40,8 @@ class Conversions:
         result = None
         if isinstance(obj, int) or isinstance(obj, float) or isinstance(obj, str):
             result = obj
-        elif isinstance(obj, dict):
+        elif isinstance(obj, Mapping):
+            # includes array-backed grid views such as VoxelGrid
             tmp_keys = []
             tmp_values = []
             leave_as_list = False
@@ -0,0 +1,115 @@
+from heapq import heappush, heappop
+from typing import List, Tuple
+import numpy as np
+
+from .adjacency_graph import AdjacencyGraph
+
+
+class FlowField:
+    """Path costs and next steps towards a set of goal nodes, for every node"""
+
+    # one multi-source Dijkstra pass lets any number of units sharing the goals read
+    # their next step in O(1); unreachable nodes cost INF and have no next node
+
+    def __init__(self, adjacency, goals, blocked=None):
+        # blocked is an optional (num_nodes,) mask of nodes paths may not pass through,
+        # goals themselves are never blocked
+        self.adjacency = adjacency
+        self.goals = [tuple(g) for g in goals]
+        goal_indices = (
+            adjacency.lookup(self.goals) if self.goals else np.zeros(0, np.int32)
+        )
+        self.goal_indices = goal_indices[goal_indices != AdjacencyGraph.NULL_INDEX]
+
+        self.costs, self.next_indices = FlowField._compute(
+            adjacency, self.goal_indices.tolist(), blocked
+        )
+
+        # (x, y, z) step from each node to its next node, zero where there is none
+        has_next = self.next_indices != AdjacencyGraph.NULL_INDEX
+        self.directions = np.zeros((adjacency.num_nodes, 3), dtype=np.int8)
+        self.directions[has_next] = (
+            adjacency.node_positions[self.next_indices[has_next]]
+            - adjacency.node_positions[has_next]
+        )
+
+    @staticmethod
+    def _compute(adjacency, goal_indices, blocked) -> Tuple[np.ndarray, np.ndarray]:
+        # python lists make the per-node loop much faster than numpy slicing
+        offsets = adjacency.offsets.tolist()
+        indices = adjacency.indices.tolist()
+        edge_costs = adjacency.costs.tolist()
+        is_blocked = (
+            blocked.tolist() if blocked is not None else [False] * adjacency.num_nodes
+        )
+
+        costs = [float("INF")] * adjacency.num_nodes
+        next_indices = [AdjacencyGraph.NULL_INDEX] * adjacency.num_nodes
+        settled = [False] * adjacency.num_nodes
+        q = []
+        for g in goal_indices:
+            costs[g] = 0.0
+            q.append((0.0, g))
+        # board edges are symmetric, so costs from the goals are costs towards them
+        while q:
+            cost, v = heappop(q)
+            if settled[v]:
+                continue
+            settled[v] = True
+            for e in range(offsets[v], offsets[v + 1]):
+                n = indices[e]
+                if settled[n] or is_blocked[n]:
+                    continue
+                n_cost = cost + edge_costs[e]
+                if n_cost < costs[n]:
+                    costs[n] = n_cost
+                    next_indices[n] = v
+                    heappush(q, (n_cost, n))
+        return (
+            np.array(costs, dtype=np.float32),
+            np.array(next_indices, dtype=np.int32),
+        )
+
+    def is_affected_by(self, changed_positions) -> bool:
+        """True when blocking or unblocking any of the positions can change the field"""
+        # i.e. one of them is reachable or borders a reachable node
+        if not changed_positions:
+            return False
+        changed = self.adjacency.lookup([tuple(p) for p in changed_positions])
+        changed = changed[changed != AdjacencyGraph.NULL_INDEX]
+        offsets = self.adjacency.offsets
+        for index in changed.tolist():
+            if np.isfinite(self.costs[index]):
+                return True
+            neighbors = self.adjacency.indices[offsets[index] : offsets[index + 1]]
+            if np.any(np.isfinite(self.costs[neighbors])):
+                return True
+        return False
+
+    def cost_at(self, position) -> float:
+        """Path cost from a position to the nearest goal, INF if unreachable"""
+        index = self.adjacency.index_of(position)
+        if index == AdjacencyGraph.NULL_INDEX:
+            return float("INF")
+        return float(self.costs[index])
+
+    def next_step(self, position) -> Tuple[int, int, int]:
+        """Returns the next position towards the nearest goal, or None"""
+        index = self.adjacency.index_of(position)
+        if index == AdjacencyGraph.NULL_INDEX:
+            return None
+        next_index = int(self.next_indices[index])
+        if next_index == AdjacencyGraph.NULL_INDEX:
+            return None
+        return self.adjacency.position_of(next_index)
+
+    def path_from(self, position) -> List[Tuple[int, int, int]]:
+        """Follows the field from a position to a goal, None if none is reachable"""
+        index = self.adjacency.index_of(position)
+        if index == AdjacencyGraph.NULL_INDEX or self.costs[index] == float("INF"):
+            return None
+        path = [index]
+        next_indices = self.next_indices
+        while next_indices[path[-1]] != AdjacencyGraph.NULL_INDEX:
+            path.append(int(next_indices[path[-1]]))
+        return self.adjacency.positions_of(path)
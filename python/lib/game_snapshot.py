@@ -0,0 +1,334 @@
+import struct
+import zlib
+from typing import Dict, List
+import numpy as np
+
+from .character_store import CharacterStore
+
+
+class GameSnapshot:
+    """Versioned binary format of a GameState snapshot, see GameState.snapshot"""
+
+    # layout: header, then a body that is zlib-compressed when flags has COMPRESSED:
+    #   fixed fields, RNG state, strings (terrain, character and team ids and names),
+    #   one array per CharacterStore column, attack masks, then the tile lists and
+    #   meta grid layers
+    # arrays are written as raw bytes, so thousands of characters cost a few copies;
+    # integer columns are narrowed and column-major, which compresses far better
+
+    MAGIC = b"GPSN"
+    VERSION = 3
+    COMPRESSED = 1
+    # fastest zlib level: most of the gain for a fraction of the time
+    COMPRESSION_LEVEL = 1
+    HEADER_FORMAT = struct.Struct("<4sHHII")
+    # turn, characters, teams, selected row, has cursor, cursor, selected mask, attack
+    # masks, masks
+    FIXED_FORMAT = struct.Struct("<IIIi?3iiII")
+    RNG_FORMAT = struct.Struct("<625I?d")
+    COUNT_FORMAT = struct.Struct("<I")
+    # item size of a narrowed integer column
+    COLUMN_FORMAT = struct.Struct("<B")
+    COLUMN_DTYPES = [np.dtype("<i1"), np.dtype("<i2"), np.dtype("<i4")]
+    MASK_FORMAT = struct.Struct("<iiii")
+    # mask cells are None, FILLED_TILE or MASK_DEFAULT_PIVOT_VALUE
+    EMPTY_MASK_CELL = np.iinfo(np.int8).min
+    POSITION_DTYPE = np.dtype("<i4")
+    # Python's Mersenne Twister keeps 624 words and a position
+    RNG_VERSION = 3
+    # joins strings, which therefore must not contain it
+    STRING_SEPARATOR = "\0"
+
+    @staticmethod
+    def _pack_strings(strings: List[str]) -> bytes:
+        # None is written as an empty string and flagged in a bitmap
+        is_none = np.array([s is None for s in strings], dtype=bool)
+        data = GameSnapshot.STRING_SEPARATOR.join(
+            "" if s is None else str(s) for s in strings
+        ).encode("utf-8")
+        return (
+            GameSnapshot.COUNT_FORMAT.pack(len(strings))
+            + np.packbits(is_none).tobytes()
+            + GameSnapshot._pack_bytes(data)
+        )
+
+    @staticmethod
+    def _pack_column(column: np.ndarray) -> bytes:
+        if column.dtype == bool:
+            return column.tobytes()
+        low = int(column.min()) if column.size else 0
+        high = int(column.max()) if column.size else 0
+        for dtype in GameSnapshot.COLUMN_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                break
+        array = np.ascontiguousarray(column.astype(dtype).T)
+        return GameSnapshot.COLUMN_FORMAT.pack(dtype.itemsize) + array.tobytes()
+
+    @staticmethod
+    def _pack_bytes(data: bytes) -> bytes:
+        return GameSnapshot.COUNT_FORMAT.pack(len(data)) + data
+
+    @staticmethod
+    def _pack_positions(positions) -> bytes:
+        array = np.asarray(list(positions), dtype=GameSnapshot.POSITION_DTYPE).reshape(
+            -1, 3
+        )
+        return GameSnapshot.COUNT_FORMAT.pack(len(array)) + array.tobytes()
+
+    @staticmethod
+    def _pack_mask(mask) -> bytes:
+        cells = np.array(
+            [
+                [GameSnapshot.EMPTY_MASK_CELL if cell is None else cell for cell in row]
+                for row in mask["mask"]
+            ],
+            dtype=np.int8,
+        )
+        rows, columns = cells.shape
+        shape_x, shape_z = mask["shape"]
+        return (
+            GameSnapshot.MASK_FORMAT.pack(rows, columns, shape_x, shape_z)
+            + cells.tobytes()
+        )
+
+    @staticmethod
+    def pack(fields: Dict, compress=False) -> bytes:
+        """Packs the fields of a snapshot (see GameState.snapshot) into a blob"""
+        store = fields["characters"]
+        num_characters = len(store["ids"])
+
+        # every distinct mask is written once and referred to by index
+        masks = []
+
+        def mask_index(mask):
+            for i, m in enumerate(masks):
+                if m is mask or m == mask:
+                    return i
+            masks.append(mask)
+            return len(masks) - 1
+
+        selected_mask = mask_index(fields["selected_character_attack_mask"])
+        attack_mask_rows = np.array(
+            list(fields["character_attack_masks"].keys()), dtype="<i4"
+        )
+        attack_mask_indices = np.array(
+            [mask_index(m) for m in fields["character_attack_masks"].values()],
+            dtype="<i4",
+        )
+
+        _, words, gauss = fields["rng_state"]
+        cursor_position = fields["cursor_position"]
+        parts = [
+            GameSnapshot.FIXED_FORMAT.pack(
+                fields["turn"],
+                num_characters,
+                len(fields["teams"]),
+                fields["selected_character"],
+                cursor_position is not None,
+                *(int(p) for p in cursor_position or (0, 0, 0)),
+                selected_mask,
+                len(attack_mask_rows),
+                len(masks),
+            ),
+            GameSnapshot.RNG_FORMAT.pack(*words, gauss is not None, gauss or 0.0),
+            GameSnapshot._pack_strings([fields["terrain_reference"]]),
+            GameSnapshot._pack_strings(store["ids"]),
+            GameSnapshot._pack_strings(store["names"]),
+            GameSnapshot._pack_strings(store["team_ids"]),
+            GameSnapshot._pack_strings([t["id"] for t in fields["teams"]]),
+            GameSnapshot._pack_strings([t["name"] for t in fields["teams"]]),
+        ]
+        for name in CharacterStore.COLUMNS:
+            parts.append(GameSnapshot._pack_column(np.asarray(store[name])))
+        parts.extend(GameSnapshot._pack_mask(m) for m in masks)
+        parts.append(attack_mask_rows.tobytes())
+        parts.append(attack_mask_indices.tobytes())
+
+        predecessors = fields["movable_predecessors"]
+        parts.append(GameSnapshot._pack_positions(fields["movable_tiles"]))
+        parts.append(GameSnapshot._pack_positions(predecessors.keys()))
+        # the root is its own predecessor
+        parts.append(
+            GameSnapshot._pack_positions(
+                node if predecessor is None else predecessor
+                for node, predecessor in predecessors.items()
+            )
+        )
+        parts.append(GameSnapshot._pack_positions(fields["attackable_tiles"]))
+        layers = fields["meta_grid_layers"]
+        parts.append(GameSnapshot.COUNT_FORMAT.pack(len(layers)))
+        for tile, layer in layers.items():
+            parts.append(struct.pack("<i", tile))
+            parts.append(GameSnapshot._pack_positions(layer))
+
+        body = b"".join(parts)
+        flags = 0
+        stored_body = body
+        if compress:
+            flags |= GameSnapshot.COMPRESSED
+            stored_body = zlib.compress(body, GameSnapshot.COMPRESSION_LEVEL)
+        header = GameSnapshot.HEADER_FORMAT.pack(
+            GameSnapshot.MAGIC, GameSnapshot.VERSION, flags, len(stored_body), len(body)
+        )
+        return header + stored_body
+
+    @staticmethod
+    def unpack(blob, known_masks=[]) -> Dict:
+        """Unpacks a blob into snapshot fields"""
+        # masks equal to one of known_masks are returned as that object, so that
+        # identity comparisons keep working after a restore
+        blob = bytes(blob)
+        if len(blob) < GameSnapshot.HEADER_FORMAT.size:
+            raise ValueError("snapshot is too short")
+        header = GameSnapshot.HEADER_FORMAT.unpack_from(blob)
+        magic, version, flags, stored_size, raw_size = header
+        if magic != GameSnapshot.MAGIC:
+            raise ValueError("not a game snapshot")
+        if version != GameSnapshot.VERSION:
+            raise ValueError(f"unsupported game snapshot version {version}")
+        body = blob[GameSnapshot.HEADER_FORMAT.size :]
+        if len(body) != stored_size:
+            raise ValueError("truncated game snapshot")
+        if flags & GameSnapshot.COMPRESSED:
+            body = zlib.decompress(body)
+        if len(body) != raw_size:
+            raise ValueError("corrupt game snapshot")
+
+        reader = _Reader(body)
+        (
+            turn,
+            num_characters,
+            num_teams,
+            selected_character,
+            has_cursor,
+            cursor_x,
+            cursor_y,
+            cursor_z,
+            selected_mask,
+            num_attack_masks,
+            num_masks,
+        ) = reader.unpack(GameSnapshot.FIXED_FORMAT)
+        rng_fields = reader.unpack(GameSnapshot.RNG_FORMAT)
+        words = rng_fields[:625]
+        has_gauss, gauss = rng_fields[625:]
+        (terrain_reference,) = reader.strings()
+        store = {
+            "ids": reader.strings(),
+            "names": reader.strings(),
+            "team_ids": reader.strings(),
+        }
+        team_ids = reader.strings()
+        team_names = reader.strings()
+        empty_store = CharacterStore(capacity=0)
+        for name in CharacterStore.COLUMNS:
+            template = getattr(empty_store, name)
+            store[name] = reader.column(template, num_characters)
+
+        masks = [reader.mask(known_masks) for _ in range(num_masks)]
+        attack_mask_rows = reader.array("<i4", (num_attack_masks,)).tolist()
+        attack_mask_indices = reader.array("<i4", (num_attack_masks,)).tolist()
+
+        movable_tiles = reader.positions()
+        predecessor_nodes = reader.positions()
+        predecessors = reader.positions()
+        attackable_tiles = reader.positions()
+        (num_layers,) = reader.unpack(GameSnapshot.COUNT_FORMAT)
+        layers = {}
+        for _ in range(num_layers):
+            (tile,) = reader.unpack(struct.Struct("<i"))
+            layers[tile] = set(reader.positions())
+
+        return {
+            "turn": turn,
+            "terrain_reference": terrain_reference,
+            "characters": store,
+            "teams": [{"id": i, "name": n} for i, n in zip(team_ids, team_names)],
+            "selected_character": selected_character,
+            "cursor_position": (cursor_x, cursor_y, cursor_z) if has_cursor else None,
+            "movable_tiles": movable_tiles,
+            "movable_predecessors": {
+                node: None if node == predecessor else predecessor
+                for node, predecessor in zip(predecessor_nodes, predecessors)
+            },
+            "attackable_tiles": attackable_tiles,
+            "meta_grid_layers": layers,
+            "selected_character_attack_mask": masks[selected_mask],
+            "character_attack_masks": {
+                row: masks[i] for row, i in zip(attack_mask_rows, attack_mask_indices)
+            },
+            "rng_state": (
+                GameSnapshot.RNG_VERSION,
+                tuple(words),
+                gauss if has_gauss else None,
+            ),
+        }
+
+
+class _Reader:
+    """Reads the sections of a snapshot body in order"""
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, format):
+        values = format.unpack_from(self.data, self.offset)
+        self.offset += format.size
+        return values
+
+    def bytes(self, size):
+        data = self.data[self.offset : self.offset + size]
+        self.offset += size
+        return data
+
+    def strings(self) -> List[str]:
+        (count,) = self.unpack(GameSnapshot.COUNT_FORMAT)
+        is_none = np.unpackbits(
+            np.frombuffer(self.bytes((count + 7) // 8), dtype=np.uint8)
+        )
+        (size,) = self.unpack(GameSnapshot.COUNT_FORMAT)
+        data = self.bytes(size).decode("utf-8")
+        if count == 0:
+            return []
+        strings = data.split(GameSnapshot.STRING_SEPARATOR)
+        for i in np.flatnonzero(is_none[:count]).tolist():
+            strings[i] = None
+        return strings
+
+    def column(self, template, count) -> np.ndarray:
+        """Reads a column written by GameSnapshot._pack_column, as template's dtype"""
+        if template.dtype == bool:
+            return self.array(template.dtype, (count,)).copy()
+        (itemsize,) = self.unpack(GameSnapshot.COLUMN_FORMAT)
+        dtype = np.dtype("<i{}".format(itemsize))
+        # stored column-major
+        shape = template.shape[1:][::-1] + (count,)
+        return self.array(dtype, shape).T.astype(template.dtype)
+
+    def array(self, dtype, shape) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        array = np.frombuffer(self.data, dtype=dtype, count=count, offset=self.offset)
+        self.offset += count * dtype.itemsize
+        return array.reshape(shape)
+
+    def positions(self):
+        (count,) = self.unpack(GameSnapshot.COUNT_FORMAT)
+        positions = self.array(GameSnapshot.POSITION_DTYPE, (count, 3)).tolist()
+        return [tuple(p) for p in positions]
+
+    def mask(self, known_masks):
+        rows, columns, shape_x, shape_z = self.unpack(GameSnapshot.MASK_FORMAT)
+        cells = self.array(np.int8, (rows, columns)).tolist()
+        mask = {
+            "mask": [
+                [None if cell == GameSnapshot.EMPTY_MASK_CELL else cell for cell in row]
+                for row in cells
+            ],
+            "shape": (shape_x, shape_z),
+        }
+        for known_mask in known_masks:
+            if known_mask == mask:
+                return known_mask
+        return mask
@@ -1,14 +1,36 @@
 from python.lib.masks import CROSS_MASK, SPEAR_MASK, SWORD_MASK, X_MASK
 import numpy as np
 
+from collections import OrderedDict
+import contextlib
+import functools
 import random
+import zlib
 
 from numpy.lib.shape_base import tile
 
 from .conversions import Conversions
 from .board_state import BoardState
 from .character import Character
+from .character_store import CharacterStore
+from .command_log import CommandLog
+from .game_snapshot import GameSnapshot
+from .influence_map import InfluenceMap
+from .tactical_state import TacticalState
 from .team import Team
+from .undo_stack import UndoStack, UndoStep
+from .visibility import VisibilityEngine
+
+
+def undoable(method):
+    """Records everything a GameState method changes as one undo step"""
+
+    @functools.wraps(method)
+    def record_undo_step(self, *args, **kwargs):
+        with self.undo_step():
+            return method(self, *args, **kwargs)
+
+    return record_undo_step
 
 
 class GameState:
@@ -23,10 +45,22 @@ class GameState:
     NULL_CHARACTER = Character({"id": Character.NULL_ID})
     NULL_TEAM = Team({"id": Team.NULL_ID})
     AVAILABLE_ATTACK_MASKS = [CROSS_MASK, SPEAR_MASK, SWORD_MASK, X_MASK]
+    DEFAULT_ATTACK_MASK = SPEAR_MASK
+    DEFAULT_ATTACK_DAMAGE = 1
+    # fields an undo step saves references to; the game replaces them, never mutates
+    UNDO_FIELDS = (
+        "turn",
+        "selected_character",
+        "movable_tiles",
+        "movable_predecessors",
+        "attackable_tiles",
+        "selected_character_attack_mask",
+    )
 
     def __init__(self, events, game_manager=None, initial_state={}, rng_seed=None):
 
-        random.seed(rng_seed)
+        # every random choice goes through this generator, so replays can restore it
+        self.rng = random.Random(rng_seed)
 
         self._initial_state = initial_state
         self.events = events
@@ -34,15 +68,47 @@ class GameState:
             GameState.NULL_CHARACTER
         )  # Prevent selected character from ever being None to make code less complex
         self.game_manager = game_manager
-        if "grid" in self._initial_state:
-            self.board_state = BoardState(self._initial_state["grid"])
+        dense_terrain = (
+            self._initial_state["dense_terrain"]
+            if "dense_terrain" in self._initial_state
+            else False
+        )
+        if "terrain_file" in self._initial_state:
+            self.board_state = BoardState.from_terrain_file(
+                self._initial_state["terrain_file"]
+            )
+        elif "grid" in self._initial_state:
+            self.board_state = BoardState(
+                self._initial_state["grid"], dense=dense_terrain
+            )
         else:
-            self.board_state = BoardState(GameState.NULL_GRID)
+            self.board_state = BoardState(GameState.NULL_GRID, dense=dense_terrain)
 
+        self.visibility = VisibilityEngine(self.board_state)
+        self.influence = InfluenceMap(
+            self.board_state, move_budget=GameState.DEFAULT_MOVE_DISTANCE_BUDGET
+        )
         self.cursor_position = GameState.DEFAULT_PLAYER_START_POS
         self.movable_tiles = []
+        self.movable_predecessors = {}
         self.attackable_tiles = []
-        self.selected_character_attack_mask = SPEAR_MASK
+        self.selected_character_attack_mask = GameState.DEFAULT_ATTACK_MASK
+        # attack masks of characters other than the selected one, by character id
+        self.character_attack_masks = {}
+        # team id -> controller that plays that team's turns, see register_ai_controller
+        self.ai_controllers = {}
+        # movement reach shared by every fork, see TacticalState.reach
+        self._reach_cache = OrderedDict()
+        self._column_tops = {}
+        self._reach_cache_version = None
+        self._terrain_reference_cache = None
+        self._terrain_reference_version = None
+        # number of turns ended since setup
+        self.turn = 0
+        # every command applied to the game, see Replay.  None turns recording off.
+        self.command_log = CommandLog()
+        # inverse deltas of the latest changes, see undo.  None turns recording off.
+        self.undo_stack = UndoStack()
 
         # If using preloaded teams
         initial_character_list = (
@@ -72,6 +138,7 @@ class GameState:
 
         self.create_teams(teams=initial_team_list)
         self.create_characters(characters=initial_character_list)
+        self.update_occupancy()
 
     def state(self):
         """
@@ -81,10 +148,29 @@ class GameState:
             "grid": self.board_state.terrain_grid,
             "meta_grid": self.board_state.meta_grid,
             "selected_character": dict(self.selected_character),
-            "characters": [dict(c) for c in self.characters],  # serialize characters
+            "characters": self.character_store.serialize(
+                [c.row for c in self.characters]
+            ),  # serialize characters
             "teams": [dict(t) for t in self.teams],
         }
 
+    def characters_state(self):
+        """
+        Returns the serialized characters and selection without the grids
+        """
+        return {
+            "selected_character": dict(self.selected_character),
+            "characters": self.character_store.serialize(
+                [c.row for c in self.characters]
+            ),
+        }
+
+    def pop_meta_grid_delta(self):
+        """
+        Returns the meta grid cells changed since the last call
+        """
+        return self.board_state.pop_meta_grid_delta()
+
     def setup(
         self, skip_character_repositioning=False, skip_character_team_assignment=False
     ):
@@ -96,6 +182,9 @@ class GameState:
         if not skip_character_team_assignment:
             self.assign_character_teams()
 
+        self.update_occupancy()
+        self.board_state.mark_characters_changed()
+
         # set first character in list as selected character. TODO: make this less random.
         self.selected_character = self.characters[0]
 
@@ -116,6 +205,131 @@ class GameState:
             self_tiles=[],
         )
 
+        self.update_unit_layers()
+        if self.command_log is not None:
+            self.command_log.add_snapshot(
+                self.turn, self.snapshot(compress=self.command_log.compress_snapshots)
+            )
+
+    def _terrain_reference(self):
+        """Identifies the terrain in snapshots by its file, or a checksum of the grid"""
+        if "terrain_file" in self._initial_state:
+            return "file:{}".format(self._initial_state["terrain_file"])
+        if self._terrain_reference_version != self.board_state.terrain_version:
+            positions = np.array(
+                list(self.board_state.terrain_grid.keys()), dtype="<i4"
+            ).reshape(-1, 3)
+            positions = positions[np.lexsort(positions.T[::-1])]
+            self._terrain_reference_cache = "grid:{}:{:08x}".format(
+                len(positions), zlib.crc32(positions.tobytes())
+            )
+            self._terrain_reference_version = self.board_state.terrain_version
+        return self._terrain_reference_cache
+
+    def snapshot(self, compress=False):
+        """Packs the game, but not its terrain, into a GameSnapshot blob"""
+        store = self.character_store
+        fields = {
+            "turn": self.turn,
+            "terrain_reference": self._terrain_reference(),
+            "characters": store.snapshot(),
+            "teams": [dict(t) for t in self.teams],
+            "selected_character": self.selected_character.row
+            if self.selected_character.store is self.character_store
+            else -1,
+            "cursor_position": self.cursor_position,
+            "movable_tiles": list(self.movable_tiles),
+            "movable_predecessors": dict(self.movable_predecessors),
+            "attackable_tiles": list(self.attackable_tiles),
+            "meta_grid_layers": {
+                tile: set(layer)
+                for tile, layer in self.board_state.meta_grid_layers.items()
+            },
+            "selected_character_attack_mask": self.selected_character_attack_mask,
+            "character_attack_masks": {
+                store.row_of(character_id): mask
+                for character_id, mask in self.character_attack_masks.items()
+                if store.row_of(character_id) is not None
+            },
+            "rng_state": self.rng.getstate(),
+        }
+        return GameSnapshot.pack(fields, compress=compress)
+
+    def restore(self, blob):
+        """Puts the game back in the state packed by snapshot() on the same terrain"""
+        snapshot = GameSnapshot.unpack(
+            blob, known_masks=GameState.AVAILABLE_ATTACK_MASKS
+        )
+        if snapshot["terrain_reference"] != self._terrain_reference():
+            raise ValueError(
+                "snapshot of terrain {} cannot be restored on terrain {}".format(
+                    snapshot["terrain_reference"], self._terrain_reference()
+                )
+            )
+        self.turn = snapshot["turn"]
+        self.teams = [Team(t) for t in snapshot["teams"]]
+        self.character_store.restore(snapshot["characters"])
+        self.characters = [
+            Character.view(self.character_store, row)
+            for row in range(len(self.character_store))
+        ]
+        self.selected_character = (
+            self.characters[snapshot["selected_character"]]
+            if snapshot["selected_character"] >= 0
+            else GameState.NULL_CHARACTER
+        )
+        self.cursor_position = snapshot["cursor_position"]
+        self.movable_tiles = list(snapshot["movable_tiles"])
+        self.movable_predecessors = dict(snapshot["movable_predecessors"])
+        self.attackable_tiles = list(snapshot["attackable_tiles"])
+        self.selected_character_attack_mask = snapshot["selected_character_attack_mask"]
+        self.character_attack_masks = {
+            self.characters[row].id: mask
+            for row, mask in snapshot["character_attack_masks"].items()
+        }
+        self.rng.setstate(snapshot["rng_state"])
+        if self.undo_stack is not None:
+            self.undo_stack.clear()
+
+        layers = snapshot["meta_grid_layers"]
+        self.board_state.update_meta_grid(
+            movable_tiles=layers[BoardState.MOVABLE_TILE],
+            attackable_tiles=layers[BoardState.NEIGHBOR_TILE],
+            friendly_tiles=layers[BoardState.FRIENDLY_TILE],
+            enemy_tiles=layers[BoardState.ENEMY_TILE],
+        )
+        units = self._alive_units()
+        self.update_occupancy(units)
+        self.board_state.mark_characters_changed()
+        self.update_unit_layers(units)
+
+    def apply_command(self, opcode, payload):
+        """Applies a command read back from a CommandLog"""
+        if opcode == CommandLog.PLAYER_MOVE:
+            self.move_character(self.selected_character, payload)
+        elif opcode == CommandLog.CURSOR_MOVE:
+            self.move_cursor(self.cursor_position, payload)
+        elif opcode == CommandLog.ACTION:
+            row, x, y, z, target_row = payload
+            target = (
+                None
+                if target_row == CommandLog.NO_TARGET
+                else self.characters[target_row]
+            )
+            self.perform_action(self.characters[row], (x, y, z), target)
+        elif opcode == CommandLog.NEXT_TURN:
+            self._start_next_turn()
+        elif opcode == CommandLog.SELECT:
+            self.select_character(self.characters[payload[0]])
+        elif opcode == CommandLog.UNDO:
+            self.undo(payload[0])
+        elif opcode == CommandLog.REDO:
+            self.redo(payload[0])
+        elif opcode == CommandLog.STEP:
+            pass
+        else:
+            raise ValueError("unknown command {}".format(opcode))
+
     def create_teams(self, teams=[]):
         if teams:
             self.teams = [Team(t) for t in teams]
@@ -123,23 +337,171 @@ class GameState:
             self.teams = [Team() for _ in range(0, self.num_teams)]
 
     def create_characters(self, characters=[]):
+        # every character is a view over one row of the shared store
+        self.character_store = CharacterStore()
         if characters:
-            self.characters = [Character(c) for c in characters]
+            self.characters = [Character(c, self.character_store) for c in characters]
         else:
             num_characters = self.get_total_num_characters()
-            self.characters = [Character() for _ in range(0, num_characters)]
+            self.characters = [
+                Character(store=self.character_store) for _ in range(0, num_characters)
+            ]
+
+    def _undo_fields(self):
+        fields = {name: getattr(self, name) for name in GameState.UNDO_FIELDS}
+        fields["meta_grid_layers"] = self.board_state.meta_grid_layers
+        fields["rng_state"] = self.rng.getstate()
+        return fields
+
+    @contextlib.contextmanager
+    def undo_step(self):
+        """Records everything changed inside as one undo step, see undoable"""
+        # changes made by nested steps belong to the outermost step
+        if self.undo_stack is None or self.character_store.journal is not None:
+            yield
+            return
+        before = self._undo_fields()
+        command_log = self.command_log
+        num_commands = len(command_log) if command_log is not None else 0
+        journal = self.character_store.journal = {}
+        try:
+            yield
+        finally:
+            self.character_store.journal = None
+        self._push_undo_step(journal, before)
+        # lets a Replay group the step's commands the same way, so that undos match
+        if command_log is not None and len(command_log) > num_commands:
+            command_log.append(CommandLog.STEP, len(command_log) - num_commands)
+
+    def _push_undo_step(self, journal, before):
+        after = self._undo_fields()
+        rows = {}
+        for row, state in journal.items():
+            new_state = self.character_store.row_state(row)
+            if new_state != state:
+                rows[row] = (state, new_state)
+        if rows or before != after:
+            self.undo_stack.push(UndoStep(rows, before, after))
+
+    def _apply_undo_step(self, step, fields, row_states):
+        """Puts back one side of a step, index 0 of row_states for undo, 1 for redo"""
+        moved = []
+        for row, states in step.rows.items():
+            previous_position = self.characters[row].position
+            self.character_store.set_row_state(row, states[row_states])
+            if self.characters[row].position != previous_position:
+                moved.append((self.characters[row], previous_position))
+        for name in GameState.UNDO_FIELDS:
+            setattr(self, name, fields[name])
+        self.rng.setstate(fields["rng_state"])
+
+        layers = fields["meta_grid_layers"]
+        self.board_state.update_meta_grid(
+            movable_tiles=layers[BoardState.MOVABLE_TILE],
+            attackable_tiles=layers[BoardState.NEIGHBOR_TILE],
+            friendly_tiles=layers[BoardState.FRIENDLY_TILE],
+            enemy_tiles=layers[BoardState.ENEMY_TILE],
+        )
+
+        # occupancy only has to follow the characters the step touched
+        if step.rows:
+            changed = [self.characters[row] for row in step.rows]
+            for c in changed:
+                if self.is_alive(c):
+                    self.board_state.occupancy.place(c.id, c.team_id, c.position)
+                else:
+                    self.board_state.occupancy.remove(c.id)
+            self.board_state.mark_characters_changed([c.id for c in changed])
+        # the threat maps also depend on the selection and its attack mask
+        self.update_unit_layers()
+        for character, previous_position in moved:
+            self.broadcast(
+                self.events.EVENT_CHARACTER_MOVE_SUCCESS,
+                dict(character),
+                previous_position,
+                character.position,
+            )
+
+    def undo(self, n=1):
+        """Reverts the last n undoable changes and returns the number of steps undone"""
+        undone = 0
+        while undone < n and self.undo_stack is not None and self.undo_stack.can_undo():
+            step = self.undo_stack.pop_undo()
+            self._apply_undo_step(step, step.before, 0)
+            undone += 1
+        if undone and self.command_log is not None:
+            self.command_log.append(CommandLog.UNDO, undone, self.turn)
+            # snapshots of the turns undone no longer describe the game, and replaying
+            # from them would need undo steps recorded before them
+            self.command_log.drop_snapshots_after(self.turn)
+        return undone
+
+    def redo(self, n=1):
+        """Re-applies up to n undone steps.  Returns the number of steps redone."""
+        redone = 0
+        while redone < n and self.undo_stack is not None and self.undo_stack.can_redo():
+            step = self.undo_stack.pop_redo()
+            self._apply_undo_step(step, step.after, 1)
+            redone += 1
+        if redone and self.command_log is not None:
+            self.command_log.append(CommandLog.REDO, redone, self.turn)
+        return redone
+
+    @undoable
+    def select_character(self, character):
+        """Hands the turn to another living character"""
+        if self.command_log is not None:
+            self.command_log.append(
+                CommandLog.SELECT, self.get_character_index(character)
+            )
+        self.selected_character = character
+        self.movable_tiles = self.get_movable_tiles_from_player_pos(character.position)
+        self.attackable_tiles = self.get_attackable_tiles_from_player_pos(
+            character.position
+        )
+        self.board_state.update_meta_grid(
+            movable_tiles=self.movable_tiles,
+            attackable_tiles=self.attackable_tiles,
+            friendly_tiles=[],
+            enemy_tiles=[],
+            self_tiles=[],
+        )
+        # the threat maps use the selected character's attack mask
+        self.update_unit_layers()
+
+    def get_character_index(self, character):
+        """Index of a character in self.characters, which follows the store rows"""
+        if character.store is not self.character_store:
+            raise ValueError(
+                "{} is not one of this game's characters".format(character.id)
+            )
+        return character.row
+
+    def get_character_by_id(self, character_id):
+        row = self.character_store.row_of(character_id)
+        return None if row is None else self.characters[row]
+
+    def get_character_at(self, position):
+        """Returns the living character standing on a tile, or None"""
+        for row in self.character_store.rows_at(position):
+            if self.character_store.alive[row]:
+                return self.characters[row]
+        return None
+
+    def get_team_members(self, team_id):
+        return [self.characters[row] for row in self.character_store.team_rows(team_id)]
 
     def assign_character_positions(self):
         tile_positions = list(self.board_state.terrain_grid.keys())
         num_characters_total = self.get_total_num_characters()
-        available_positions = random.sample(tile_positions, num_characters_total)
+        available_positions = self.rng.sample(tile_positions, num_characters_total)
         for c in self.characters:
             c.position = available_positions.pop()
             c.last_position = c.position  # this is initially the same
 
     def assign_character_teams(self):
         num_characters_total = self.get_total_num_characters()
-        sampled_characters = random.sample(self.characters, num_characters_total)
+        sampled_characters = self.rng.sample(self.characters, num_characters_total)
         print("sampled_characters: ", len(sampled_characters), num_characters_total)
         for t in self.teams:
             for _ in range(0, self.num_characters_per_team):
@@ -147,6 +509,7 @@ class GameState:
                 character.team_id = t.id
                 # print("character: ", character, " team: ", t)
 
+    @undoable
     def move_character(self, character, move_directional_tup):
         next_position = np.array(move_directional_tup) + np.array(character.position)
 
@@ -169,6 +532,11 @@ class GameState:
         ):
             prev_position = character.position
             character.position = tuple(player_neighbor_closest_to_desired_position)
+            self.board_state.occupancy.place(
+                character.id, character.team_id, character.position
+            )
+            self.board_state.mark_characters_changed([character.id])
+            self.update_unit_layers()
 
             self.attackable_tiles = self.get_attackable_tiles_from_player_pos(
                 self.selected_character.position
@@ -222,10 +590,9 @@ class GameState:
                 friendly_tiles=[],
                 enemy_tiles=[],
                 self_tiles=[],
-                cursor_position=self.cursor_position,
             )
             self.broadcast(
-                self.events.EVENT_CURSOR_MOVE_FAILED,
+                self.events.EVENT_CURSOR_MOVE_SUCCESS,
                 prev_position,
                 self.cursor_position,
             )
@@ -242,6 +609,8 @@ class GameState:
         if self.selected_character:
             # TODO: move player on board
             move_delta_tup = Conversions.serialize_gd_to_py(move_directional_vec)
+            if self.command_log is not None:
+                self.command_log.append(CommandLog.PLAYER_MOVE, *move_delta_tup)
 
             did_move, prev_pos, curr_pos = self.move_character(
                 self.selected_character, move_delta_tup
@@ -262,7 +631,11 @@ class GameState:
 
     def on_request_cursor_move(self, move_directional_vec):
         if self.cursor_position:
-            self.move_cursor(self.cursor_position, move_directional_vec)
+            move_delta_tup = Conversions.serialize_gd_to_py(move_directional_vec)
+            moved, _, _ = self.move_cursor(self.cursor_position, move_delta_tup)
+            # only moves that happened are logged, so that replays do not fail
+            if moved and self.command_log is not None:
+                self.command_log.append(CommandLog.CURSOR_MOVE, *move_delta_tup)
 
     def get_total_num_characters(self):
         return int(self.num_characters_per_team * self.num_teams)
@@ -274,20 +647,46 @@ class GameState:
             return False
         if desired_position == player_pos:
             return False
-
-        # TODO: this needs to validate against other player positions etc
+        # units can pass through friends but never end a move on another unit
+        if desired_position in self.board_state.occupancy:
+            return False
 
         return True
 
+    @undoable
     def on_end_turn(self, *args):
+        self._start_next_turn()
+        self.play_ai_turns()
+
+    def play_ai_turns(self, max_turns=None):
+        """Lets the registered controllers play their turns, returns the turns played"""
+        # stops at a team without a controller, a win or max_turns (default one round)
+        max_turns = len(self.characters) if max_turns is None else max_turns
+        turns_played = 0
+        while turns_played < max_turns and self.get_winning_team() is None:
+            controller = self.ai_controllers.get(self.selected_character.team_id)
+            if controller is None:
+                break
+            controller.take_turn(self, self.selected_character)
+            self._start_next_turn()
+            turns_played += 1
+        return turns_played
+
+    def _start_next_turn(self):
+        if self.command_log is not None:
+            self.command_log.append(CommandLog.NEXT_TURN)
+        self.turn += 1
         self.selected_character.last_position = self.selected_character.position
 
-        # swap characters
-        curr_char_idx = self.characters.index(self.selected_character)
-
-        self.selected_character = self.characters[
-            (curr_char_idx + 1) % len(self.characters)
-        ]
+        # swap characters, skipping defeated ones
+        curr_char_idx = self.get_character_index(self.selected_character)
+        for step in range(1, len(self.characters) + 1):
+            next_character = self.characters[
+                (curr_char_idx + step) % len(self.characters)
+            ]
+            if self.is_alive(next_character):
+                break
+        self.selected_character = next_character
 
         self.movable_tiles = self.get_movable_tiles_from_player_pos(
             self.selected_character.position
@@ -299,7 +698,7 @@ class GameState:
 
         # TODO: make this non-random
         # random.shuffle(GameState.AVAILABLE_ATTACK_MASKS)
-        self.selected_character_attack_mask = random.sample(
+        self.selected_character_attack_mask = self.rng.sample(
             GameState.AVAILABLE_ATTACK_MASKS, 1
         )[0]
 
@@ -313,12 +712,19 @@ class GameState:
             self_tiles=[],
         )
 
+        self.update_unit_layers()
+
         self.broadcast(
             self.events.EVENT_PLAYER_MOVE_SUCCESS,
             self.selected_character.position,
             self.selected_character.position,
         )
 
+        if self.command_log is not None and self.command_log.should_snapshot(self.turn):
+            self.command_log.add_snapshot(
+                self.turn, self.snapshot(compress=self.command_log.compress_snapshots)
+            )
+
         # TODO: change players/teams etc.
 
         # TODO: check for combat
@@ -328,9 +734,19 @@ class GameState:
         # TODO: add combat turn to queue if necessary
 
     def get_movable_tiles_from_player_pos(self, player_pos):
-        return self.board_state.movable_area(
-            player_pos, distance_budget=GameState.DEFAULT_MOVE_DISTANCE_BUDGET
+        movable_costs, self.movable_predecessors = self.board_state.reachable_area(
+            player_pos,
+            distance_budget=GameState.DEFAULT_MOVE_DISTANCE_BUDGET,
+            team_id=self.selected_character.team_id,
         )
+        occupancy = self.board_state.occupancy
+        return [
+            p for p in movable_costs if p == tuple(player_pos) or p not in occupancy
+        ]
+
+    def get_path_to_movable_tile(self, position):
+        """Returns the cheapest path to a highlighted movable tile, without a search"""
+        return BoardState.path_from_predecessors(self.movable_predecessors, position)
 
     def get_attackable_tiles_from_player_pos(self, player_pos):
         # Get tiles from mask
@@ -340,6 +756,198 @@ class GameState:
 
         return attackable_tiles
 
+    def get_character_attack_mask(self, character):
+        if character is self.selected_character:
+            return self.selected_character_attack_mask
+        if character.id in self.character_attack_masks:
+            return self.character_attack_masks[character.id]
+        return GameState.DEFAULT_ATTACK_MASK
+
+    def get_attackable_tiles_for_characters(self, characters=None):
+        """Returns the Dict[character id, List[tile]] of characters' attack tiles"""
+        characters = self.characters if characters is None else characters
+        tiles, owners = self.board_state.get_attack_areas(
+            [c.position for c in characters],
+            [self.get_character_attack_mask(c) for c in characters],
+        )
+        attackable_tiles = {c.id: [] for c in characters}
+        for owner, tile in zip(owners.tolist(), tiles.tolist()):
+            attackable_tiles[characters[owner].id].append(tuple(tile))
+        return attackable_tiles
+
+    def get_attack_pairs(self, characters=None, enemies_only=True):
+        """Returns every (attacker, target) pair of characters within attack range"""
+        characters = self.characters if characters is None else characters
+        pairs = self.board_state.get_attack_pairs(
+            [c.position for c in characters],
+            [self.get_character_attack_mask(c) for c in characters],
+        )
+        attack_pairs = []
+        for attacker_idx, target_idx in pairs.tolist():
+            attacker = characters[attacker_idx]
+            target = characters[target_idx]
+            if enemies_only and attacker.team_id == target.team_id:
+                continue
+            attack_pairs.append((attacker, target))
+        return attack_pairs
+
+    def _alive_units(self):
+        """(ids, team ids, positions) of the living characters, read column by column"""
+        store = self.character_store
+        rows = store.alive_rows().tolist()
+        ids = [store.ids[row] for row in rows]
+        team_ids = [store.team_ids[t] for t in store.team_indices[rows].tolist()]
+        positions = list(map(tuple, store.positions[rows].tolist()))
+        return ids, team_ids, positions
+
+    def update_occupancy(self, units=None):
+        """Rebuilds the occupancy layer from every character"""
+        self.board_state.occupancy.sync(zip(*(units or self._alive_units())))
+
+    def update_visibility(self, units=None):
+        """Recomputes fog of war for the characters that moved since the last update"""
+        return self.visibility.update_units(zip(*(units or self._alive_units())))
+
+    def update_influence(self, units=None):
+        """Updates the team threat maps for the characters that moved since last time"""
+        ids, team_ids, positions = units or self._alive_units()
+        masks = [
+            self.character_attack_masks.get(character_id, GameState.DEFAULT_ATTACK_MASK)
+            for character_id in ids
+        ]
+        selected = self.selected_character
+        if selected.store is self.character_store and selected.id in ids:
+            masks[ids.index(selected.id)] = self.selected_character_attack_mask
+        return self.influence.update_units(
+            zip(
+                ids,
+                team_ids,
+                positions,
+                masks,
+                [InfluenceMap.DEFAULT_DAMAGE] * len(ids),
+            )
+        )
+
+    def update_unit_layers(self, units=None):
+        """Brings fog of war and the threat maps in line with the living characters"""
+        units = units or self._alive_units()
+        self.update_visibility(units)
+        self.update_influence(units)
+
+    def is_alive(self, character):
+        return character.hit_points > 0
+
+    def get_winning_team(self):
+        """Returns the id of the last team standing, or None"""
+        store = self.character_store
+        alive_teams = np.unique(store.team_indices[store.alive_rows()])
+        if len(alive_teams) == 1:
+            return store.team_ids[alive_teams[0]]
+        return None
+
+    @undoable
+    def attack_character(self, attacker, target, damage=DEFAULT_ATTACK_DAMAGE):
+        target.hit_points -= damage
+        if not self.is_alive(target):
+            self.board_state.occupancy.remove(target.id)
+        self.board_state.mark_characters_changed([target.id])
+        self.update_unit_layers()
+
+    @undoable
+    def perform_action(self, character, move_to, target=None):
+        """Moves a character to a tile it can reach and optionally attacks a target"""
+        if tuple(move_to) not in self.board_state.movable_area(
+            character.position,
+            distance_budget=GameState.DEFAULT_MOVE_DISTANCE_BUDGET,
+            team_id=character.team_id,
+        ):
+            raise ValueError(
+                f"{character.id} cannot move to {tuple(move_to)} this turn"
+            )
+        if target is not None:
+            # raises for characters of another game
+            self.get_character_index(target)
+            if not self.is_alive(target) or target.team_id == character.team_id:
+                raise ValueError(f"{character.id} cannot attack {target.id}")
+            in_range = self.board_state.get_attack_pairs(
+                [move_to],
+                [self.get_character_attack_mask(character)],
+                target_positions=[target.position],
+            )
+            if len(in_range) == 0:
+                raise ValueError(f"{target.id} is out of reach from {tuple(move_to)}")
+        if self.command_log is not None:
+            self.command_log.append(
+                CommandLog.ACTION,
+                self.get_character_index(character),
+                *(int(p) for p in move_to),
+                CommandLog.NO_TARGET
+                if target is None
+                else self.get_character_index(target),
+            )
+        if tuple(move_to) != tuple(character.position):
+            character.position = tuple(move_to)
+            self.board_state.occupancy.place(
+                character.id, character.team_id, character.position
+            )
+            self.board_state.mark_characters_changed([character.id])
+        if target is not None:
+            self.attack_character(character, target)
+        else:
+            self.update_unit_layers()
+
+    def fork(self):
+        """Returns a TacticalState copy for search and the characters it holds"""
+        # forking copies a few flat lists, never the board
+        if self._reach_cache_version != self.board_state.terrain_version:
+            self._reach_cache = OrderedDict()
+            self._column_tops = {}
+            self._reach_cache_version = self.board_state.terrain_version
+        characters = list(self.characters)
+        attack_offsets = [
+            set(
+                map(
+                    tuple,
+                    BoardState.compile_2d_mask(
+                        self.get_character_attack_mask(c)
+                    ).tolist(),
+                )
+            )
+            for c in characters
+        ]
+        store = self.character_store
+        rows = [c.row for c in characters]
+        state = TacticalState(
+            self.board_state,
+            map(tuple, store.positions[rows].tolist()),
+            np.maximum(store.hit_points[rows], 0).tolist(),
+            [store.team_ids[t] for t in store.team_indices[rows].tolist()],
+            attack_offsets,
+            current_unit=self.selected_character.row
+            if self.selected_character.store is store
+            else 0,
+            move_budget=GameState.DEFAULT_MOVE_DISTANCE_BUDGET,
+            attack_damage=GameState.DEFAULT_ATTACK_DAMAGE,
+            reach_cache=self._reach_cache,
+            column_tops=self._column_tops,
+        )
+        return state, characters
+
+    def register_ai_controller(self, team_id, controller):
+        """Lets a controller (see AIController) play every turn of a team"""
+        self.ai_controllers[team_id] = controller
+
+    def get_danger_tiles_for_team(self, team_id):
+        """Tiles that an enemy of team_id can attack next turn"""
+        return self.influence.danger_tiles(team_id)
+
+    def get_visible_tiles_for_team(self, team_id):
+        return self.visibility.team_visible_tiles(team_id)
+
+    def has_line_of_sight(self, attacker, target):
+        """True when the attacker can see the target, e.g. for ranged attacks"""
+        return self.visibility.line_of_sight(attacker.position, target.position)
+
     def broadcast(self, event_name, *args):
         if self.game_manager != None:
             self.game_manager.broadcast(event_name, *args)
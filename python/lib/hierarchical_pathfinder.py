@@ -0,0 +1,293 @@
+from heapq import heappush, heappop
+from typing import List, Tuple
+import numpy as np
+
+from .adjacency_graph import AdjacencyGraph
+from .board_state import BoardState
+
+
+class HierarchicalPathfinder:
+    """Hierarchical pathfinding (HPA*) layer over a BoardState"""
+
+    # the board is split into square (x, z) clusters; runs of edges crossing between two
+    # clusters become entrances whose end nodes are abstract nodes.  Queries search the
+    # abstract graph, then refine each abstract edge within a single cluster
+
+    DEFAULT_CLUSTER_SIZE = 16
+    # entrances at least this long get a transition at both ends instead of the middle
+    LONG_ENTRANCE_LENGTH = 6
+
+    def __init__(self, board_state, cluster_size=DEFAULT_CLUSTER_SIZE):
+        self.board_state = board_state
+        self.cluster_size = cluster_size
+        self._build()
+
+    def _build(self):
+        graph = self.board_state.adjacency
+        if graph is None:
+            raise ValueError("hierarchical pathfinding needs an adjacency graph")
+        self.adjacency = graph
+        self.terrain_version = self.board_state.terrain_version
+
+        # python lists make the per-node search loops much faster than numpy slicing
+        self._offsets = graph.offsets.tolist()
+        self._indices = graph.indices.tolist()
+        self._costs = graph.costs.tolist()
+        self._positions = graph.node_positions.tolist()
+
+        positions = graph.node_positions.astype(np.int64)
+        if graph.num_nodes:
+            min_xz = positions[:, [0, 2]].min(axis=0)
+        else:
+            min_xz = np.zeros(2, dtype=np.int64)
+        self._cluster_origin = min_xz.tolist()
+        cluster_xz = (positions[:, [0, 2]] - min_xz) // self.cluster_size
+        num_cluster_z = int(cluster_xz[:, 1].max()) + 1 if graph.num_nodes else 1
+        self.node_clusters = (
+            cluster_xz[:, 0] * num_cluster_z + cluster_xz[:, 1]
+        ).astype(np.int32)
+        self._node_clusters = self.node_clusters.tolist()
+
+        # abstract node -> list of (abstract node, cost) across cluster borders
+        self._inter_edges = {}
+        # cluster -> entrance nodes in that cluster
+        self._cluster_entrances = {}
+        # cluster -> {abstract node: [(abstract node, cost)]} within that cluster
+        self._intra_edges = {}
+        self._build_entrances()
+
+    def _build_entrances(self):
+        graph = self.adjacency
+        sources = np.repeat(
+            np.arange(graph.num_nodes, dtype=np.int32), np.diff(graph.offsets)
+        )
+        targets = graph.indices
+        crossing = self.node_clusters[sources] != self.node_clusters[targets]
+        # each undirected crossing edge once
+        crossing &= sources < targets
+        sources = sources[crossing]
+        targets = targets[crossing]
+        costs = graph.costs[crossing]
+        if len(sources) == 0:
+            return
+
+        # entrances are grouped by the connected component on each side, so that every
+        # part of a cluster that touches a border gets its own transition
+        components = self._cluster_components()
+        source_first = self.node_clusters[sources] < self.node_clusters[targets]
+        cluster_a = np.where(source_first, components[sources], components[targets])
+        cluster_b = np.where(source_first, components[targets], components[sources])
+        positions = graph.node_positions
+        # clusters next to each other along x share a border along z, and vice versa
+        along_z = positions[sources, 0] != positions[targets, 0]
+        along = np.where(along_z, positions[sources, 2], positions[sources, 0])
+
+        order = np.lexsort((along, cluster_b, cluster_a))
+        run = []
+        for i in order.tolist():
+            if run:
+                last = run[-1]
+                same_border = (cluster_a[i], cluster_b[i]) == (
+                    cluster_a[last],
+                    cluster_b[last],
+                )
+                if not same_border or along[i] - along[last] > 1:
+                    self._add_transitions(run, sources, targets, costs)
+                    run = []
+            run.append(i)
+        self._add_transitions(run, sources, targets, costs)
+
+    def _cluster_components(self):
+        """Labels every node with the smallest node of its component in its cluster"""
+        graph = self.adjacency
+        sources = np.repeat(
+            np.arange(graph.num_nodes, dtype=np.int32), np.diff(graph.offsets)
+        )
+        targets = graph.indices
+        internal = self.node_clusters[sources] == self.node_clusters[targets]
+        sources = sources[internal]
+        targets = targets[internal]
+
+        labels = np.arange(graph.num_nodes, dtype=np.int32)
+        while True:
+            next_labels = labels.copy()
+            np.minimum.at(next_labels, sources, labels[targets])
+            # pointer jumping speeds up propagation across long components
+            next_labels = next_labels[next_labels]
+            if np.array_equal(next_labels, labels):
+                return labels
+            labels = next_labels
+
+    def _add_transitions(self, run, sources, targets, costs):
+        if len(run) >= HierarchicalPathfinder.LONG_ENTRANCE_LENGTH:
+            picks = [run[0], run[-1]]
+        else:
+            picks = [run[len(run) // 2]]
+        for i in picks:
+            u, v, cost = int(sources[i]), int(targets[i]), float(costs[i])
+            self._inter_edges.setdefault(u, []).append((v, cost))
+            self._inter_edges.setdefault(v, []).append((u, cost))
+            for node in (u, v):
+                entrances = self._cluster_entrances.setdefault(
+                    self._node_clusters[node], []
+                )
+                if node not in entrances:
+                    entrances.append(node)
+
+    def _cluster_search(self, source, clusters, targets=None):
+        """Dijkstra from source within clusters, until every target is settled"""
+        offsets = self._offsets
+        indices = self._indices
+        edge_costs = self._costs
+        node_clusters = self._node_clusters
+        remaining = set(targets) if targets is not None else None
+
+        costs = {}
+        predecessors = {source: None}
+        tentative = {source: 0.0}
+        q = [(0.0, source)]
+        while q:
+            cost, v = heappop(q)
+            if v in costs:
+                continue
+            costs[v] = cost
+            if remaining is not None:
+                remaining.discard(v)
+                if not remaining:
+                    break
+            for e in range(offsets[v], offsets[v + 1]):
+                n = indices[e]
+                if n in costs or node_clusters[n] not in clusters:
+                    continue
+                n_cost = cost + edge_costs[e]
+                if n_cost < tentative.get(n, float("INF")):
+                    tentative[n] = n_cost
+                    predecessors[n] = v
+                    heappush(q, (n_cost, n))
+        return costs, predecessors
+
+    def precompute(self):
+        """Computes the intra-cluster edges of every cluster instead of on first use"""
+        for cluster in self._cluster_entrances:
+            self._get_intra_edges(cluster)
+
+    def _get_intra_edges(self, cluster):
+        if cluster not in self._intra_edges:
+            entrances = self._cluster_entrances.get(cluster, [])
+            edges = {}
+            for e in entrances:
+                costs, _ = self._cluster_search(e, {cluster}, targets=entrances)
+                edges[e] = [(o, costs[o]) for o in entrances if o != e and o in costs]
+            self._intra_edges[cluster] = edges
+        return self._intra_edges[cluster]
+
+    def _are_neighboring_clusters(self, a, b):
+        """True when nodes a and b are in the same or in directly adjacent clusters"""
+        (x1, _, z1) = self._positions[a]
+        (x2, _, z2) = self._positions[b]
+        size = self.cluster_size
+        ox, oz = self._cluster_origin
+        return (
+            abs((x1 - ox) // size - (x2 - ox) // size)
+            + abs((z1 - oz) // size - (z2 - oz) // size)
+            <= 1
+        )
+
+    def _heuristic(self, a, b):
+        (x1, y1, z1) = self._positions[a]
+        (x2, y2, z2) = self._positions[b]
+        return abs(x2 - x1) + (abs(y2 - y1) * self.board_state.Y_WEIGHT) + abs(z2 - z1)
+
+    def _abstract_search(self, start, goal):
+        """A* over the abstract graph with start and goal temporarily inserted"""
+        start_cluster = self._node_clusters[start]
+        goal_cluster = self._node_clusters[goal]
+
+        start_entrances = self._cluster_entrances.get(start_cluster, [])
+        start_costs, _ = self._cluster_search(
+            start, {start_cluster}, targets=start_entrances
+        )
+        goal_entrances = self._cluster_entrances.get(goal_cluster, [])
+        goal_costs, _ = self._cluster_search(
+            goal, {goal_cluster}, targets=goal_entrances
+        )
+
+        g_scores = {start: 0.0}
+        came_from = {start: None}
+        closed = set()
+        q = [(self._heuristic(start, goal), start)]
+        while q:
+            _, u = heappop(q)
+            if u in closed:
+                continue
+            if u == goal:
+                break
+            closed.add(u)
+
+            if u == start:
+                edges = [(e, c) for e, c in start_costs.items() if e in start_entrances]
+                edges += self._inter_edges.get(u, [])
+            else:
+                edges = list(self._inter_edges.get(u, []))
+                edges += self._get_intra_edges(self._node_clusters[u]).get(u, [])
+                if u in goal_costs and self._node_clusters[u] == goal_cluster:
+                    edges.append((goal, goal_costs[u]))
+            for v, cost in edges:
+                if v in closed:
+                    continue
+                g = g_scores[u] + cost
+                if g < g_scores.get(v, float("INF")):
+                    g_scores[v] = g
+                    came_from[v] = u
+                    heappush(q, (g + self._heuristic(v, goal), v))
+
+        if goal not in came_from:
+            return None, float("INF")
+        return BoardState.path_from_predecessors(came_from, goal), g_scores[goal]
+
+    def _refine_segment(self, u, v):
+        cluster = self._node_clusters[u]
+        if cluster != self._node_clusters[v]:
+            # entrance edges are single steps between clusters
+            return [u, v]
+        _, predecessors = self._cluster_search(u, {cluster}, targets=[v])
+        return BoardState.path_from_predecessors(predecessors, v)
+
+    def find_path_indices(self, start, goal) -> Tuple[List[int], float]:
+        """Returns (node indices, cost) of a near-optimal path, or (None, INF)"""
+        if start == goal:
+            return [start], 0.0
+
+        abstract_path, cost = self._abstract_search(start, goal)
+
+        # a path that stays inside the start and goal clusters can beat the abstract
+        # path, which has to go through entrances
+        if self._are_neighboring_clusters(start, goal):
+            clusters = {self._node_clusters[start], self._node_clusters[goal]}
+            local_costs, local_predecessors = self._cluster_search(
+                start, clusters, targets=[goal]
+            )
+            if goal in local_costs and local_costs[goal] <= cost:
+                path = BoardState.path_from_predecessors(local_predecessors, goal)
+                return path, local_costs[goal]
+
+        if abstract_path is None:
+            return None, float("INF")
+
+        path = [start]
+        for u, v in zip(abstract_path, abstract_path[1:]):
+            path.extend(self._refine_segment(u, v)[1:])
+        return path, cost
+
+    def find_path(self, start, goal) -> List[Tuple[int, int, int]]:
+        """Returns a near-optimal path of positions from start to goal, or None"""
+        if self.terrain_version != self.board_state.terrain_version:
+            self._build()
+        start_idx = self.adjacency.index_of(start)
+        goal_idx = self.adjacency.index_of(goal)
+        if AdjacencyGraph.NULL_INDEX in (start_idx, goal_idx):
+            return None
+        path, _ = self.find_path_indices(start_idx, goal_idx)
+        if path is None:
+            return None
+        return self.adjacency.positions_of(path)
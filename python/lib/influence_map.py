@@ -0,0 +1,232 @@
+from typing import List, Tuple
+import numpy as np
+
+from .board_state import BoardState
+
+
+class InfluenceMap:
+    """Per-team threat and expected damage over the (x, z) columns of a BoardState"""
+
+    # a unit's footprint is its movement reach dilated by its attack mask; footprints
+    # are kept per unit, so updates only recompute units whose reach may have changed
+
+    DEFAULT_DAMAGE = 1.0
+    CHUNK_SIZE = 32
+
+    def __init__(self, board_state, move_budget=BoardState.DEFAULT_DISTANCE_BUDGET):
+        self.board_state = board_state
+        self.move_budget = move_budget
+        self._reset()
+        board_state.register_cache(self)
+
+    def _reset(self):
+        self.terrain_version = self.board_state.terrain_version
+        # team id -> (x // CHUNK_SIZE, z // CHUNK_SIZE) -> block of the number of
+        # units that can attack each column next turn, or the sum of their damage;
+        # only blocks some footprint touches exist, so memory follows the units
+        self.threat = {}
+        self.damage = {}
+        # unit id -> (team id, position, mask, damage, window origin, footprint)
+        self._units = {}
+        # units whose footprint a terrain change may have altered
+        self._stale_units = set()
+
+    def invalidate(self, event, old_version, new_version, region):
+        """Marks the units near changed terrain as stale instead of recomputing them"""
+        if event != BoardState.TERRAIN_CHANGED or self.terrain_version != old_version:
+            return
+        if region is None:
+            self._reset()
+            return
+        self.terrain_version = new_version
+        changed_xz = np.asarray(region, dtype=np.int64).reshape(-1, 3)[:, [0, 2]]
+        for unit_id, (_, position, mask_2d, _, _, _) in self._units.items():
+            offsets = BoardState.compile_2d_mask(mask_2d).astype(np.int64)
+            mask_extent = int(np.abs(offsets).sum(axis=1).max()) if len(offsets) else 0
+            # the reach can be opened or blocked, attacked columns can appear or vanish
+            radius = self.move_budget + 1 + mask_extent
+            unit_xz = np.array([position[0], position[2]])
+            distances = np.abs(changed_xz - unit_xz).sum(axis=1)
+            if np.any(distances <= radius):
+                self._stale_units.add(unit_id)
+
+    def compute_footprint(
+        self, team_id, position, mask_2d
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the (x, z) origin and window of the columns a unit can attack"""
+        reach = self.board_state.movable_area(
+            position, distance_budget=self.move_budget, team_id=team_id
+        )
+        reach_xz = np.asarray(reach, dtype=np.int64).reshape(-1, 3)[:, [0, 2]]
+        offsets = BoardState.compile_2d_mask(mask_2d).astype(np.int64)
+        if len(reach_xz) == 0 or len(offsets) == 0:
+            return np.zeros(2, dtype=np.int64), np.zeros((0, 0), dtype=bool)
+
+        reach_min = reach_xz.min(axis=0)
+        reach_shape = tuple(reach_xz.max(axis=0) - reach_min + 1)
+        reach_grid = np.zeros(reach_shape, dtype=bool)
+        reach_grid[reach_xz[:, 0] - reach_min[0], reach_xz[:, 1] - reach_min[1]] = True
+
+        # dilate the reach by the mask: one shifted OR per mask cell over a window that
+        # covers the reach plus the mask's extent
+        offsets_min = offsets.min(axis=0)
+        span = offsets.max(axis=0) - offsets_min
+        footprint = np.zeros(tuple(np.array(reach_shape) + span), dtype=bool)
+        for dx, dz in (offsets - offsets_min).tolist():
+            footprint[dx : dx + reach_shape[0], dz : dz + reach_shape[1]] |= reach_grid
+        lo = reach_min + offsets_min
+
+        # only columns that hold terrain can be attacked
+        cells = np.argwhere(footprint)
+        _, valid = self.board_state.get_grid_pos_2d_batch(cells + lo)
+        footprint[cells[~valid, 0], cells[~valid, 1]] = False
+        return lo, footprint
+
+    def _apply(self, team_id, window_origin, footprint, damage, sign):
+        if not footprint.any():
+            return
+        threat_chunks = self.threat.setdefault(team_id, {})
+        damage_chunks = self.damage.setdefault(team_id, {})
+        size = InfluenceMap.CHUNK_SIZE
+        lo = window_origin
+        hi = lo + np.array(footprint.shape)
+        for cx in range(lo[0] // size, (hi[0] - 1) // size + 1):
+            for cz in range(lo[1] // size, (hi[1] - 1) // size + 1):
+                chunk_lo = np.array([cx * size, cz * size])
+                clip_lo = np.maximum(lo, chunk_lo)
+                clip_hi = np.minimum(hi, chunk_lo + size)
+                window = footprint[
+                    clip_lo[0] - lo[0] : clip_hi[0] - lo[0],
+                    clip_lo[1] - lo[1] : clip_hi[1] - lo[1],
+                ]
+                if not window.any():
+                    continue
+                key = (cx, cz)
+                if key not in threat_chunks:
+                    threat_chunks[key] = np.zeros((size, size), dtype=np.int16)
+                    damage_chunks[key] = np.zeros((size, size), dtype=np.float32)
+                chunk_slice = (
+                    slice(clip_lo[0] - chunk_lo[0], clip_hi[0] - chunk_lo[0]),
+                    slice(clip_lo[1] - chunk_lo[1], clip_hi[1] - chunk_lo[1]),
+                )
+                threat_chunks[key][chunk_slice] += sign * window.astype(np.int16)
+                damage_chunks[key][chunk_slice] += sign * damage * window
+                # chunks no footprint covers any more are dropped
+                if sign < 0 and not threat_chunks[key].any():
+                    del threat_chunks[key]
+                    del damage_chunks[key]
+
+    def remove_unit(self, unit_id):
+        if unit_id not in self._units:
+            return
+        team_id, _, _, damage, window_origin, footprint = self._units.pop(unit_id)
+        self._apply(team_id, window_origin, footprint, damage, -1)
+
+    def update_unit(self, unit_id, team_id, position, mask_2d, damage=DEFAULT_DAMAGE):
+        self.remove_unit(unit_id)
+        position = tuple(position)
+        window_origin, footprint = self.compute_footprint(team_id, position, mask_2d)
+        self._apply(team_id, window_origin, footprint, damage, 1)
+        self._units[unit_id] = (
+            team_id,
+            position,
+            mask_2d,
+            damage,
+            window_origin,
+            footprint,
+        )
+
+    def update_units(self, units) -> int:
+        """Syncs the maps with the (id, team id, position, mask, damage) of all units"""
+        # returns the number of units recomputed, units no longer listed are removed
+        units = [tuple(u) for u in units]
+        if self.terrain_version != self.board_state.terrain_version:
+            self._reset()
+
+        # tiles that were vacated or newly occupied can open or block other units' reach
+        changed_positions = []
+        dirty = self._stale_units
+        self._stale_units = set()
+        listed = set()
+        for unit_id, team_id, position, mask_2d, damage in units:
+            listed.add(unit_id)
+            previous = self._units.get(unit_id)
+            if previous is None:
+                dirty.add(unit_id)
+                changed_positions.append(tuple(position))
+            elif previous[:4] != (team_id, tuple(position), mask_2d, damage):
+                dirty.add(unit_id)
+                if previous[1] != tuple(position):
+                    changed_positions.extend([previous[1], tuple(position)])
+        for unit_id in [u for u in self._units if u not in listed]:
+            changed_positions.append(self._units[unit_id][1])
+            self.remove_unit(unit_id)
+
+        if changed_positions and units:
+            # reach costs at least 1 per column, so blockers further away cannot matter
+            radius = self.move_budget + 1
+            unit_xz = np.array([u[2] for u in units], dtype=np.int64)[:, [0, 2]]
+            changed_xz = np.array(changed_positions, dtype=np.int64)[:, [0, 2]]
+            distances = np.abs(unit_xz[:, None, :] - changed_xz[None, :, :]).sum(axis=2)
+            near = np.any(distances <= radius, axis=1)
+            dirty.update(units[i][0] for i in np.flatnonzero(near).tolist())
+
+        dirty &= listed
+        for unit_id, team_id, position, mask_2d, damage in units:
+            if unit_id in dirty:
+                self.update_unit(unit_id, team_id, position, mask_2d, damage)
+        return len(dirty)
+
+    def _sum_other_teams(self, chunk_maps, team_id, dtype):
+        """Sums the chunks of every team but team_id, by chunk key"""
+        total = {}
+        for other_team_id, chunks in chunk_maps.items():
+            if other_team_id == team_id:
+                continue
+            for key, chunk in chunks.items():
+                if key not in total:
+                    total[key] = np.zeros(chunk.shape, dtype=dtype)
+                total[key] += chunk
+        return total
+
+    def _nonzero_columns(self, chunks):
+        """Flattens chunks into a Dict[(x, z), value] of their nonzero columns"""
+        size = InfluenceMap.CHUNK_SIZE
+        columns = {}
+        for (cx, cz), chunk in chunks.items():
+            cells = np.argwhere(chunk != 0)
+            values = chunk[cells[:, 0], cells[:, 1]].tolist()
+            for (lx, lz), value in zip(cells.tolist(), values):
+                columns[(cx * size + lx, cz * size + lz)] = value
+        return columns
+
+    def enemy_threat(self, team_id):
+        """Number of enemy units that can attack each (x, z) column next turn"""
+        return self._nonzero_columns(
+            self._sum_other_teams(self.threat, team_id, np.int16)
+        )
+
+    def enemy_damage(self, team_id):
+        """Expected damage each (x, z) column can take from enemies next turn"""
+        return self._nonzero_columns(
+            self._sum_other_teams(self.damage, team_id, np.float32)
+        )
+
+    def threat_at(self, team_id, position) -> int:
+        """Number of enemies of team_id that can attack a tile next turn"""
+        x, _, z = position
+        size = InfluenceMap.CHUNK_SIZE
+        key = (x // size, z // size)
+        return sum(
+            int(chunks[key][x % size, z % size])
+            for other_team_id, chunks in self.threat.items()
+            if other_team_id != team_id and key in chunks
+        )
+
+    def danger_tiles(self, team_id) -> List[Tuple[int, int, int]]:
+        """Tiles that some enemy of team_id can attack next turn, e.g. for overlays"""
+        columns = list(self.enemy_threat(team_id).keys())
+        if not columns:
+            return []
+        positions, valid = self.board_state.get_grid_pos_2d_batch(columns)
+        return [tuple(p) for p in positions[valid].tolist()]
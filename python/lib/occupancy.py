@@ -0,0 +1,94 @@
+from typing import List, Tuple
+
+
+class OccupancyLayer:
+    """Dynamic layer of the units on the terrain, so moving one never rebuilds it"""
+
+    # units pass through tiles held by friends, are blocked by tiles held by enemies and
+    # can only stop on tiles nobody else holds
+
+    def __init__(self, on_change=None):
+        # position -> (unit id, team id)
+        self._occupants = {}
+        # unit id -> position
+        self._positions = {}
+        # bumped on every change, so that caches keyed by it go stale
+        self.version = 0
+        # called with (old version, new version, changed positions) after every change
+        self.on_change = on_change
+
+    def _bump_version(self, changed_positions):
+        old_version = self.version
+        self.version += 1
+        if self.on_change is not None:
+            self.on_change(old_version, self.version, changed_positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, position):
+        return tuple(position) in self._occupants
+
+    def place(self, unit_id, team_id, position):
+        """Places a unit, or moves it if it is already on the board"""
+        position = tuple(position)
+        changed_positions = [position]
+        if unit_id in self._positions:
+            previous_position = self._positions[unit_id]
+            self._occupants.pop(previous_position, None)
+            if previous_position != position:
+                changed_positions.append(previous_position)
+        self._occupants[position] = (unit_id, team_id)
+        self._positions[unit_id] = position
+        self._bump_version(changed_positions)
+
+    def move(self, unit_id, position):
+        _, team_id = self._occupants[self._positions[unit_id]]
+        self.place(unit_id, team_id, position)
+
+    def remove(self, unit_id):
+        if unit_id not in self._positions:
+            return
+        position = self._positions.pop(unit_id)
+        self._occupants.pop(position, None)
+        self._bump_version([position])
+
+    def clear(self):
+        self.sync([])
+
+    def sync(self, units):
+        """Replaces the layer with an iterable of (unit id, team id, position)"""
+        previous_occupants = self._occupants
+        self._occupants = {}
+        self._positions = {}
+        for unit_id, team_id, position in units:
+            position = tuple(position)
+            self._occupants[position] = (unit_id, team_id)
+            self._positions[unit_id] = position
+        changed_positions = [
+            p
+            for p in set(previous_occupants) | set(self._occupants)
+            if previous_occupants.get(p) != self._occupants.get(p)
+        ]
+        self._bump_version(changed_positions)
+
+    def occupant(self, position) -> Tuple[str, str]:
+        """Returns the (unit id, team id) standing on a tile, or None"""
+        return self._occupants.get(tuple(position))
+
+    def position_of(self, unit_id):
+        return self._positions.get(unit_id)
+
+    def is_passable(self, position, team_id) -> bool:
+        """True when a unit of team_id can move through a tile"""
+        occupant = self._occupants.get(position)
+        return occupant is None or occupant[1] == team_id
+
+    def blocked_positions(self, team_id) -> List[Tuple[int, int, int]]:
+        """Returns every tile a unit of team_id cannot move through"""
+        return [p for p, (_, t) in self._occupants.items() if t != team_id]
+
+    def can_stop_at(self, position, unit_id) -> bool:
+        """True when a unit can end its move on a tile"""
+        occupant = self._occupants.get(tuple(position))
+        return occupant is None or occupant[0] == unit_id
@@ -0,0 +1,140 @@
+from collections import OrderedDict
+
+
+class PathCache:
+    """Bounded LRU cache of A* paths, also answering queries for their sub-paths"""
+
+    # keyed by (start, goal, terrain_version, occupancy_version), where the occupancy
+    # version can be any hashable, e.g. None for searches that ignore units
+
+    DEFAULT_MAX_SIZE = 1024
+    NOT_CACHED = object()
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, distance=None):
+        self.max_size = max_size
+        # admissible step cost estimate, tells which paths a local change can affect
+        self.distance = distance
+        self.hits = 0
+        self.misses = 0
+        self._paths = OrderedDict()
+        self._costs = {}
+        # node -> keys of the cached paths that pass through it
+        self._node_keys = {}
+
+    def __len__(self):
+        return len(self._paths)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._paths),
+            "max_size": self.max_size,
+        }
+
+    def clear(self):
+        self._paths.clear()
+        self._costs.clear()
+        self._node_keys.clear()
+
+    def get(self, start, goal, terrain_version, occupancy_version):
+        """Returns the cached path, None for a cached "no path" or NOT_CACHED"""
+        key = (start, goal, terrain_version, occupancy_version)
+        if key in self._paths:
+            self._paths.move_to_end(key)
+            self.hits += 1
+            return self._paths[key]
+
+        path = self._get_sub_path(start, goal, terrain_version, occupancy_version)
+        if path is not None:
+            self.hits += 1
+            return path
+
+        self.misses += 1
+        return PathCache.NOT_CACHED
+
+    def _get_sub_path(self, start, goal, terrain_version, occupancy_version):
+        start_keys = self._node_keys.get(start)
+        goal_keys = self._node_keys.get(goal)
+        if not start_keys or not goal_keys:
+            return None
+        if len(goal_keys) < len(start_keys):
+            start_keys, goal_keys = goal_keys, start_keys
+        for key in start_keys:
+            if key not in goal_keys or key[2:] != (terrain_version, occupancy_version):
+                continue
+            path = self._paths[key]
+            start_idx = path.index(start)
+            goal_idx = path.index(goal)
+            self._paths.move_to_end(key)
+            if start_idx <= goal_idx:
+                return path[start_idx : goal_idx + 1]
+            return tuple(reversed(path[goal_idx : start_idx + 1]))
+        return None
+
+    def put(self, start, goal, terrain_version, occupancy_version, path):
+        """Caches a path, or None for no path, and evicts the least recently used"""
+        key = (start, goal, terrain_version, occupancy_version)
+        if key in self._paths:
+            self._remove(key)
+        self._paths[key] = None if path is None else tuple(path)
+        if path is not None:
+            for node in self._paths[key]:
+                self._node_keys.setdefault(node, set()).add(key)
+            if self.distance is not None:
+                self._costs[key] = sum(
+                    self.distance(a, b) for a, b in zip(path, path[1:])
+                )
+        while len(self._paths) > self.max_size:
+            self._remove(next(iter(self._paths)))
+
+    def _is_affected(self, key, changed_positions):
+        """True when a change at any of the positions could make a cached path wrong"""
+        # i.e. it runs through a changed tile, or going through one could be cheaper
+        path = self._paths[key]
+        if path is None or key not in self._costs:
+            return True
+        if any(
+            p in self._node_keys and key in self._node_keys[p]
+            for p in changed_positions
+        ):
+            return True
+        start, goal = key[0], key[1]
+        cost = self._costs[key]
+        return any(
+            self.distance(start, p) + self.distance(p, goal) < cost
+            for p in changed_positions
+        )
+
+    def carry_over(self, rekey, changed_positions):
+        """Moves the cached results a local change cannot affect to new version keys"""
+        # rekey maps a key to its new version, or to None for keys the change does not
+        # concern
+        changed_positions = [tuple(p) for p in changed_positions]
+        entries = OrderedDict()
+        for key, path in list(self._paths.items()):
+            new_key = rekey(key)
+            if new_key is None or new_key == key:
+                entries[key] = path
+                continue
+            cost = self._costs.get(key)
+            affected = self._is_affected(key, changed_positions)
+            self._remove(key)
+            if not affected:
+                entries[new_key] = path
+                self._costs[new_key] = cost
+                for node in path:
+                    self._node_keys.setdefault(node, set()).add(new_key)
+        self._paths = entries
+
+    def _remove(self, key):
+        path = self._paths.pop(key)
+        self._costs.pop(key, None)
+        if path is None:
+            return
+        for node in path:
+            keys = self._node_keys.get(node)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._node_keys[node]
@@ -0,0 +1,47 @@
+import contextlib
+
+from .command_log import CommandLog
+
+
+class Replay:
+    """Re-plays the CommandLog of one GameState on another over the same terrain"""
+
+    def __init__(self, game_state, command_log: CommandLog):
+        self.game_state = game_state
+        self.command_log = command_log
+        # the replayed game must not log the commands it is replaying
+        game_state.command_log = None
+        # number of commands applied by the last seek
+        self.commands_applied = 0
+
+    def seek(self, turn):
+        """Returns the game as it was at the start of a turn, or at the log's end"""
+        # only the commands after the nearest snapshot up to the turn are applied
+        snapshot_turn, offset, snapshot = self.command_log.nearest_snapshot(turn)
+        # turns an undo took the game back from are skipped, the game never stayed there
+        end = self.command_log.turn_offset(
+            turn, start_turn=snapshot_turn, offset=offset
+        )
+        game_state = self.game_state
+        game_state.restore(snapshot)
+        commands = list(self.command_log.commands(offset, end))
+
+        # commands the game recorded as one undo step are replayed as one, so that undos
+        # revert exactly what they reverted in the game
+        step_starts = set()
+        for i, (opcode, payload) in enumerate(commands):
+            if opcode == CommandLog.STEP and i > 0:
+                # a step can begin before the snapshot
+                step_starts.add(max(i - payload[0], 0))
+
+        self.commands_applied = 0
+        with contextlib.ExitStack() as step:
+            for i, (opcode, payload) in enumerate(commands):
+                if opcode == CommandLog.STEP:
+                    step.close()
+                    continue
+                if i in step_starts:
+                    step.enter_context(game_state.undo_step())
+                game_state.apply_command(opcode, payload)
+                self.commands_applied += 1
+        return game_state
@@ -0,0 +1,246 @@
+import argparse
+import contextlib
+import functools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+import numpy as np
+
+# simulations run without the Godot runtime, and worker processes inherit this
+os.environ.setdefault("PY_ENV", "headless")
+
+from .ai_controller import AIController, RandomController
+from .events import Events
+from .game_state import GameState
+
+
+class HeadlessGameManager:
+    """Stands in for PyBridgeNode, counting the events a GameState broadcasts"""
+
+    def __init__(self):
+        self.num_events = 0
+
+    def broadcast(self, event_name, *args):
+        self.num_events += 1
+
+
+class Simulator:
+    """Plays whole matches without Godot, for balancing"""
+
+    DEFAULT_TERRAIN = {"width": 12, "depth": 12, "max_height": 2}
+    DEFAULT_MAX_TURNS = 200
+    # matches handed to a worker at a time
+    DEFAULT_CHUNK_SIZE = 4
+
+    def __init__(
+        self,
+        controller_factories,
+        terrain=DEFAULT_TERRAIN,
+        num_teams=GameState.DEFAULT_NUM_TEAMS,
+        num_characters_per_team=GameState.DEFAULT_NUM_CHARACTERS_PER_TEAM,
+        max_turns=DEFAULT_MAX_TURNS,
+        num_workers=None,
+    ):
+        # one factory per team, called as factory(team_id, rng=rng) to get an object
+        # with take_turn(game_state, character); factories are reused in turn if there
+        # are fewer, and must be picklable for the process pool
+        self.controller_factories = list(controller_factories)
+        # "grid" as for GameState, "terrain_file" or the "width", "depth" and
+        # "max_height" of random terrain generated from each match seed
+        self.terrain = terrain
+        self.num_teams = num_teams
+        self.num_characters_per_team = num_characters_per_team
+        self.max_turns = max_turns
+        # 0 plays every match in this process
+        self.num_workers = os.cpu_count() if num_workers is None else num_workers
+
+    @staticmethod
+    def generate_grid(seed, width, depth, max_height):
+        """Random rolling terrain with a single tile per column"""
+        noise = np.random.RandomState(seed).rand(width + 2, depth + 2)
+        # a box blur keeps neighboring columns within a step of each other
+        smooth = (
+            sum(
+                noise[dx : dx + width, dz : dz + depth]
+                for dx in range(3)
+                for dz in range(3)
+            )
+            / 9.0
+        )
+        smooth = (smooth - smooth.min()) / max(smooth.max() - smooth.min(), 1e-9)
+        heights = np.rint(smooth * max_height).astype(int)
+        return {
+            (x, int(heights[x, z]), z): 1 for x in range(width) for z in range(depth)
+        }
+
+    def match_spec(self, seed) -> Dict:
+        return {
+            "seed": seed,
+            "terrain": self.terrain,
+            "num_teams": self.num_teams,
+            "num_characters_per_team": self.num_characters_per_team,
+            "max_turns": self.max_turns,
+            "controller_factories": self.controller_factories,
+        }
+
+    @staticmethod
+    def create_game_state(spec) -> GameState:
+        seed = spec["seed"]
+        terrain = spec["terrain"]
+        initial_state = {
+            "num_teams": spec["num_teams"],
+            "num_characters_per_team": spec["num_characters_per_team"],
+        }
+        if "terrain_file" in terrain:
+            initial_state["terrain_file"] = terrain["terrain_file"]
+        elif "grid" in terrain:
+            initial_state["grid"] = terrain["grid"]
+        else:
+            initial_state["grid"] = Simulator.generate_grid(
+                seed, terrain["width"], terrain["depth"], terrain["max_height"]
+            )
+        game_state = GameState(
+            events=Events,
+            game_manager=HeadlessGameManager(),
+            initial_state=initial_state,
+            rng_seed=seed,
+        )
+        # matches are never replayed or undone, so nothing is recorded
+        game_state.command_log = None
+        game_state.undo_stack = None
+        game_state.setup()
+        return game_state
+
+    @staticmethod
+    def run_match(spec) -> Dict:
+        """Plays one match and returns its outcome, reporting teams by index"""
+        started = time.perf_counter()
+        # GameState reports its progress with print, which would flood a balancing run
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            game_state = Simulator.create_game_state(spec)
+            rng = random.Random(spec["seed"])
+            factories = spec["controller_factories"]
+            for i, team in enumerate(game_state.teams):
+                factory = factories[i % len(factories)]
+                game_state.register_ai_controller(
+                    team.id, factory(team.id, rng=random.Random(rng.random()))
+                )
+            turns = game_state.play_ai_turns(max_turns=spec["max_turns"])
+
+        team_indices = {team.id: i for i, team in enumerate(game_state.teams)}
+        winning_team = game_state.get_winning_team()
+        survivors = [0] * len(game_state.teams)
+        for c in game_state.characters:
+            if game_state.is_alive(c):
+                survivors[team_indices[c.team_id]] += 1
+        return {
+            "seed": spec["seed"],
+            "winner": None if winning_team is None else team_indices[winning_team],
+            "turns": turns,
+            "survivors": survivors,
+            "duration": time.perf_counter() - started,
+        }
+
+    def run(self, seeds) -> Dict:
+        """Plays a match per seed and returns aggregate statistics, see summarize"""
+        specs = [self.match_spec(seed) for seed in seeds]
+        started = time.perf_counter()
+        if self.num_workers and len(specs) > 1:
+            with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+                results = list(
+                    executor.map(
+                        Simulator.run_match,
+                        specs,
+                        chunksize=Simulator.DEFAULT_CHUNK_SIZE,
+                    )
+                )
+        else:
+            results = [Simulator.run_match(spec) for spec in specs]
+        return Simulator.summarize(
+            results, time.perf_counter() - started, self.num_teams
+        )
+
+    @staticmethod
+    def summarize(results: List[Dict], elapsed, num_teams) -> Dict:
+        num_games = len(results)
+        wins = [0] * num_teams
+        for result in results:
+            if result["winner"] is not None:
+                wins[result["winner"]] += 1
+        turns = [result["turns"] for result in results]
+        return {
+            "games": num_games,
+            "wins": wins,
+            "win_rates": [w / num_games if num_games else 0.0 for w in wins],
+            # matches still undecided after max_turns
+            "draws": num_games - sum(wins),
+            "mean_turns": float(np.mean(turns)) if turns else 0.0,
+            "max_turns": max(turns) if turns else 0,
+            "elapsed": elapsed,
+            "games_per_second": num_games / elapsed if elapsed > 0 else 0.0,
+            "results": results,
+        }
+
+
+CONTROLLERS = {
+    "random": RandomController,
+    "mcts": AIController,
+}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Plays headless matches for balancing")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first match")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--teams", type=int, default=GameState.DEFAULT_NUM_TEAMS)
+    parser.add_argument(
+        "--characters-per-team",
+        type=int,
+        default=GameState.DEFAULT_NUM_CHARACTERS_PER_TEAM,
+    )
+    parser.add_argument("--max-turns", type=int, default=Simulator.DEFAULT_MAX_TURNS)
+    parser.add_argument("--terrain-file", default=None)
+    parser.add_argument(
+        "--controllers",
+        nargs="+",
+        choices=sorted(CONTROLLERS),
+        default=["random"],
+        help="controller of each team, reused in turn",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=AIController.DEFAULT_TIME_BUDGET,
+        help="seconds per mcts turn",
+    )
+    args = parser.parse_args(args)
+
+    factories = [
+        functools.partial(AIController, time_budget=args.time_budget)
+        if name == "mcts"
+        else CONTROLLERS[name]
+        for name in args.controllers
+    ]
+    simulator = Simulator(
+        factories,
+        terrain={"terrain_file": args.terrain_file}
+        if args.terrain_file
+        else Simulator.DEFAULT_TERRAIN,
+        num_teams=args.teams,
+        num_characters_per_team=args.characters_per_team,
+        max_turns=args.max_turns,
+        num_workers=args.workers,
+    )
+    stats = simulator.run(range(args.seed, args.seed + args.games))
+    print(
+        "games: {games}  wins: {wins}  draws: {draws}  mean turns: {mean_turns:.1f}  "
+        "{games_per_second:.2f} games/s".format(**stats)
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+from typing import List, Tuple
+import numpy as np
+
+
+class SpatialIndex:
+    """Column hash over terrain nodes for nearest-node queries"""
+
+    # queries scan square rings of columns outward until no closer node can remain;
+    # ties resolve to the highest node index, like a linear `<=` scan would
+
+    def __init__(self, node_positions, y_weight=0.0):
+        self.node_positions = np.asarray(node_positions, dtype=np.int64).reshape(-1, 3)
+        self.num_nodes = len(self.node_positions)
+        self.y_weight = y_weight
+
+        if self.num_nodes == 0:
+            self._min_xz = np.zeros(2, dtype=np.int64)
+            self._shape_xz = np.zeros(2, dtype=np.int64)
+            self._cell_nodes = np.zeros(0, dtype=np.int32)
+            self._cell_offsets = np.zeros(1, dtype=np.int32)
+            return
+
+        xz = self.node_positions[:, [0, 2]]
+        self._min_xz = xz.min(axis=0)
+        self._shape_xz = xz.max(axis=0) - self._min_xz + 1
+        cells = self._cell_ids(xz)
+        # a stable sort keeps nodes in index order within each column
+        self._cell_nodes = np.argsort(cells, kind="stable").astype(np.int32)
+        self._cell_offsets = np.zeros(int(np.prod(self._shape_xz)) + 1, dtype=np.int32)
+        np.cumsum(
+            np.bincount(cells, minlength=len(self._cell_offsets) - 1),
+            out=self._cell_offsets[1:],
+        )
+
+    def _cell_ids(self, xz):
+        local = xz - self._min_xz
+        return local[:, 0] * self._shape_xz[1] + local[:, 1]
+
+    @staticmethod
+    def ring_cells(cx, cz, r) -> np.ndarray:
+        """Returns the (x, z) columns in the square ring at Chebyshev radius r"""
+        if r == 0:
+            return np.array([[cx, cz]], dtype=np.int64)
+        span = np.arange(-r, r + 1, dtype=np.int64)
+        inner = span[1:-1]
+        return np.concatenate(
+            [
+                np.stack([cx + span, np.full(len(span), cz - r)], axis=1),
+                np.stack([cx + span, np.full(len(span), cz + r)], axis=1),
+                np.stack([np.full(len(inner), cx - r), cz + inner], axis=1),
+                np.stack([np.full(len(inner), cx + r), cz + inner], axis=1),
+            ]
+        )
+
+    @staticmethod
+    def ring_limits(cx, cz, min_xz, max_xz) -> Tuple[int, int]:
+        """Returns the first and last ring radius that intersect a bounding box"""
+        lo = min_xz
+        hi = max_xz
+        r_min = max(0, lo[0] - cx, cx - hi[0], lo[1] - cz, cz - hi[1])
+        r_max = max(abs(cx - lo[0]), abs(cx - hi[0]), abs(cz - lo[1]), abs(cz - hi[1]))
+        return int(r_min), int(r_max)
+
+    def _ring_nodes(self, cx, cz, r):
+        """Returns the node indices in the ring of columns at Chebyshev radius r"""
+        ring = SpatialIndex.ring_cells(cx, cz, r)
+        local = ring - self._min_xz
+        in_bounds = np.all((local >= 0) & (local < self._shape_xz), axis=1)
+        cells = self._cell_ids(ring[in_bounds])
+        starts = self._cell_offsets[cells]
+        ends = self._cell_offsets[cells + 1]
+        slices = [self._cell_nodes[s:e] for s, e in zip(starts, ends) if e > s]
+        if not slices:
+            return None
+        return np.concatenate(slices)
+
+    def _distances(self, point, node_indices):
+        qx, qy, qz = point
+        p = self.node_positions[node_indices]
+        # same operation order as BoardState.euclidean_distance
+        return np.sqrt(
+            ((p[:, 0] - qx) ** 2)
+            + (((p[:, 1] - qy) ** 2) * self.y_weight)
+            + ((p[:, 2] - qz) ** 2)
+        )
+
+    def k_nearest_indices(self, point, k=1) -> List[Tuple[int, float]]:
+        """Returns up to k (node index, distance) pairs, nearest first"""
+        if self.num_nodes == 0 or k <= 0:
+            return []
+        qx, _, qz = point
+        cx = int(np.floor(qx + 0.5))
+        cz = int(np.floor(qz + 0.5))
+        r_min, r_max = SpatialIndex.ring_limits(
+            cx, cz, self._min_xz, self._min_xz + self._shape_xz - 1
+        )
+
+        found_indices = []
+        found_distances = []
+        kth_distance = float("INF")
+        for r in range(r_min, r_max + 1):
+            # every column in this ring is at least r - 0.5 away along x or z
+            if r - 0.5 > kth_distance:
+                break
+            nodes = self._ring_nodes(cx, cz, r)
+            if nodes is None:
+                continue
+            found_indices.append(nodes)
+            found_distances.append(self._distances(point, nodes))
+            if sum(len(n) for n in found_indices) >= k:
+                kth_distance = np.sort(np.concatenate(found_distances))[k - 1]
+
+        indices = np.concatenate(found_indices)
+        distances = np.concatenate(found_distances)
+        # nearest first, higher node index first among ties
+        order = np.lexsort((-indices, distances))[:k]
+        return [(int(indices[i]), distances[i]) for i in order]
+
+    def nearest_index(self, point) -> Tuple[int, float]:
+        nearest = self.k_nearest_indices(point, k=1)
+        if not nearest:
+            return None, float("INF")
+        return nearest[0]
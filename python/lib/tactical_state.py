@@ -0,0 +1,229 @@
+from collections import OrderedDict
+from heapq import heappush, heappop
+from typing import List, Tuple
+
+
+class TacticalState:
+    """Lightweight copy of the parts of a GameState that combat search needs"""
+
+    # every action records its inverse, so searches apply and undo actions instead of
+    # copying; moves follow BoardState.movable_area with a team
+
+    NO_TARGET = -1
+    MAX_CACHED_REACHES = 4096
+
+    def __init__(
+        self,
+        board_state,
+        positions,
+        hit_points,
+        teams,
+        attack_offsets,
+        current_unit=0,
+        move_budget=3,
+        attack_damage=1,
+        reach_cache=None,
+        column_tops=None,
+    ):
+        self.board_state = board_state
+        self.positions = [tuple(p) for p in positions]
+        self.hit_points = list(hit_points)
+        self.teams = list(teams)
+        # per unit: set of (dx, dz) offsets the unit can attack
+        self.attack_offsets = attack_offsets
+        self.current_unit = current_unit
+        self.move_budget = move_budget
+        self.attack_damage = attack_damage
+        # (position, team, nearby units) -> Dict[(x, z), (x, y, z)] of the tiles a unit
+        # can end its move on, in LRU order.  Shared between forks
+        self.reach_cache = reach_cache if reach_cache is not None else OrderedDict()
+        # (x, z) -> highest tile of the column, the only one attacks reach.  Shared too
+        self.column_tops = column_tops if column_tops is not None else {}
+        self.occupied = {
+            p: i for i, p in enumerate(self.positions) if self.hit_points[i] > 0
+        }
+        self._undo_stack = []
+
+    def fork(self):
+        return TacticalState(
+            self.board_state,
+            self.positions,
+            self.hit_points,
+            self.teams,
+            self.attack_offsets,
+            current_unit=self.current_unit,
+            move_budget=self.move_budget,
+            attack_damage=self.attack_damage,
+            reach_cache=self.reach_cache,
+            column_tops=self.column_tops,
+        )
+
+    def reach(self, unit):
+        """Tiles the unit can end its move on, by (x, z) column"""
+        position = self.positions[unit]
+        team = self.teams[unit]
+        # moves cost at least 1 per column, so only units this close can block the unit
+        px, _, pz = position
+        nearby = tuple(
+            sorted(
+                (p, self.teams[i] != team)
+                for p, i in self.occupied.items()
+                if i != unit and abs(p[0] - px) + abs(p[2] - pz) <= self.move_budget
+            )
+        )
+        key = (position, team, nearby)
+        reach = self.reach_cache.get(key)
+        if reach is not None:
+            self.reach_cache.move_to_end(key)
+            return reach
+
+        reach = {
+            (x, z): (x, y, z) for x, y, z in self._movable_area(position, dict(nearby))
+        }
+        self.reach_cache[key] = reach
+        while len(self.reach_cache) > TacticalState.MAX_CACHED_REACHES:
+            self.reach_cache.popitem(last=False)
+        return reach
+
+    def _movable_area(self, root, occupants):
+        """Same flood fill as BoardState.reachable_area, over this state's units"""
+        board_state = self.board_state
+        costs = {}
+        tentative_costs = {root: 0}
+        counter = 0
+        q = [(0, counter, root)]
+        while q:
+            cost, _, v = heappop(q)
+            if v in costs:
+                continue
+            costs[v] = cost
+            for neighbor in board_state.neighbors(v):
+                # occupants maps positions to whether an enemy holds them
+                if neighbor in costs or occupants.get(neighbor):
+                    continue
+                neighbor_cost = cost + board_state.distance_between(v, neighbor)
+                if neighbor_cost > self.move_budget:
+                    continue
+                if neighbor_cost < tentative_costs.get(neighbor, float("INF")):
+                    tentative_costs[neighbor] = neighbor_cost
+                    counter += 1
+                    heappush(q, (neighbor_cost, counter, neighbor))
+        return [n for n in costs if n == root or n not in occupants]
+
+    def alive_teams(self):
+        return set(t for t, hp in zip(self.teams, self.hit_points) if hp > 0)
+
+    def is_terminal(self) -> bool:
+        return len(self.alive_teams()) <= 1
+
+    def current_team(self):
+        return self.teams[self.current_unit]
+
+    def attack_actions(self) -> List[Tuple[Tuple[int, int, int], int]]:
+        """Every (move to, target) pair with which the current unit hits an enemy"""
+        unit = self.current_unit
+        team = self.teams[unit]
+        reach = self.reach(unit)
+        actions = []
+        for target, (tx, _, tz) in enumerate(self.positions):
+            if self.hit_points[target] <= 0 or self.teams[target] == team:
+                continue
+            if self._column_top(tx, tz) != self.positions[target]:
+                continue
+            for dx, dz in self.attack_offsets[unit]:
+                move_to = reach.get((tx - dx, tz - dz))
+                if move_to is not None:
+                    actions.append((move_to, target))
+        return actions
+
+    def _column_top(self, x, z):
+        top = self.column_tops.get((x, z))
+        if top is None:
+            top = self.column_tops[(x, z)] = self.board_state.get_grid_pos_2d((x, z))
+        return top
+
+    def move_actions(self) -> List[Tuple[Tuple[int, int, int], int]]:
+        unit = self.current_unit
+        moves = [(p, TacticalState.NO_TARGET) for p in self.reach(unit).values()]
+        # a unit off the terrain can still pass its turn
+        return moves or [(self.positions[unit], TacticalState.NO_TARGET)]
+
+    def legal_actions(self) -> List[Tuple[Tuple[int, int, int], int]]:
+        return self.attack_actions() + self.move_actions()
+
+    def random_action(self, rng, attack_probability=0.9):
+        """Playout policy: usually attacks when it can, otherwise moves at random"""
+        if rng.random() < attack_probability:
+            attacks = self.attack_actions()
+            if attacks:
+                return attacks[rng.randrange(len(attacks))]
+        moves = self.move_actions()
+        return moves[rng.randrange(len(moves))]
+
+    def apply(self, action):
+        move_to, target = action
+        unit = self.current_unit
+        from_position = self.positions[unit]
+        holder = self.occupied.get(move_to, unit)
+        if holder != unit and move_to != from_position:
+            raise ValueError(f"unit {unit} cannot end its move on unit {holder}'s tile")
+        touched = [from_position, move_to]
+        if target >= 0:
+            touched.append(self.positions[target])
+        # units that share a tile share a single occupied entry, so entries are put
+        # back as they were rather than rebuilt
+        occupied = [(p, self.occupied.get(p)) for p in touched]
+        target_hit_points = self.hit_points[target] if target >= 0 else None
+        self._undo_stack.append(
+            (unit, from_position, target, target_hit_points, occupied)
+        )
+
+        if self.occupied.get(from_position) == unit:
+            del self.occupied[from_position]
+        self.positions[unit] = move_to
+        self.occupied[move_to] = unit
+        if target >= 0:
+            self.hit_points[target] -= self.attack_damage
+            target_position = self.positions[target]
+            if (
+                self.hit_points[target] <= 0
+                and self.occupied.get(target_position) == target
+            ):
+                del self.occupied[target_position]
+        self.current_unit = self._next_unit(unit)
+
+    def undo(self):
+        step = self._undo_stack.pop()
+        unit, from_position, target, target_hit_points, occupied = step
+        if target >= 0:
+            self.hit_points[target] = target_hit_points
+        self.positions[unit] = from_position
+        for position, holder in occupied:
+            if holder is None:
+                self.occupied.pop(position, None)
+            else:
+                self.occupied[position] = holder
+        self.current_unit = unit
+
+    def _next_unit(self, unit):
+        num_units = len(self.positions)
+        for step in range(1, num_units + 1):
+            candidate = (unit + step) % num_units
+            if self.hit_points[candidate] > 0:
+                return candidate
+        return unit
+
+    def evaluate(self, team) -> float:
+        """Score in [-1, 1] for a team's share of the remaining hit points"""
+        own = 0
+        other = 0
+        for t, hp in zip(self.teams, self.hit_points):
+            if hp <= 0:
+                continue
+            if t == team:
+                own += hp
+            else:
+                other += hp
+        if own + other == 0:
+            return 0.0
+        return (own - other) / (own + other)
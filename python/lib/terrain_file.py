@@ -0,0 +1,87 @@
+import struct
+import numpy as np
+
+from .chunked_terrain import ChunkedTerrain
+
+
+class TerrainFile:
+    """Compact binary terrain format that can be opened with np.memmap"""
+
+    # header, then size_x * size_z int16 heights in C order, EMPTY_HEIGHT where empty
+
+    MAGIC = b"GPTR"
+    VERSION = 1
+    HEADER_FORMAT = "<4sHHiiIIh6x"
+    HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+    HEIGHT_DTYPE = np.dtype("<i2")
+    EMPTY_HEIGHT = ChunkedTerrain.EMPTY_HEIGHT
+
+    @staticmethod
+    def write_heightfield(path, heightfield, origin=(0, 0)):
+        """Writes a 2D heightfield indexed [x, z] with its (x, z) origin"""
+        heightfield = np.ascontiguousarray(heightfield, dtype=TerrainFile.HEIGHT_DTYPE)
+        size_x, size_z = heightfield.shape
+        header = struct.pack(
+            TerrainFile.HEADER_FORMAT,
+            TerrainFile.MAGIC,
+            TerrainFile.VERSION,
+            0,
+            int(origin[0]),
+            int(origin[1]),
+            size_x,
+            size_z,
+            TerrainFile.EMPTY_HEIGHT,
+        )
+        with open(path, "wb") as f:
+            f.write(header)
+            heightfield.tofile(f)
+
+    @staticmethod
+    def write(path, position_list):
+        """Writes a list of (x, y, z) positions, at most one per (x, z) column"""
+        heightfield, origin = ChunkedTerrain.create_heightfield(position_list)
+        TerrainFile.write_heightfield(path, heightfield, origin)
+
+    @staticmethod
+    def read_header(path):
+        with open(path, "rb") as f:
+            raw_header = f.read(TerrainFile.HEADER_SIZE)
+        if len(raw_header) < TerrainFile.HEADER_SIZE:
+            raise ValueError(f"{path} is too short to be a terrain file")
+        (
+            magic,
+            version,
+            flags,
+            origin_x,
+            origin_z,
+            size_x,
+            size_z,
+            empty_height,
+        ) = struct.unpack(TerrainFile.HEADER_FORMAT, raw_header)
+        if magic != TerrainFile.MAGIC:
+            raise ValueError(f"{path} is not a terrain file")
+        if version != TerrainFile.VERSION:
+            raise ValueError(f"unsupported terrain file version {version} in {path}")
+        return {
+            "version": version,
+            "flags": flags,
+            "origin": (origin_x, origin_z),
+            "shape": (size_x, size_z),
+            "empty_height": empty_height,
+        }
+
+    @staticmethod
+    def open(path):
+        """Memory-maps the heightfield without reading it, returns it and its origin"""
+        header = TerrainFile.read_header(path)
+        if 0 in header["shape"]:
+            heightfield = np.zeros(header["shape"], dtype=TerrainFile.HEIGHT_DTYPE)
+        else:
+            heightfield = np.memmap(
+                path,
+                dtype=TerrainFile.HEIGHT_DTYPE,
+                mode="r",
+                offset=TerrainFile.HEADER_SIZE,
+                shape=header["shape"],
+            )
+        return heightfield, header["origin"]
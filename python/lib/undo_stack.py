@@ -0,0 +1,50 @@
+from collections import deque
+
+
+class UndoStep:
+    """Inverse delta of one undoable change: rows and game fields before and after it"""
+
+    __slots__ = ("rows", "before", "after")
+
+    def __init__(self, rows, before, after):
+        # row -> (row state before, row state after), see CharacterStore.row_state
+        self.rows = rows
+        # GameState.UNDO_FIELDS, by reference to what the game replaced, never copies
+        self.before = before
+        self.after = after
+
+
+class UndoStack:
+    """Bounded stack of UndoSteps.  Recording a new step forgets every undone step."""
+
+    DEFAULT_MAX_SIZE = 256
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        # oldest steps are dropped first once max_size is reached
+        self.undo_steps = deque(maxlen=max_size)
+        self.redo_steps = []
+
+    def push(self, step: UndoStep):
+        self.undo_steps.append(step)
+        self.redo_steps.clear()
+
+    def can_undo(self) -> bool:
+        return len(self.undo_steps) > 0
+
+    def can_redo(self) -> bool:
+        return len(self.redo_steps) > 0
+
+    def pop_undo(self) -> UndoStep:
+        step = self.undo_steps.pop()
+        self.redo_steps.append(step)
+        return step
+
+    def pop_redo(self) -> UndoStep:
+        step = self.redo_steps.pop()
+        self.undo_steps.append(step)
+        return step
+
+    def clear(self):
+        self.undo_steps.clear()
+        self.redo_steps.clear()
@@ -0,0 +1,207 @@
+from collections import OrderedDict
+from typing import FrozenSet, Set, Tuple
+import numpy as np
+
+from .board_state import BoardState
+
+
+class VisibilityEngine:
+    """Line of sight and fog of war over the top surface of a BoardState"""
+
+    # visible sets are cached by (position, terrain_version) and teams keep per-tile
+    # observer counts, so only units that moved or see changed terrain are recomputed
+
+    DEFAULT_SIGHT_RANGE = 8
+    DEFAULT_CACHE_SIZE = 1024
+    # eye level above the tile a unit stands on
+    EYE_HEIGHT = 1.0
+    # columns must rise above the ray by more than this to block it
+    BLOCKING_EPSILON = 1e-6
+
+    def __init__(
+        self,
+        board_state,
+        sight_range=DEFAULT_SIGHT_RANGE,
+        eye_height=EYE_HEIGHT,
+        cache_size=DEFAULT_CACHE_SIZE,
+    ):
+        self.board_state = board_state
+        self.sight_range = sight_range
+        self.eye_height = eye_height
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._visible_cache = OrderedDict()
+
+        r = int(np.ceil(sight_range))
+        span = np.arange(-r, r + 1, dtype=np.int64)
+        dx, dz = np.meshgrid(span, span, indexing="ij")
+        in_range = (dx**2 + dz**2) <= sight_range**2
+        self._disk_offsets = np.stack([dx[in_range], dz[in_range]], axis=1)
+
+        # unit id -> (team id, cache key, visible tiles)
+        self._units = {}
+        # team id -> Dict[tile, number of team units that see it]
+        self._team_counts = {}
+        board_state.register_cache(self)
+
+    def _sees_region(self, position, changed_xz):
+        """True when a changed column is close enough to lie on a ray from position"""
+        x, _, z = position
+        distances = np.hypot(changed_xz[:, 0] - x, changed_xz[:, 1] - z)
+        # rays are rounded to the nearest column along the way
+        return bool(np.any(distances <= self.sight_range + 1))
+
+    def invalidate(self, event, old_version, new_version, region):
+        """Keeps the visible sets of observers that cannot see any changed column"""
+        if event != BoardState.TERRAIN_CHANGED:
+            return
+        if region is None:
+            self._visible_cache.clear()
+            return
+        changed_xz = np.asarray(region, dtype=np.int64).reshape(-1, 3)[:, [0, 2]]
+        entries = OrderedDict()
+        for (position, terrain_version), tiles in self._visible_cache.items():
+            if terrain_version != old_version:
+                entries[(position, terrain_version)] = tiles
+            elif not self._sees_region(position, changed_xz):
+                entries[(position, new_version)] = tiles
+        self._visible_cache = entries
+        for unit_id, (team_id, (position, terrain_version), tiles) in list(
+            self._units.items()
+        ):
+            if terrain_version == old_version and not self._sees_region(
+                position, changed_xz
+            ):
+                self._units[unit_id] = (team_id, (position, new_version), tiles)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._visible_cache),
+            "max_size": self.cache_size,
+        }
+
+    def clear(self):
+        self._visible_cache.clear()
+
+    def blocked_rays(self, origins, targets) -> np.ndarray:
+        """Returns a (T,) mask of the rays from origins to targets that are blocked"""
+        # the origin and target columns themselves never block
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+        deltas = targets - origins
+        longest = np.abs(deltas[:, [0, 2]]).max() if len(deltas) else 0.0
+        # two samples per column crossed along the longest ray
+        num_steps = int(np.ceil(longest * 2))
+        if num_steps < 2:
+            return np.zeros(len(origins), dtype=bool)
+
+        t = np.arange(1, num_steps, dtype=np.float64) / num_steps
+        sample_xz = (
+            origins[:, None, [0, 2]] + t[None, :, None] * deltas[:, None, [0, 2]]
+        )
+        sample_xz = np.floor(sample_xz + 0.5).astype(np.int64)
+        ray_y = origins[:, None, 1] + t[None, :] * deltas[:, None, 1]
+
+        surface, valid = self.board_state.get_grid_pos_2d_batch(
+            sample_xz.reshape(-1, 2)
+        )
+        heights = surface[:, 1].reshape(ray_y.shape)
+        valid = valid.reshape(ray_y.shape)
+
+        origin_xz = np.floor(origins[:, None, [0, 2]] + 0.5).astype(np.int64)
+        target_xz = np.floor(targets[:, None, [0, 2]] + 0.5).astype(np.int64)
+        inner = np.any(sample_xz != origin_xz, axis=2) & np.any(
+            sample_xz != target_xz, axis=2
+        )
+        blocking = valid & inner & (heights > ray_y + VisibilityEngine.BLOCKING_EPSILON)
+        return blocking.any(axis=1)
+
+    def _compute_visible_tiles(self, position):
+        x, y, z = position
+        columns = self._disk_offsets + np.array([x, z], dtype=np.int64)
+        tiles, valid = self.board_state.get_grid_pos_2d_batch(columns)
+        tiles = tiles[valid]
+        eye = np.array([x, y + self.eye_height, z], dtype=np.float64)
+        blocked = self.blocked_rays(np.broadcast_to(eye, tiles.shape), tiles)
+        return frozenset(tuple(tile) for tile in tiles[~blocked].tolist())
+
+    def visible_tiles(self, position) -> FrozenSet[Tuple[int, int, int]]:
+        """Returns the set of tiles within sight range that can be seen from a tile"""
+        position = tuple(int(p) for p in position)
+        key = (position, self.board_state.terrain_version)
+        if key in self._visible_cache:
+            self._visible_cache.move_to_end(key)
+            self.hits += 1
+            return self._visible_cache[key]
+
+        self.misses += 1
+        tiles = self._compute_visible_tiles(position)
+        self._visible_cache[key] = tiles
+        while len(self._visible_cache) > self.cache_size:
+            self._visible_cache.popitem(last=False)
+        return tiles
+
+    def line_of_sight(self, from_position, to_position) -> bool:
+        """True when a unit standing on one tile can see a unit standing on the other"""
+        eye = np.array([0, self.eye_height, 0], dtype=np.float64)
+        origin = np.asarray(from_position, dtype=np.float64) + eye
+        target = np.asarray(to_position, dtype=np.float64) + eye
+        return not self.blocked_rays(origin, target)[0]
+
+    def update_unit(self, unit_id, team_id, position) -> bool:
+        """Moves a unit's contribution to its team's visibility, False if unchanged"""
+        position = tuple(int(p) for p in position)
+        key = (position, self.board_state.terrain_version)
+        previous = self._units.get(unit_id)
+        if previous is not None and previous[:2] == (team_id, key):
+            return False
+        if previous is not None:
+            self.remove_unit(unit_id)
+
+        tiles = self.visible_tiles(position)
+        counts = self._team_counts.setdefault(team_id, {})
+        for tile in tiles:
+            counts[tile] = counts.get(tile, 0) + 1
+        self._units[unit_id] = (team_id, key, tiles)
+        return True
+
+    def remove_unit(self, unit_id):
+        if unit_id not in self._units:
+            return
+        team_id, _, tiles = self._units.pop(unit_id)
+        counts = self._team_counts[team_id]
+        for tile in tiles:
+            counts[tile] -= 1
+            if counts[tile] == 0:
+                del counts[tile]
+
+    def update_units(self, units) -> int:
+        """Syncs visibility with the (id, team id, position) of every unit"""
+        # returns the number of units recomputed, units no longer listed are removed
+        seen = set()
+        recomputed = 0
+        terrain_version = self.board_state.terrain_version
+        for unit_id, team_id, position in units:
+            seen.add(unit_id)
+            # most units did not move, skip them without normalizing their position
+            previous = self._units.get(unit_id)
+            if (
+                previous is not None
+                and previous[0] == team_id
+                and previous[1] == (position, terrain_version)
+            ):
+                continue
+            if self.update_unit(unit_id, team_id, position):
+                recomputed += 1
+        for unit_id in [u for u in self._units if u not in seen]:
+            self.remove_unit(unit_id)
+        return recomputed
+
+    def team_visible_tiles(self, team_id) -> Set[Tuple[int, int, int]]:
+        return set(self._team_counts.get(team_id, {}).keys())
+
+    def is_visible_to_team(self, team_id, position) -> bool:
+        return tuple(position) in self._team_counts.get(team_id, {})
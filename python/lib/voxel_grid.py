@@ -0,0 +1,114 @@
+from collections.abc import Mapping
+from typing import Tuple
+import numpy as np
+
+
+class VoxelGrid(Mapping):
+    """
+    Dense, array-backed terrain grid.
+
+    Stores tiles in a bounded int8 occupancy volume plus an (x, y, z) origin
+    offset, and exposes it as a read-only Dict[(x, y, z), tile] view so it can
+    be used anywhere the dictionary-backed grids are used.
+    """
+
+    EMPTY_VOXEL = 0
+
+    def __init__(self, occupancy, origin=(0, 0, 0)):
+        self.occupancy = np.asarray(occupancy, dtype=np.int8)
+        self.origin = np.array(origin, dtype=np.int64)
+        self.shape = self.occupancy.shape
+        self._size = int(np.count_nonzero(self.occupancy))
+
+    @staticmethod
+    def from_positions(position_list, tile_value):
+        """Create a VoxelGrid sized to the bounding box of (x, y, z) positions"""
+        positions = np.asarray(position_list, dtype=np.int64).reshape(-1, 3)
+        if len(positions) == 0:
+            return VoxelGrid(np.zeros((0, 0, 0), dtype=np.int8))
+
+        origin = positions.min(axis=0)
+        shape = tuple(positions.max(axis=0) - origin + 1)
+        occupancy = np.zeros(shape, dtype=np.int8)
+        local = positions - origin
+        occupancy[local[:, 0], local[:, 1], local[:, 2]] = tile_value
+        return VoxelGrid(occupancy, origin)
+
+    def _local_index(self, position):
+        """Returns the index into the occupancy volume or None when out of bounds"""
+        x, y, z = position
+        lx = int(x) - self.origin[0]
+        ly = int(y) - self.origin[1]
+        lz = int(z) - self.origin[2]
+        sx, sy, sz = self.shape
+        if 0 <= lx < sx and 0 <= ly < sy and 0 <= lz < sz:
+            return (lx, ly, lz)
+        return None
+
+    def positions(self) -> np.ndarray:
+        """Returns an (N, 3) array of all filled positions"""
+        return np.argwhere(self.occupancy != VoxelGrid.EMPTY_VOXEL) + self.origin
+
+    def column(self, position_2d: Tuple[int, int]):
+        """Returns the list of filled (x, y, z) positions in an (x, z) column"""
+        x, z = position_2d
+        lx = int(x) - self.origin[0]
+        lz = int(z) - self.origin[2]
+        sx, _, sz = self.shape
+        if not (0 <= lx < sx and 0 <= lz < sz):
+            return []
+        ys = np.flatnonzero(self.occupancy[lx, :, lz]) + self.origin[1]
+        return [(int(x), int(y), int(z)) for y in ys]
+
+    def columns(self):
+        """Returns a Dict[(x, z), List[(x, y, z)]] view of the grid"""
+        return VoxelColumns(self)
+
+    def __getitem__(self, position):
+        idx = self._local_index(position)
+        if idx is None or self.occupancy[idx] == VoxelGrid.EMPTY_VOXEL:
+            raise KeyError(position)
+        return int(self.occupancy[idx])
+
+    def __contains__(self, position):
+        try:
+            idx = self._local_index(position)
+        except (TypeError, ValueError):
+            return False
+        return idx is not None and self.occupancy[idx] != VoxelGrid.EMPTY_VOXEL
+
+    def __iter__(self):
+        for p in self.positions().tolist():
+            yield tuple(p)
+
+    def __len__(self):
+        return self._size
+
+
+class VoxelColumns(Mapping):
+    """Read-only Dict[(x, z), List[(x, y, z)]] view over the columns of a VoxelGrid"""
+
+    def __init__(self, voxel_grid: VoxelGrid):
+        self.voxel_grid = voxel_grid
+        occupied = np.any(voxel_grid.occupancy != VoxelGrid.EMPTY_VOXEL, axis=1)
+        self._columns = np.argwhere(occupied)
+
+    def __getitem__(self, position_2d):
+        column = self.voxel_grid.column(position_2d)
+        if not column:
+            raise KeyError(position_2d)
+        return column
+
+    def __contains__(self, position_2d):
+        try:
+            return len(self.voxel_grid.column(position_2d)) > 0
+        except (TypeError, ValueError):
+            return False
+
+    def __iter__(self):
+        ox, _, oz = self.voxel_grid.origin
+        for x, z in self._columns.tolist():
+            yield (x + int(ox), z + int(oz))
+
+    def __len__(self):
+        return len(self._columns)
@@ -0,0 +1,152 @@
+import random
+import pytest
+from unittest.mock import MagicMock
+
+from python.lib.ai_controller import AIController
+from python.lib.board_state import BoardState
+from python.lib.events import Events
+from python.lib.game_state import GameState
+from python.lib.masks import SWORD_MASK
+from python.lib.tactical_state import TacticalState
+
+
+def create_duel_state():
+    board = BoardState([(x, 0, z) for x in range(6) for z in range(6)])
+    sword = set(map(tuple, BoardState.compile_2d_mask(SWORD_MASK).tolist()))
+    return TacticalState(
+        board,
+        [(0, 0, 0), (3, 0, 0), (5, 0, 5)],
+        [1, 1, 2],
+        ["t1", "t2", "t2"],
+        [sword, sword, sword],
+    )
+
+
+def test_TacticalState_apply_and_undo():
+    state = create_duel_state()
+    before = (list(state.positions), list(state.hit_points), dict(state.occupied))
+
+    attacks = state.attack_actions()
+    assert ((2, 0, 0), 1) in attacks
+    assert all(target == 1 for _, target in attacks)
+    # units never end a move on another unit
+    assert all(
+        move_to not in ((3, 0, 0), (5, 0, 5)) for move_to, _ in state.legal_actions()
+    )
+
+    state.apply(((2, 0, 0), 1))
+    assert state.hit_points[1] == 0
+    assert (3, 0, 0) not in state.occupied
+    assert state.current_unit == 2
+    state.apply(state.random_action(random.Random(0)))
+    state.undo()
+    state.undo()
+    assert (state.positions, state.hit_points, state.occupied) == before
+    assert state.current_unit == 0
+
+    fork = state.fork()
+    fork.apply(((1, 0, 0), TacticalState.NO_TARGET))
+    assert state.positions[0] == (0, 0, 0)
+
+
+def test_AIController_search():
+    state = create_duel_state()
+    controller = AIController("t1", max_iterations=300, rng=random.Random(1))
+    move_to, target = controller.search(state)
+    assert target == 1
+    assert controller.iterations == 300
+    # the search leaves the state as it found it
+    assert state.positions[0] == (0, 0, 0) and state.hit_points == [1, 1, 2]
+
+
+def test_GameState_ai_turns():
+    game_state = GameState(
+        Events,
+        initial_state={
+            "grid": [(x, 0, z) for x in range(6) for z in range(6)],
+            "characters": [
+                {"id": "p", "position": (0, 0, 0), "team_id": "t1", "hit_points": 1},
+                {"id": "a", "position": (2, 0, 0), "team_id": "t2", "hit_points": 1},
+            ],
+            "teams": [{"id": "t1"}, {"id": "t2"}],
+        },
+        rng_seed=1,
+    )
+    game_state.broadcast = MagicMock()
+    game_state.setup(
+        skip_character_repositioning=True, skip_character_team_assignment=True
+    )
+    game_state.register_ai_controller(
+        "t2", AIController("t2", max_iterations=200, rng=random.Random(2))
+    )
+    game_state.selected_character_attack_mask = SWORD_MASK
+
+    # after the player's turn the AI plays, strikes down the player and wins
+    game_state.on_end_turn()
+    assert game_state.characters[0].hit_points <= 0
+    assert game_state.get_winning_team() == "t2"
+    assert game_state.board_state.occupancy.position_of("p") is None
+
+
+def test_TacticalState_blocked_corridor():
+    # a one tile wide corridor with an enemy right in front of the player
+    game_state = GameState(
+        Events,
+        initial_state={
+            "grid": [(x, 0, 0) for x in range(6)],
+            "characters": [
+                {"id": "p", "position": (0, 0, 0), "team_id": "t1", "hit_points": 1},
+                {"id": "e", "position": (1, 0, 0), "team_id": "t2", "hit_points": 5},
+                {"id": "f", "position": (5, 0, 0), "team_id": "t2", "hit_points": 1},
+            ],
+            "teams": [{"id": "t1"}, {"id": "t2"}],
+        },
+        rng_seed=1,
+    )
+    game_state.broadcast = MagicMock()
+    game_state.setup(
+        skip_character_repositioning=True, skip_character_team_assignment=True
+    )
+    assert game_state.movable_tiles == [(0, 0, 0)]
+
+    state, _ = game_state.fork()
+    assert [move_to for move_to, _ in state.move_actions()] == [(0, 0, 0)]
+    assert all(move_to == (0, 0, 0) for move_to, _ in state.legal_actions())
+
+    # the enemy is no longer in the way once it falls
+    state.hit_points[1] = 0
+    del state.occupied[(1, 0, 0)]
+    assert (3, 0, 0) in [move_to for move_to, _ in state.move_actions()]
+
+    player = game_state.characters[0]
+    with pytest.raises(ValueError):
+        game_state.perform_action(player, (2, 0, 0))
+    assert player.position == (0, 0, 0)
+
+
+def test_TacticalState_shared_tile():
+    board = BoardState([(x, 0, z) for x in range(6) for z in range(6)])
+    sword = set(map(tuple, BoardState.compile_2d_mask(SWORD_MASK).tolist()))
+    # two living units set up on the same tile
+    state = TacticalState(
+        board,
+        [(0, 0, 0), (0, 0, 0), (3, 0, 0)],
+        [1, 1, 1],
+        ["t1", "t1", "t2"],
+        [sword, sword, sword],
+    )
+    before = (list(state.positions), dict(state.occupied))
+
+    state.apply(((1, 0, 0), TacticalState.NO_TARGET))
+    state.apply(((0, 0, 2), TacticalState.NO_TARGET))
+    assert state.occupied == {(1, 0, 0): 0, (0, 0, 2): 1, (3, 0, 0): 2}
+    with pytest.raises(ValueError):
+        state.apply(((1, 0, 0), TacticalState.NO_TARGET))
+    state.undo()
+    state.undo()
+    assert (state.positions, state.occupied) == before
+
+    # staying on the shared tile is still a legal move
+    state.apply(((0, 0, 0), TacticalState.NO_TARGET))
+    state.undo()
+    assert (state.positions, state.occupied) == before
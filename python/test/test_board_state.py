@@ -1,3 +1,4 @@
+import copy
 from python.test.test_game_state import DEFAULT_ELEVATION_MAP
 from python.lib.board_state import BoardState
 from .constants import (
@@ -189,51 +190,417 @@ def test_board_state():
     # Test movable area checking
     movable_area_from_center = board.movable_area(CENTER_TILE_POS, distance_budget=2)
 
-    print("[")
-    for pos in movable_area_from_center:
-        print(f"{pos},")
-    print("]")
-
+    # the budget bounds the path cost, so changing levels (cost 3) is out of reach
     expected_movable_area = [
-        (0, -1, -1),
-        (0, -1, -2),
-        (-1, 1, -1),
-        (0, -1, 1),
-        (0, 1, 0),
-        (-1, 1, 1),
-        (2, 1, 0),
-        (1, -1, 1),
-        (1, -1, -1),
-        (0, 0, -1),
-        (0, 0, -2),
+        (0, 0, 0),
+        (1, 0, 0),
         (0, 0, 1),
+        (-1, 0, 0),
+        (0, 0, -1),
+        (2, 0, 0),
         (1, 0, 1),
-        (1, 1, 0),
         (1, 0, -1),
-        (-1, -1, -1),
-        (0, -1, 0),
-        (-1, -1, 1),
-        (-1, 1, 0),
-        (-2, 1, 0),
-        (0, 1, 2),
-        (1, -1, 0),
-        (2, -1, 0),
+        (0, 0, 2),
         (-1, 0, 1),
+        (-2, 0, 0),
         (-1, 0, -1),
+        (0, 0, -2),
+    ]
+
+    assert sorted(movable_area_from_center) == sorted(expected_movable_area)
+
+    # climbing one level costs 1 + Y_WEIGHT
+    costs, predecessors = board.reachable_area(CENTER_TILE_POS, distance_budget=4)
+    assert costs[(1, 1, 0)] == 1 + BoardState.Y_WEIGHT
+    assert costs[(2, 1, 0)] == 2 + BoardState.Y_WEIGHT
+    assert (2, 1, 1) not in costs
+
+    path = BoardState.path_from_predecessors(predecessors, (2, 1, 0))
+    assert path[0] == CENTER_TILE_POS
+    assert path[-1] == (2, 1, 0)
+    assert sum(board.distance_between(a, b) for a, b in zip(path, path[1:])) == 4
+    assert BoardState.path_from_predecessors(predecessors, (7, 0, 7)) is None
+
+
+def test_BoardState_dense_terrain():
+    grid_map = BoardState.create_grid_map_from_elevation_array(
+        DEFAULT_ELEVATION_MAP, DEFAULT_ELEVATION_MAP_SHAPE
+    )
+
+    sparse_board = BoardState(grid_map)
+    dense_board = BoardState(grid_map, dense=True)
+
+    # the dense terrain grid is a drop-in view of the dictionary grid
+    assert dense_board.terrain_grid == sparse_board.terrain_grid
+    assert len(dense_board.terrain_grid) == len(sparse_board.terrain_grid)
+    assert dense_board.terrain_grid.occupancy.dtype.name == "int8"
+    assert (100, 0, 100) not in dense_board.terrain_grid
+    assert dense_board.is_empty_tile((100, 0, 100))
+
+    for pos in sparse_board.terrain_grid:
+        assert dense_board.neighbors(pos) == sparse_board.neighbors(pos)
+        assert set(dense_board.movable_area(pos)) == set(sparse_board.movable_area(pos))
+
+    for pos_2d in sparse_board.terrain_grid_2d:
+        assert pos_2d in dense_board.terrain_grid_2d
+        assert dense_board.get_grid_pos_2d(pos_2d) == sparse_board.get_grid_pos_2d(
+            pos_2d
+        )
+
+    assert dense_board.get_grid_pos_2d((100, 100)) is None
+
+
+def test_BoardState_adjacency_graph():
+    grid_map = BoardState.create_grid_map_from_elevation_array(
+        DEFAULT_ELEVATION_MAP, DEFAULT_ELEVATION_MAP_SHAPE
+    )
+    board = BoardState(grid_map)
+    graph = board.adjacency
+    dense_graph = BoardState(grid_map, dense=True).adjacency
+
+    assert graph.num_nodes == len(board.terrain_grid)
+    assert graph.offsets.dtype.name == "int32"
+    assert graph.indices.dtype.name == "int32"
+    assert len(graph.indices) == len(graph.costs) == graph.offsets[-1]
+
+    for pos in board.terrain_grid:
+        idx = graph.index_of(pos)
+        assert graph.position_of(idx) == pos
+        # matches a brute-force scan over the neighboring directions
+        assert board.neighbors(pos) == board._neighbors_by_directions(pos)
+        for n, cost in zip(board.neighbors(pos), graph.neighbor_costs(idx)):
+            assert cost == board.distance_between(pos, n) == board.dist(pos, n)
+            assert dense_graph.edge_cost(pos, n) == cost
+
+    # A* edge costs are read from the graph, and only exist between neighbors
+    assert graph.edge_cost((0, 0, 0), (5, 0, 5)) is None
+    assert graph.edge_cost((100, 0, 100), (0, 0, 0)) is None
+
+    # positions off the terrain are not nodes, but still get neighbors
+    assert graph.index_of((100, 0, 100)) == graph.NULL_INDEX
+    assert board.neighbors((2, 0, 0)) == [(1, 0, 0), (3, 1, 0), (2, 1, 1)]
+
+
+def test_BoardState_get_nearest_node_from_position():
+    grid_map = BoardState.create_grid_map_from_elevation_array(
+        DEFAULT_ELEVATION_MAP, DEFAULT_ELEVATION_MAP_SHAPE
+    )
+    board = BoardState(grid_map)
+    all_positions = list(board.terrain_grid.keys())
+
+    queries = [(1, 0, 2), (2.4, 0, 1.6), (7, 1, 9), (-5, 0, -5), (30, 3, 4)]
+    for q in queries:
+        expected_pos, expected_dist = board.get_nearest_node_from_nodes(
+            q, all_positions
+        )
+        actual_pos, actual_dist = board.get_nearest_node_from_position(q)
+        assert actual_pos == expected_pos
+        assert abs(actual_dist - expected_dist) < 1e-9
+
+        # k-nearest returns the closest nodes in ascending order
+        k_nearest = board.get_k_nearest_nodes_from_position(q, 4)
+        expected_distances = sorted(
+            board.euclidean_distance(q, p) for p in all_positions
+        )[:4]
+        assert len(k_nearest) == 4
+        for (_, d), expected_d in zip(k_nearest, expected_distances):
+            assert abs(d - expected_d) < 1e-9
+
+    assert BoardState([]).get_nearest_node_from_position((0, 0, 0)) == (
+        None,
+        float("INF"),
+    )
+
+
+def test_BoardState_batch_distances():
+    board = BoardState(list(DEFAULT_EXPECTED_OUTPUT_GRID_MAP.keys()))
+    nodes = list(board.terrain_grid.keys())
+    points = [(0, 0, 0), (3, 1, 2), (7, 2, 9)]
+
+    # one point against many nodes
+    euclidean = board.euclidean_distances(nodes, points[1])
+    manhattan = board.manhattan_distances(nodes, points[1])
+    assert euclidean.shape == manhattan.shape == (len(nodes),)
+
+    # many points against many nodes
+    euclidean_matrix = board.euclidean_distances(nodes, points)
+    manhattan_matrix = board.manhattan_distances(nodes, points)
+    assert euclidean_matrix.shape == manhattan_matrix.shape == (len(nodes), 3)
+
+    for i, n in enumerate(nodes):
+        assert abs(euclidean[i] - board.euclidean_distance(n, points[1])) < 1e-9
+        assert manhattan[i] == board.manhattan_dist(n, points[1])
+        for j, p in enumerate(points):
+            assert abs(euclidean_matrix[i, j] - board.euclidean_distance(n, p)) < 1e-9
+            assert manhattan_matrix[i, j] == board.manhattan_dist(n, p)
+
+    # ties resolve to the last node in the list
+    assert board.get_nearest_node_from_nodes((1, 0, 1), [(0, 0, 1), (2, 0, 1)]) == (
+        (2, 0, 1),
+        1.0,
+    )
+    assert board.get_nearest_node_from_nodes((1, 0, 1), []) == (None, float("INF"))
+
+
+def test_BoardState_path_cache():
+    board = BoardState(list(DEFAULT_EXPECTED_OUTPUT_GRID_MAP.keys()))
+    start = (0, 0, 0)
+    goal = (0, 0, 7)
+
+    path = board.astar(start, goal)
+    assert path[0] == start and path[-1] == goal
+    assert board.path_cache.stats()["misses"] == 1
+
+    # exact repeat
+    assert board.astar(start, goal) == path
+    assert board.path_cache.hits == 1
+
+    # prefix, suffix and reversed sub-paths are served from the cached path
+    assert board.astar(start, path[3]) == path[:4]
+    assert board.astar(path[2], goal) == path[2:]
+    assert board.astar(goal, path[1]) == list(reversed(path[1:]))
+    assert board.astar(start, goal, reversePath=True) == list(reversed(path))
+    assert board.path_cache.hits == 5
+    assert board.path_cache.misses == 1
+
+    # unreachable goals are cached as well
+    assert board.astar(start, (100, 0, 100)) is None
+    assert board.astar(start, (100, 0, 100)) is None
+    assert board.path_cache.misses == 2
+
+    # a new terrain version is a different key
+    board.terrain_version += 1
+    assert board.astar(start, goal) == path
+    assert board.path_cache.misses == 3
+
+    # bounded size with LRU eviction
+    board.path_cache.max_size = 2
+    board.astar((1, 0, 0), (1, 0, 7))
+    assert len(board.path_cache) == 2
+
+
+def test_BoardState_update_meta_grid_delta():
+    board = BoardState(list(DEFAULT_EXPECTED_OUTPUT_GRID_MAP.keys()))
+
+    delta = board.update_meta_grid(
+        movable_tiles=[(0, 0, 0), (0, 0, 1), (1, 0, 0)],
+        attackable_tiles=[(1, 0, 0)],
+    )
+    assert delta == {
+        (0, 0, 0): BoardState.MOVABLE_TILE,
+        (0, 0, 1): BoardState.MOVABLE_TILE,
+        (1, 0, 0): BoardState.NEIGHBOR_TILE,
+    }
+    assert board.meta_grid == delta
+
+    # unchanged layers produce an empty delta
+    assert (
+        board.update_meta_grid(
+            movable_tiles=[(0, 0, 0), (0, 0, 1), (1, 0, 0)],
+            attackable_tiles=[(1, 0, 0)],
+        )
+        == {}
+    )
+
+    # added, removed and changed cells only
+    delta = board.update_meta_grid(
+        movable_tiles=[(0, 0, 0), (1, 0, 0), (2, 1, 0)],
+        enemy_tiles=[(0, 0, 0)],
+    )
+    assert delta == {
+        (0, 0, 1): BoardState.EMPTY_TILE,
+        (1, 0, 0): BoardState.MOVABLE_TILE,
+        (2, 1, 0): BoardState.MOVABLE_TILE,
+        (0, 0, 0): BoardState.ENEMY_TILE,
+    }
+    assert board.meta_grid == {
+        (0, 0, 0): BoardState.ENEMY_TILE,
+        (1, 0, 0): BoardState.MOVABLE_TILE,
+        (2, 1, 0): BoardState.MOVABLE_TILE,
+    }
+
+    # deltas accumulate until they are popped
+    assert board.pop_meta_grid_delta() == {
+        (0, 0, 0): BoardState.ENEMY_TILE,
+        (0, 0, 1): BoardState.EMPTY_TILE,
+        (1, 0, 0): BoardState.MOVABLE_TILE,
+        (2, 1, 0): BoardState.MOVABLE_TILE,
+    }
+    assert board.pop_meta_grid_delta() == {}
+
+
+def test_BoardState_compile_2d_mask():
+    mask_2d = {
+        "mask": [
+            [None, BoardState.FILLED_TILE, None],
+            [
+                BoardState.FILLED_TILE,
+                BoardState.MASK_DEFAULT_PIVOT_VALUE,
+                BoardState.FILLED_TILE,
+            ],
+            [None, BoardState.FILLED_TILE, None],
+            [None, BoardState.FILLED_TILE, None],
+        ],
+        "shape": (3, 4),
+    }
+
+    offsets = BoardState.compile_2d_mask(mask_2d)
+    assert offsets.dtype.name == "int16"
+    assert not offsets.flags.writeable
+    assert [tuple(o) for o in offsets.tolist()] == list(
+        BoardState.create_2d_position_list_from_2d_mask(
+            mask_2d["mask"], mask_2d["shape"]
+        ).keys()
+    )
+
+    # compiled once per mask content, whatever object holds it
+    assert BoardState.compile_2d_mask(mask_2d) is offsets
+    assert BoardState.compile_2d_mask(copy.deepcopy(mask_2d)) is offsets
+    assert len(BoardState._COMPILED_MASK_CACHE) <= BoardState.MAX_COMPILED_MASKS
+
+    board = BoardState(list(DEFAULT_EXPECTED_OUTPUT_GRID_MAP.keys()))
+    assert board.get_neighbors_by_2d_mask((1, 0, 1), mask_2d) == [
+        (0, 0, 1),
+        (1, 0, 0),
+        (1, 0, 2),
+        (1, 0, 3),
+        (2, 1, 1),
+    ]
+
+
+def test_BoardState_column_heightmap():
+    # a bridge: two levels in the columns at z=1
+    grid = [(x, 0, z) for x in range(3) for z in range(3)]
+    grid += [(x, 3, 1) for x in range(3)]
+    board = BoardState(grid)
+
+    assert board.get_grid_pos_2d((0, 0)) == (0, 0, 0)
+    assert board.get_grid_pos_2d((1, 1)) == (1, 3, 1)
+    assert board.get_grid_pos_2d((5, 5)) is None
+
+    positions_3d, valid = board.get_grid_pos_2d_batch(
+        [(0, 0), (1, 1), (5, 5), (-1, 0), (2, 2)]
+    )
+    assert valid.tolist() == [True, True, False, False, True]
+    assert [tuple(p) for p in positions_3d[valid].tolist()] == [
+        (0, 0, 0),
+        (1, 3, 1),
+        (2, 0, 2),
+    ]
+
+
+def test_BoardState_occupancy():
+    # a corridor 1 tile wide along x
+    board = BoardState([(x, 0, 0) for x in range(6)])
+    board.occupancy.place("friend", "t1", (2, 0, 0))
+    board.occupancy.place("enemy", "t2", (4, 0, 0))
+    terrain_version = board.terrain_version
+
+    # units are ignored unless a team is given
+    assert board.astar((0, 0, 0), (5, 0, 0)) is not None
+    assert (5, 0, 0) in board.movable_area((0, 0, 0), distance_budget=10)
+
+    # friends can be passed through but not stopped on, enemies block
+    assert board.astar((0, 0, 0), (3, 0, 0), team_id="t1") == [
         (0, 0, 0),
         (1, 0, 0),
         (2, 0, 0),
-        (-1, -1, 0),
-        (0, 1, -1),
-        (-2, -1, 0),
-        (0, -1, 2),
-        (0, 1, 1),
-        (0, 1, -2),
-        (-1, 0, 0),
-        (-2, 0, 0),
-        (0, 0, 2),
-        (1, 1, -1),
-        (1, 1, 1),
+        (3, 0, 0),
+    ]
+    assert board.astar((0, 0, 0), (5, 0, 0), team_id="t1") is None
+    assert board.movable_area((0, 0, 0), distance_budget=10, team_id="t1") == [
+        (0, 0, 0),
+        (1, 0, 0),
+        (3, 0, 0),
     ]
 
-    assert movable_area_from_center == expected_movable_area
\ No newline at end of file
+    # moving a unit is O(1), bumps the occupancy version and keeps the terrain indices
+    occupancy_version = board.occupancy_version
+    board.occupancy.move("enemy", (5, 0, 0))
+    assert board.occupancy_version > occupancy_version
+    assert board.terrain_version == terrain_version
+    assert board.occupancy.occupant((5, 0, 0)) == ("enemy", "t2")
+    assert board.astar((0, 0, 0), (4, 0, 0), team_id="t1") is not None
+    assert not board.occupancy.can_stop_at((5, 0, 0), "friend")
+    assert board.occupancy.can_stop_at((5, 0, 0), "enemy")
+
+
+def test_BoardState_flow_field():
+    board = BoardState(list(DEFAULT_EXPECTED_OUTPUT_GRID_MAP.keys()))
+    goals = [(7, 1, 2), (0, 0, 9)]
+    flow_field = board.get_flow_field(goals)
+
+    # every unit reads the same field, and following it matches a shortest path
+    for start in [(0, 0, 0), (5, 2, 0), (4, 0, 5)]:
+        path = flow_field.path_from(start)
+        assert path[0] == start and path[-1] in goals
+        expected_cost = min(
+            sum(board.distance_between(a, b) for a, b in zip(p, p[1:]))
+            for p in [board.astar(start, goal) for goal in goals]
+            if p is not None
+        )
+        assert abs(flow_field.cost_at(start) - expected_cost) < 1e-6
+        assert flow_field.next_step(start) == path[1]
+    assert flow_field.next_step((7, 1, 2)) is None
+
+    # cached per goal set until the occupancy it depends on changes
+    assert board.get_flow_field(list(reversed(goals))) is flow_field
+    team_field = board.get_flow_field(goals, team_id="t1")
+    assert board.get_flow_field(goals, team_id="t1") is team_field
+    board.occupancy.place("enemy", "t2", (1, 0, 0))
+    assert board.get_flow_field(goals, team_id="t1") is not team_field
+    assert board.get_flow_field(goals, team_id="t1").next_step((0, 0, 0)) != (1, 0, 0)
+    assert board.get_flow_field(goals) is flow_field
+
+
+def test_BoardState_invalidation_bus():
+    # two separate corridors along x, at z=0 and z=6
+    board = BoardState([(x, 0, z) for x in range(8) for z in (0, 6)])
+    events = []
+
+    class RecordingCache:
+        def invalidate(self, event, old_version, new_version, region):
+            events.append((event, old_version, new_version, region))
+
+    board.register_cache(RecordingCache())
+    terrain_version = board.terrain_version
+
+    near = board.astar((0, 0, 0), (7, 0, 0))
+    far = board.astar((0, 0, 6), (7, 0, 6))
+    misses = board.path_cache.misses
+
+    # removing a tile only drops the paths through it
+    board.update_terrain(removed=[(3, 0, 0)])
+    assert events[-1] == (
+        BoardState.TERRAIN_CHANGED,
+        terrain_version,
+        terrain_version + 1,
+        [(3, 0, 0)],
+    )
+    assert board.astar((0, 0, 6), (7, 0, 6)) == far
+    assert board.path_cache.misses == misses
+    assert board.astar((0, 0, 0), (7, 0, 0)) is None
+    assert board.path_cache.misses == misses + 1
+
+    # adding tiles drops the paths they could shorten, and cached "no path" results
+    board.astar((0, 0, 6), (3, 0, 6))
+    board.update_terrain(added=[(3, 0, 0)] + [(7, 0, z) for z in range(1, 6)])
+    assert board.astar((0, 0, 0), (7, 0, 0)) == near
+    misses = board.path_cache.misses
+    assert board.astar((0, 0, 6), (3, 0, 6)) is not None
+    assert board.path_cache.misses == misses
+    assert len(board.astar((7, 0, 6), (7, 0, 0))) == 7
+
+    # occupancy changes only concern searches for a team, and only near the change
+    board.astar((0, 0, 6), (3, 0, 6), team_id="t1")
+    misses = board.path_cache.misses
+    board.occupancy.place("enemy", "t2", (5, 0, 0))
+    assert events[-1][0] == BoardState.OCCUPANCY_CHANGED
+    assert events[-1][3] == [(5, 0, 0)]
+    assert board.astar((0, 0, 6), (3, 0, 6), team_id="t1") is not None
+    assert board.astar((0, 0, 0), (7, 0, 0)) == near
+    assert board.path_cache.misses == misses
+    assert board.astar((0, 0, 0), (7, 0, 0), team_id="t1") != near
+
+    board.mark_characters_changed(["enemy"])
+    assert events[-1] == (BoardState.CHARACTERS_CHANGED, 0, 1, ["enemy"])
@@ -0,0 +1,47 @@
+from python.lib.character import Character
+from python.lib.character_store import CharacterStore
+
+
+def test_CharacterStore_views():
+    store = CharacterStore(capacity=1)
+    properties = [
+        {
+            "id": "i%d" % i,
+            "position": (i, 0, 2 * i),
+            "last_position": (i, 0, 2 * i),
+            "name": "c%d" % i,
+            "hit_points": 2,
+            "team_id": "t%d" % (i % 2),
+        }
+        for i in range(5)
+    ]
+    # grows past its initial capacity
+    characters = [Character(p, store) for p in properties]
+    assert len(store) == 5
+
+    assert [dict(c) for c in characters] == store.serialize()
+    assert store.serialize() == [
+        {k: p[k] for k in dict(Character()).keys()} for p in properties
+    ]
+    assert all(Character.view(store, c.row) is c for c in characters)
+
+    characters[1].position = (7, 1, 7)
+    characters[1].hit_points = 0
+    characters[2].team_id = "t1"
+    characters[3].id = "renamed"
+    assert store.positions[1].tolist() == [7, 1, 7]
+    assert characters[1].position == (7, 1, 7)
+    assert store.alive_rows().tolist() == [0, 2, 3, 4]
+    assert store.team_rows("t1").tolist() == [1, 2, 3]
+    assert store.team_rows("missing").tolist() == []
+    assert store.row_of("renamed") == 3
+    assert store.row_of("i3") is None
+
+
+def test_Character_private_store():
+    character = Character({"name": "solo", "team_id": "t1"})
+    assert character.name == "solo"
+    assert character.position == Character.DEFAULT_PROPERTIES["position"]
+    assert character.hit_points == Character.DEFAULT_PROPERTIES["hit_points"]
+    assert character.id != Character.NULL_ID
+    assert len(character.store) == 1
@@ -0,0 +1,73 @@
+import pytest
+
+from python.lib.board_state import BoardState
+from python.lib.chunked_terrain import ChunkedTerrain
+from python.lib.terrain_file import TerrainFile
+from .constants import DEFAULT_EXPECTED_OUTPUT_GRID_MAP
+
+
+def test_ChunkedTerrain_board(tmp_path):
+    positions = list(DEFAULT_EXPECTED_OUTPUT_GRID_MAP.keys())
+    path = str(tmp_path / "terrain.bin")
+    TerrainFile.write(path, positions)
+
+    heightfield, origin = TerrainFile.open(path)
+    terrain = ChunkedTerrain(
+        heightfield, origin=origin, chunk_size=3, max_loaded_chunks=2
+    )
+    chunked_board = BoardState(terrain)
+    board = BoardState(positions)
+
+    assert chunked_board.chunked
+    assert chunked_board.terrain_grid == board.terrain_grid
+    assert len(terrain) == len(positions)
+    assert (100, 0, 100) not in terrain
+
+    # queries cross chunk boundaries transparently
+    for pos in positions:
+        assert chunked_board.neighbors(pos) == board.neighbors(pos)
+        assert chunked_board.movable_area(pos) == board.movable_area(pos)
+
+    for pos_2d in board.terrain_grid_2d:
+        assert chunked_board.get_grid_pos_2d(pos_2d) == board.get_grid_pos_2d(pos_2d)
+    assert chunked_board.get_grid_pos_2d((100, 100)) is None
+
+    assert chunked_board.astar((0, 0, 0), (7, 1, 2)) == board.astar(
+        (0, 0, 0), (7, 1, 2)
+    )
+    assert chunked_board.get_neighbors_by_2d_mask(
+        (1, 0, 1), {"mask": [[1, 1, -1, 1, 1]], "shape": (5, 1)}
+    ) == board.get_neighbors_by_2d_mask(
+        (1, 0, 1), {"mask": [[1, 1, -1, 1, 1]], "shape": (5, 1)}
+    )
+
+    nearest_pos, nearest_dist = chunked_board.get_nearest_node_from_position(
+        (2.2, 0, 9.4)
+    )
+    expected_pos, expected_dist = board.get_nearest_node_from_position((2.2, 0, 9.4))
+    assert abs(nearest_dist - expected_dist) < 1e-9
+    assert chunked_board.euclidean_distance((2.2, 0, 9.4), nearest_pos) == nearest_dist
+
+    # resident memory stays bounded, batched lookups included
+    assert len(terrain.loaded_chunks()) <= 2
+    assert terrain.chunk_evictions > 0
+    chunk_loads = terrain.chunk_loads
+    xz = [(x, z) for x, _, z in positions] + [(100, 100)]
+    top, valid = terrain.top_batch(xz)
+    expected_top, expected_valid = board.heightmap.top_batch(xz)
+    assert (valid == expected_valid).all()
+    assert (top[valid] == expected_top[expected_valid]).all()
+    assert terrain.chunk_loads > chunk_loads
+    assert len(terrain.loaded_chunks()) <= 2
+
+
+def test_ChunkedTerrain_create_heightfield():
+    heightfield, origin = ChunkedTerrain.create_heightfield(
+        [(1, 2, 3), (2, 0, 3), (1, 2, 3)]
+    )
+    assert origin == (1, 3)
+    assert heightfield.tolist() == [[2], [0]]
+
+    # a heightfield would silently drop the lower level
+    with pytest.raises(ValueError):
+        ChunkedTerrain.create_heightfield([(1, 2, 3), (1, 0, 3)])
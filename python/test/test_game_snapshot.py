@@ -0,0 +1,125 @@
+import json
+import random
+from unittest.mock import MagicMock
+
+import pytest
+
+from python.lib.events import Events
+from python.lib.game_state import GameState
+from python.lib.masks import SWORD_MASK, X_MASK
+
+GRID = [(x, 0, z) for x in range(40) for z in range(40)]
+
+
+def create_game_state(num_characters=400, grid=GRID, rng_seed=1):
+    rng = random.Random(0)
+    positions = rng.sample(grid, num_characters)
+    game_state = GameState(
+        Events,
+        initial_state={
+            "grid": grid,
+            "characters": [
+                {
+                    "id": "c%d" % i,
+                    "name": "unit %d" % i,
+                    "position": p,
+                    "last_position": p,
+                    "hit_points": rng.randint(1, 5),
+                    "team_id": "t%d" % (i % 2),
+                }
+                for i, p in enumerate(positions)
+            ],
+            "teams": [{"id": "t0", "name": "red"}, {"id": "t1", "name": "blue"}],
+        },
+        rng_seed=rng_seed,
+    )
+    game_state.broadcast = MagicMock()
+    return game_state
+
+
+def test_GameState_snapshot_and_restore():
+    game_state = create_game_state()
+    game_state.setup(
+        skip_character_repositioning=True, skip_character_team_assignment=True
+    )
+    game_state.selected_character_attack_mask = X_MASK
+    game_state.character_attack_masks["c3"] = SWORD_MASK
+    game_state.cursor_position = (4, 0, 5)
+    expected_state = game_state.state()
+    expected_rng_state = game_state.rng.getstate()
+    expected_movable = (
+        list(game_state.movable_tiles),
+        dict(game_state.movable_predecessors),
+    )
+
+    blob = game_state.snapshot()
+    compressed_blob = game_state.snapshot(compress=True)
+    assert len(compressed_blob) < len(blob)
+
+    for snapshot in (blob, compressed_blob):
+        # a different game on the same terrain
+        restored = create_game_state(num_characters=3, rng_seed=9)
+        restored.restore(snapshot)
+        assert restored.state() == expected_state
+        assert restored.rng.getstate() == expected_rng_state
+        assert restored.turn == game_state.turn
+        assert restored.cursor_position == (4, 0, 5)
+        assert restored.selected_character_attack_mask is X_MASK
+        assert restored.character_attack_masks == {"c3": SWORD_MASK}
+        assert (
+            restored.movable_tiles,
+            restored.movable_predecessors,
+        ) == expected_movable
+        assert restored.get_character_at(game_state.characters[7].position).id == "c7"
+
+    # restoring rolls back later changes of the same game
+    game_state.characters[0].hit_points = 0
+    game_state.rng.random()
+    game_state.restore(blob)
+    assert game_state.state() == expected_state
+    assert game_state.rng.getstate() == expected_rng_state
+
+
+def test_GameState_snapshot_size():
+    game_state = create_game_state(num_characters=1000)
+    # an order of magnitude smaller than the JSON Godot gets, even without its grids
+    dumped_state = game_state.state()
+    del dumped_state["grid"], dumped_state["meta_grid"]
+    assert len(game_state.snapshot(compress=True)) * 10 < len(json.dumps(dumped_state))
+
+
+def test_GameState_snapshot_none_strings():
+    game_state = create_game_state(num_characters=10)
+    game_state.teams[1].name = None
+    game_state.teams[0].name = ""
+    expected_teams = [dict(t) for t in game_state.teams]
+
+    restored = create_game_state(num_characters=3)
+    restored.restore(game_state.snapshot())
+    assert [dict(t) for t in restored.teams] == expected_teams
+    assert restored.teams[1].name is None
+
+
+def test_GameState_snapshot_without_cursor():
+    game_state = create_game_state(num_characters=3)
+    game_state.cursor_position = None
+
+    restored = create_game_state(num_characters=3)
+    restored.restore(game_state.snapshot())
+    assert restored.cursor_position is None
+    # and a cursor at the origin is not mistaken for no cursor
+    game_state.cursor_position = (0, 0, 0)
+    restored.restore(game_state.snapshot(compress=True))
+    assert restored.cursor_position == (0, 0, 0)
+
+
+def test_GameState_restore_rejects_invalid_snapshots():
+    game_state = create_game_state(num_characters=10)
+    blob = game_state.snapshot()
+    with pytest.raises(ValueError):
+        game_state.restore(b"GPXX" + blob[4:])
+    with pytest.raises(ValueError):
+        game_state.restore(blob[:-1])
+    other_terrain = create_game_state(num_characters=10, grid=GRID[:-1])
+    with pytest.raises(ValueError):
+        other_terrain.restore(blob)
@@ -1,8 +1,13 @@
 from python.lib.events import Events
 from python.lib.board_state import BoardState
 from python.lib.game_state import GameState
+from python.lib.influence_map import InfluenceMap
+from python.lib.masks import SWORD_MASK, X_MASK
+from python.lib.undo_stack import UndoStack
+from python.lib.visibility import VisibilityEngine
 from unittest.mock import MagicMock
 from collections import Counter
+import pytest
 
 from .constants import (
     DEFAULT_EXPECTED_OUTPUT_GRID_MAP,
@@ -95,15 +100,16 @@ def test_GameState_setup():
 
     output_terrain_grid = DEFAULT_EXPECTED_OUTPUT_GRID_MAP
 
+    # movable tiles are bounded by path cost, so climbing to y=1 uses the whole budget
     output_meta_grid = {
         (2, 1, 1): BoardState.NEIGHBOR_TILE,
         (1, 0, 1): BoardState.MOVABLE_TILE,
-        (2, 1, 0): BoardState.MOVABLE_TILE,
         (0, 0, 0): BoardState.MOVABLE_TILE,
         (1, 0, 0): BoardState.NEIGHBOR_TILE,
-        (2, 1, 2): BoardState.MOVABLE_TILE,
         (1, 0, 3): BoardState.MOVABLE_TILE,
+        (1, 0, 4): BoardState.MOVABLE_TILE,
         (0, 0, 2): BoardState.MOVABLE_TILE,
+        (0, 0, 3): BoardState.MOVABLE_TILE,
         (1, 0, 2): BoardState.NEIGHBOR_TILE,
         (0, 0, 1): BoardState.NEIGHBOR_TILE,
     }
@@ -239,3 +245,250 @@ def test_GameState_create_characters():
         }
     )
     assert actual_counts == expected_counts
+
+
+def test_GameState_batched_attack_areas():
+    gs = GameState(
+        events=Events,
+        initial_state=DEFAULT_INITIAL_GAME_STATE,
+        rng_seed=DEFAULT_RANDOM_SEED,
+    )
+    gs.broadcast = MagicMock(name="broadcast")
+    gs.setup(skip_character_team_assignment=True, skip_character_repositioning=True)
+
+    gs.character_attack_masks["i2"] = SWORD_MASK
+    gs.character_attack_masks["i4"] = X_MASK
+
+    # bring a friend (i4) and an enemy (i3) into range of the selected character (i1)
+    characters_by_id = {c.id: c for c in gs.characters}
+    characters_by_id["i4"].position = (1, 0, 3)
+    characters_by_id["i3"].position = (0, 0, 1)
+
+    # matches the per-character computation
+    attackable_tiles = gs.get_attackable_tiles_for_characters()
+    for c in gs.characters:
+        expected_tiles = gs.board_state.get_neighbors_by_2d_mask(
+            c.position, gs.get_character_attack_mask(c)
+        )
+        assert sorted(attackable_tiles[c.id]) == sorted(expected_tiles)
+
+    # brute-force "who can hit whom"
+    expected_pairs = set()
+    for attacker, tiles in attackable_tiles.items():
+        for c in gs.characters:
+            if c.position in tiles and c.id != attacker:
+                expected_pairs.add((attacker, c.id))
+
+    all_pairs = gs.get_attack_pairs(enemies_only=False)
+    assert {(a.id, t.id) for a, t in all_pairs} == expected_pairs
+    assert len(expected_pairs) > 0
+
+    enemy_pairs = gs.get_attack_pairs()
+    assert all(a.team_id != t.team_id for a, t in enemy_pairs)
+    assert {(a.id, t.id) for a, t in enemy_pairs} == {
+        (a, t)
+        for a, t in expected_pairs
+        if characters_by_id[a].team_id != characters_by_id[t].team_id
+    }
+    assert ("i1", "i3") in {(a.id, t.id) for a, t in enemy_pairs}
+
+
+def test_GameState_character_indexes():
+    gs = GameState(
+        events=Events,
+        initial_state=DEFAULT_INITIAL_GAME_STATE,
+        rng_seed=DEFAULT_RANDOM_SEED,
+    )
+    gs.broadcast = MagicMock(name="broadcast")
+    gs.setup(skip_character_team_assignment=True, skip_character_repositioning=True)
+
+    for i, c in enumerate(gs.characters):
+        assert gs.get_character_index(c) == i
+        assert gs.get_character_by_id(c.id) is c
+        assert gs.get_character_at(c.position) is c
+    assert gs.get_character_by_id("missing") is None
+
+    character = gs.get_character_by_id("i3")
+    old_position = character.position
+    character.position = (0, 0, 7)
+    assert gs.get_character_at(old_position) is None
+    assert gs.get_character_at((0, 0, 7)) is character
+
+    character.team_id = "t2"
+    assert [c.id for c in gs.get_team_members("t1")] == ["i2", "i5"]
+    assert [c.id for c in gs.get_team_members("t2")] == ["i1", "i3", "i4", "i6"]
+
+    # the defeated stay indexed by id, but no longer stand on their tile
+    gs.attack_character(gs.characters[0], character)
+    assert gs.get_character_by_id("i3") is character
+    assert gs.get_character_at((0, 0, 7)) is None
+
+
+def test_GameState_characters_state():
+    gs = GameState(
+        events=Events,
+        initial_state=DEFAULT_INITIAL_GAME_STATE,
+        rng_seed=DEFAULT_RANDOM_SEED,
+    )
+    gs.broadcast = MagicMock(name="broadcast")
+    gs.setup(skip_character_team_assignment=True, skip_character_repositioning=True)
+    gs.on_request_player_move((0, 0, 1))
+
+    state = gs.state()
+    characters_state = gs.characters_state()
+    assert set(characters_state.keys()) == {"selected_character", "characters"}
+    assert characters_state["characters"] == state["characters"]
+    assert characters_state["selected_character"] == state["selected_character"]
+
+
+def test_GameState_undo_and_redo():
+    gs = GameState(
+        events=Events,
+        initial_state=DEFAULT_INITIAL_GAME_STATE,
+        rng_seed=DEFAULT_RANDOM_SEED,
+    )
+    gs.broadcast = MagicMock(name="broadcast")
+    gs.setup(skip_character_team_assignment=True, skip_character_repositioning=True)
+
+    def summarize():
+        state = gs.state()
+        return (
+            state["characters"],
+            state["selected_character"],
+            state["meta_grid"],
+            list(gs.movable_tiles),
+            list(gs.attackable_tiles),
+            gs.rng.getstate(),
+            gs.turn,
+        )
+
+    def assert_occupancy_matches():
+        occupancy = gs.board_state.occupancy
+        for c in gs.characters:
+            expected = c.position if gs.is_alive(c) else None
+            assert occupancy.position_of(c.id) == expected
+
+    states = [summarize()]
+    gs.on_request_player_move((0, 0, 1))
+    # a move only records the row of the character that moved
+    assert list(gs.undo_stack.undo_steps[-1].rows) == [0]
+    states.append(summarize())
+    gs.on_end_turn()
+    states.append(summarize())
+    gs.select_character(gs.characters[3])
+    states.append(summarize())
+    gs.attack_character(gs.characters[3], gs.characters[1])
+    states.append(summarize())
+    assert not gs.is_alive(gs.characters[1])
+    # failed moves change nothing and record nothing
+    gs.on_request_player_move((0, 0, 10))
+    assert len(gs.undo_stack.undo_steps) == 4
+
+    assert gs.undo() == 1
+    assert summarize() == states[3]
+    assert_occupancy_matches()
+    assert gs.undo(2) == 2
+    assert summarize() == states[1]
+    assert gs.redo() == 1
+    assert summarize() == states[2]
+    assert gs.undo(10) == 2
+    assert summarize() == states[0]
+    assert_occupancy_matches()
+    assert gs.redo(10) == 4
+    assert summarize() == states[4]
+    assert_occupancy_matches()
+
+    # a new change forgets the undone steps
+    gs.undo()
+    gs.on_end_turn()
+    assert gs.redo() == 0
+
+    # the stack is bounded
+    gs.undo_stack = UndoStack(max_size=2)
+    for _ in range(3):
+        gs.on_end_turn()
+    assert gs.undo(5) == 2
+
+
+def test_GameState_undo_and_redo_derived_state():
+    gs = GameState(
+        events=Events,
+        initial_state=DEFAULT_INITIAL_GAME_STATE,
+        rng_seed=DEFAULT_RANDOM_SEED,
+    )
+    gs.broadcast = MagicMock(name="broadcast")
+    gs.setup(skip_character_team_assignment=True, skip_character_repositioning=True)
+
+    def derived():
+        team_ids = [t.id for t in gs.teams]
+        return (
+            {t: gs.influence.enemy_threat(t) for t in team_ids},
+            {t: gs.influence.enemy_damage(t) for t in team_ids},
+            {t: set(gs.visibility.team_visible_tiles(t)) for t in team_ids},
+        )
+
+    def recomputed():
+        # the same state, derived from scratch instead of incrementally
+        influence, visibility = gs.influence, gs.visibility
+        gs.influence = InfluenceMap(gs.board_state, move_budget=influence.move_budget)
+        gs.visibility = VisibilityEngine(gs.board_state)
+        gs.update_unit_layers()
+        fresh = derived()
+        gs.influence, gs.visibility = influence, visibility
+        return fresh
+
+    states = [derived()]
+    # end turns that change no character rows still change the selection
+    for _ in range(3):
+        gs.on_end_turn()
+        states.append(derived())
+    gs.on_request_player_move((0, 0, 1))
+    states.append(derived())
+    gs.select_character(gs.characters[3])
+    states.append(derived())
+    gs.attack_character(gs.characters[3], gs.characters[1])
+    states.append(derived())
+    assert derived() == recomputed()
+
+    assert gs.undo(3) == 3
+    assert derived() == states[3] == recomputed()
+    assert gs.undo(3) == 3
+    assert derived() == states[0] == recomputed()
+    assert gs.redo(4) == 4
+    assert derived() == states[4] == recomputed()
+    assert gs.redo(2) == 2
+    assert derived() == states[6] == recomputed()
+
+
+def test_GameState_perform_action():
+    gs = GameState(
+        events=Events,
+        initial_state={
+            "grid": [(x, 0, 0) for x in range(8)],
+            "characters": [
+                {"id": "p", "position": (0, 0, 0), "team_id": "t1", "hit_points": 1},
+                {"id": "e", "position": (3, 0, 0), "team_id": "t2", "hit_points": 5},
+                {"id": "a", "position": (6, 0, 0), "team_id": "t1", "hit_points": 1},
+                {"id": "f", "position": (7, 0, 0), "team_id": "t2", "hit_points": 1},
+            ],
+            "teams": [{"id": "t1"}, {"id": "t2"}],
+        },
+        rng_seed=DEFAULT_RANDOM_SEED,
+    )
+    gs.broadcast = MagicMock(name="broadcast")
+    gs.setup(skip_character_team_assignment=True, skip_character_repositioning=True)
+    gs.selected_character_attack_mask = SWORD_MASK
+    p, e, a, f = gs.characters
+    f.hit_points = 0
+
+    # out of reach, a friend, a fallen enemy
+    for move_to, target in [((0, 0, 0), e), ((2, 0, 0), a), ((2, 0, 0), f)]:
+        with pytest.raises(ValueError):
+            gs.perform_action(p, move_to, target)
+    assert p.position == (0, 0, 0)
+    assert e.hit_points == 5
+    assert len(gs.command_log) == 0
+
+    gs.perform_action(p, (2, 0, 0), e)
+    assert p.position == (2, 0, 0)
+    assert e.hit_points == 4
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from python.lib.board_state import BoardState
+from python.lib.hierarchical_pathfinder import HierarchicalPathfinder
+from python.lib.terrain_file import TerrainFile
+
+
+def create_hilly_grid(size, seed):
+    rng = np.random.RandomState(seed)
+    xs = np.arange(size)
+    heights = np.round(
+        2 * np.sin(xs[:, np.newaxis] / 5.0) + 2 * np.cos(xs[np.newaxis, :] / 7.0)
+    ).astype(int)
+    return [
+        (x, int(heights[x, z]), z)
+        for x in range(size)
+        for z in range(size)
+        if rng.rand() > 0.1
+    ]
+
+
+def path_cost(board, path):
+    return sum(board.distance_between(a, b) for a, b in zip(path, path[1:]))
+
+
+def test_HierarchicalPathfinder_find_path():
+    grid = create_hilly_grid(24, seed=7)
+    board = BoardState(grid)
+    pathfinder = HierarchicalPathfinder(board, cluster_size=6)
+
+    rng = np.random.RandomState(3)
+    for _ in range(30):
+        start = grid[rng.randint(len(grid))]
+        goal = grid[rng.randint(len(grid))]
+
+        path = pathfinder.find_path(start, goal)
+        optimal_path = board.astar(start, goal)
+
+        # the abstract graph is exactly as connected as the board
+        assert (path is None) == (optimal_path is None)
+        if path is None:
+            continue
+
+        assert path[0] == start
+        assert path[-1] == goal
+        for a, b in zip(path, path[1:]):
+            assert b in board.neighbors(a)
+
+        # near-optimal
+        assert path_cost(board, path) <= 1.5 * path_cost(board, optimal_path)
+
+    assert pathfinder.find_path(grid[0], grid[0]) == [grid[0]]
+    assert pathfinder.find_path(grid[0], (100, 0, 100)) is None
+
+
+def test_HierarchicalPathfinder_disconnected_clusters():
+    # two islands separated by a cliff in the middle of one cluster
+    grid = [(x, 0, z) for x in range(0, 3) for z in range(8)]
+    grid += [(x, 5, z) for x in range(3, 8) for z in range(8)]
+    board = BoardState(grid)
+    pathfinder = HierarchicalPathfinder(board, cluster_size=4)
+    pathfinder.precompute()
+
+    assert pathfinder.find_path((0, 0, 0), (7, 5, 7)) is None
+    path = pathfinder.find_path((0, 0, 0), (2, 0, 7))
+    assert path_cost(board, path) == path_cost(board, board.astar((0, 0, 0), (2, 0, 7)))
+
+
+def test_HierarchicalPathfinder_chunked_board(tmp_path):
+    path = str(tmp_path / "terrain.bin")
+    TerrainFile.write(path, create_hilly_grid(8, seed=1))
+    board = BoardState.from_terrain_file(path)
+    with pytest.raises(ValueError):
+        HierarchicalPathfinder(board)
@@ -0,0 +1,90 @@
+import numpy as np
+
+from python.lib.board_state import BoardState
+from python.lib.influence_map import InfluenceMap
+from python.lib.masks import SPEAR_MASK, SWORD_MASK
+from python.lib.terrain_file import TerrainFile
+
+
+def brute_force_threat(board, units, team_id, move_budget):
+    """Counts the enemies of team_id that can attack each column after one move"""
+    threat = {}
+    for unit_id, unit_team_id, position, mask_2d, _ in units:
+        if unit_team_id == team_id:
+            continue
+        attackable = set()
+        for tile in board.movable_area(
+            position, distance_budget=move_budget, team_id=unit_team_id
+        ):
+            attackable.update(board.get_neighbors_by_2d_mask(tile, mask_2d))
+        for x, _, z in attackable:
+            threat[(x, z)] = threat.get((x, z), 0) + 1
+    return threat
+
+
+def test_InfluenceMap_update_units():
+    board = BoardState([(x, 0, z) for x in range(9) for z in range(9)])
+    units = [
+        ("a", "t1", (1, 0, 1), SWORD_MASK, 1.0),
+        ("b", "t2", (4, 0, 4), SPEAR_MASK, 2.0),
+        ("c", "t2", (5, 0, 4), SWORD_MASK, 1.0),
+    ]
+    for unit_id, team_id, position, _, _ in units:
+        board.occupancy.place(unit_id, team_id, position)
+    influence = InfluenceMap(board, move_budget=2)
+
+    assert influence.update_units(units) == 3
+    for team_id in ("t1", "t2"):
+        assert influence.enemy_threat(team_id) == brute_force_threat(
+            board, units, team_id, 2
+        )
+    assert influence.threat_at("t1", (4, 0, 3)) == 2
+    assert influence.enemy_damage("t1")[(4, 3)] == 3.0
+    assert (4, 0, 3) in influence.danger_tiles("t1")
+
+    # nothing moved
+    assert influence.update_units(units) == 0
+
+    # "a" moves next to "b" and blocks part of its reach, far units are not recomputed
+    units[0] = ("a", "t1", (4, 0, 2), SWORD_MASK, 1.0)
+    board.occupancy.move("a", (4, 0, 2))
+    units.append(("d", "t1", (8, 0, 8), SWORD_MASK, 1.0))
+    board.occupancy.place("d", "t1", (8, 0, 8))
+    assert influence.update_units(units) == 4
+    units[3] = ("d", "t1", (8, 0, 7), SWORD_MASK, 1.0)
+    board.occupancy.move("d", (8, 0, 7))
+    assert influence.update_units(units) == 1
+    for team_id in ("t1", "t2"):
+        assert influence.enemy_threat(team_id) == brute_force_threat(
+            board, units, team_id, 2
+        )
+
+    # removed units take their threat with them
+    influence.update_units(units[:1])
+    assert influence.enemy_threat("t1") == {}
+    assert influence.threat["t2"] == {}
+
+
+def test_InfluenceMap_chunked_board(tmp_path):
+    path = str(tmp_path / "terrain.bin")
+    TerrainFile.write_heightfield(path, np.zeros((1024, 1024), dtype=np.int16))
+    board = BoardState.from_terrain_file(path)
+    units = [
+        ("a", "t1", (40, 0, 40), SWORD_MASK, 1.0),
+        # straddles the corner of four chunks
+        ("b", "t2", (511, 0, 512), SPEAR_MASK, 1.0),
+    ]
+    for unit_id, team_id, position, _, _ in units:
+        board.occupancy.place(unit_id, team_id, position)
+    influence = InfluenceMap(board, move_budget=2)
+    influence.update_units(units)
+
+    # only the chunks around the units are allocated
+    assert len(influence.threat["t1"]) == 1
+    assert len(influence.threat["t2"]) == 4
+    for team_id in ("t1", "t2"):
+        assert influence.enemy_threat(team_id) == brute_force_threat(
+            board, units, team_id, 2
+        )
+    assert influence.threat_at("t1", (511, 0, 511)) == 1
+    assert influence.threat_at("t1", (700, 0, 700)) == 0
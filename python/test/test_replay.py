@@ -0,0 +1,168 @@
+import random
+from unittest.mock import MagicMock
+
+import pytest
+
+from python.lib.ai_controller import RandomController
+from python.lib.command_log import CommandLog
+from python.lib.events import Events
+from python.lib.game_state import GameState
+from python.lib.replay import Replay
+
+INITIAL_STATE = {
+    "grid": [(x, 0, z) for x in range(8) for z in range(8)],
+    "characters": [
+        {"id": "p%d" % i, "position": (i, 0, 0), "team_id": "t1", "hit_points": 3}
+        for i in range(3)
+    ]
+    + [
+        {"id": "a%d" % i, "position": (i, 0, 7), "team_id": "t2", "hit_points": 3}
+        for i in range(3)
+    ],
+    "teams": [{"id": "t1"}, {"id": "t2"}],
+}
+
+
+def create_game_state(rng_seed):
+    game_state = GameState(Events, initial_state=INITIAL_STATE, rng_seed=rng_seed)
+    game_state.broadcast = MagicMock()
+    return game_state
+
+
+def summarize(game_state):
+    return (
+        game_state.turn,
+        game_state.state()["characters"],
+        game_state.selected_character.id,
+        sorted(game_state.movable_tiles),
+        sorted(game_state.attackable_tiles),
+        dict(game_state.board_state.meta_grid),
+        game_state.rng.getstate(),
+    )
+
+
+def test_Replay_seek():
+    game_state = create_game_state(rng_seed=7)
+    game_state.command_log = CommandLog(snapshot_interval=4)
+    game_state.setup(
+        skip_character_repositioning=True, skip_character_team_assignment=True
+    )
+    game_state.register_ai_controller(
+        "t2", RandomController("t2", rng=random.Random(3))
+    )
+
+    rng = random.Random(5)
+    moves = [(1, 0, 0), (0, 0, 1), (-1, 0, 0)]
+    expected = {0: summarize(game_state)}
+    for i in range(12):
+        for _ in range(2):
+            game_state.on_request_player_move(rng.choice(moves))
+        if i % 3 == 1:
+            # undoing is a command like any other
+            game_state.undo()
+        game_state.on_end_turn()
+        expected[game_state.turn] = summarize(game_state)
+        if game_state.get_winning_team() is not None:
+            break
+    log = game_state.command_log
+    assert len(log.snapshots) > 2
+    assert {t % 4 for t, _, _ in log.snapshots} == {0}
+
+    replay = Replay(create_game_state(rng_seed=None), log)
+    for turn in sorted(expected, reverse=True):
+        assert summarize(replay.seek(turn)) == expected[turn]
+    # only the commands after the nearest snapshot are applied
+    last_turn = max(expected)
+    replay.seek(last_turn)
+    assert replay.commands_applied < log.num_commands
+    assert replay.game_state.command_log is None
+    opcodes = {opcode for opcode, _ in log.commands()}
+    assert opcodes == {
+        CommandLog.PLAYER_MOVE,
+        CommandLog.ACTION,
+        CommandLog.NEXT_TURN,
+        CommandLog.UNDO,
+        CommandLog.STEP,
+    }
+
+
+def test_Replay_undo_across_snapshot():
+    game_state = create_game_state(rng_seed=3)
+    game_state.command_log = CommandLog(snapshot_interval=2)
+    game_state.setup(
+        skip_character_repositioning=True, skip_character_team_assignment=True
+    )
+    game_state.on_request_player_move((0, 0, 1))
+    game_state.on_end_turn()
+    start_of_turn_1 = summarize(game_state)
+    game_state.on_request_player_move((0, 0, 1))
+    game_state.on_end_turn()
+    assert game_state.turn == 2
+    # back to turn 1, across the snapshot taken when turn 2 started
+    assert game_state.undo(2) == 2
+    assert game_state.turn == 1
+    assert [t for t, _, _ in game_state.command_log.snapshots] == [0]
+    game_state.on_request_player_move((1, 0, 0))
+    expected_end = summarize(game_state)
+
+    replay = Replay(create_game_state(rng_seed=None), game_state.command_log)
+    # turn 2 was undone, so it is never reached
+    assert summarize(replay.seek(5)) == expected_end
+    assert summarize(replay.seek(2)) == expected_end
+    assert summarize(replay.seek(1)) == start_of_turn_1
+
+    # playing on takes snapshots again, and seeking uses them
+    game_state.on_end_turn()
+    game_state.on_request_player_move((0, 0, 1))
+    game_state.on_end_turn()
+    expected_end = summarize(game_state)
+    assert [t for t, _, _ in game_state.command_log.snapshots] == [0, 2]
+    assert summarize(replay.seek(3)) == expected_end
+    assert replay.commands_applied == 2
+
+
+def test_Replay_cursor_moves():
+    game_state = create_game_state(rng_seed=4)
+    game_state.command_log = CommandLog(snapshot_interval=2)
+    game_state.setup(
+        skip_character_repositioning=True, skip_character_team_assignment=True
+    )
+    game_state.on_request_cursor_move((1, 0, 0))
+    game_state.on_request_cursor_move((0, 0, 1))
+    assert game_state.cursor_position == (1, 0, 1)
+    game_state.on_end_turn()
+    game_state.on_request_cursor_move((1, 0, 0))
+    game_state.on_end_turn()
+    expected = (summarize(game_state), game_state.cursor_position)
+    assert [opcode for opcode, _ in game_state.command_log.commands()].count(
+        CommandLog.CURSOR_MOVE
+    ) == 3
+
+    replay = Replay(create_game_state(rng_seed=None), game_state.command_log)
+    replayed = replay.seek(game_state.turn)
+    assert (summarize(replayed), replayed.cursor_position) == expected
+    assert replay.seek(1).cursor_position == (1, 0, 1)
+
+
+def test_CommandLog_write_and_read(tmp_path):
+    game_state = create_game_state(rng_seed=2)
+    game_state.command_log = CommandLog(snapshot_interval=2, compress_snapshots=True)
+    game_state.setup(
+        skip_character_repositioning=True, skip_character_team_assignment=True
+    )
+    for move in [(1, 0, 0), (0, 0, 1), (1, 0, 0), (-1, 0, 0), (0, 0, 1)]:
+        game_state.on_request_player_move(move)
+        game_state.on_end_turn()
+    expected = summarize(game_state)
+
+    path = str(tmp_path / "match.gpcl")
+    game_state.command_log.write(path)
+    log = CommandLog.read(path)
+    assert log.data == game_state.command_log.data
+    assert log.snapshots == game_state.command_log.snapshots
+    assert summarize(Replay(create_game_state(rng_seed=None), log).seek(5)) == expected
+
+    with open(path, "ab") as f:
+        f.write(b"\0")
+    with pytest.raises(ValueError):
+        CommandLog.read(path)
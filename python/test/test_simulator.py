@@ -0,0 +1,45 @@
+from python.lib.ai_controller import RandomController
+from python.lib.simulator import Simulator
+
+
+def test_Simulator_run():
+    simulator = Simulator(
+        [RandomController],
+        terrain={"width": 8, "depth": 8, "max_height": 1},
+        max_turns=60,
+        num_workers=0,
+    )
+    stats = simulator.run(range(4))
+    assert stats["games"] == 4
+    assert sum(stats["wins"]) + stats["draws"] == 4
+    assert stats["games_per_second"] > 0
+    for result in stats["results"]:
+        assert 0 < result["turns"] <= 60
+        if result["winner"] is not None:
+            # only the winning team has survivors
+            assert [n > 0 for n in result["survivors"]] == [
+                i == result["winner"] for i in range(simulator.num_teams)
+            ]
+
+    # matches are reproducible from their seed, also across worker processes
+    parallel = Simulator(
+        [RandomController],
+        terrain={"width": 8, "depth": 8, "max_height": 1},
+        max_turns=60,
+        num_workers=2,
+    ).run(range(4))
+    assert [(r["winner"], r["turns"]) for r in parallel["results"]] == [
+        (r["winner"], r["turns"]) for r in stats["results"]
+    ]
+
+
+def test_Simulator_create_game_state():
+    simulator = Simulator(
+        [RandomController], terrain={"width": 6, "depth": 6, "max_height": 1}
+    )
+    game_state = Simulator.create_game_state(simulator.match_spec(3))
+    # simulated matches record neither a replay log nor undo steps
+    assert game_state.command_log is None
+    assert game_state.undo_stack is None
+    game_state.on_end_turn()
+    assert game_state.turn == 1
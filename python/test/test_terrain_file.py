@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from python.lib.board_state import BoardState
+from python.lib.game_state import GameState
+from python.lib.terrain_file import TerrainFile
+from .constants import DEFAULT_EXPECTED_OUTPUT_GRID_MAP
+
+
+def test_TerrainFile_write_and_open(tmp_path):
+    positions = list(DEFAULT_EXPECTED_OUTPUT_GRID_MAP.keys())
+    path = str(tmp_path / "terrain.bin")
+    TerrainFile.write(path, positions + [(-3, 2, -1)])
+
+    header = TerrainFile.read_header(path)
+    assert header["version"] == TerrainFile.VERSION
+    assert header["origin"] == (-3, -1)
+
+    heightfield, origin = TerrainFile.open(path)
+    assert isinstance(heightfield, np.memmap)
+    assert origin == (-3, -1)
+    assert heightfield.shape == header["shape"]
+    assert heightfield[0, 0] == 2
+    assert heightfield[1, 0] == TerrainFile.EMPTY_HEIGHT
+
+    with open(str(tmp_path / "bad.bin"), "wb") as f:
+        f.write(b"\0" * TerrainFile.HEADER_SIZE)
+    with pytest.raises(ValueError):
+        TerrainFile.open(str(tmp_path / "bad.bin"))
+
+
+def test_BoardState_from_terrain_file(tmp_path):
+    positions = list(DEFAULT_EXPECTED_OUTPUT_GRID_MAP.keys())
+    path = str(tmp_path / "terrain.bin")
+    TerrainFile.write(path, positions)
+
+    board = BoardState(positions)
+    file_board = BoardState.from_terrain_file(path, chunk_size=4)
+    assert file_board.chunked
+    assert file_board.terrain_grid == board.terrain_grid
+    assert file_board.astar((0, 0, 0), (7, 1, 2)) == board.astar((0, 0, 0), (7, 1, 2))
+
+    game_state = GameState({}, initial_state={"terrain_file": path})
+    assert game_state.board_state.chunked
+    assert game_state.board_state.terrain_grid == board.terrain_grid
@@ -0,0 +1,84 @@
+from python.lib.board_state import BoardState
+from python.lib.visibility import VisibilityEngine
+
+
+def create_wall_board(elevations):
+    """A 1-tile wide strip of terrain along x with the given heights"""
+    return BoardState([(x, y, 0) for x, y in enumerate(elevations)])
+
+
+def test_VisibilityEngine_visible_tiles():
+    board = create_wall_board([0, 0, 0, 3, 0, 0, 0])
+    visibility = VisibilityEngine(board, sight_range=8)
+
+    visible = visibility.visible_tiles((0, 0, 0))
+    assert (0, 0, 0) in visible
+    assert (2, 0, 0) in visible
+    assert (3, 3, 0) in visible
+    # hidden behind the wall
+    assert (4, 0, 0) not in visible
+    assert (6, 0, 0) not in visible
+
+    # cached until the terrain changes
+    assert visibility.visible_tiles((0, 0, 0)) is visible
+    assert visibility.hits == 1 and visibility.misses == 1
+
+    # high ground sees over the wall
+    high_board = create_wall_board([5, 0, 0, 3, 0, 0, 0])
+    high_visibility = VisibilityEngine(high_board, sight_range=8)
+    assert (6, 0, 0) in high_visibility.visible_tiles((0, 5, 0))
+
+    assert not visibility.line_of_sight((0, 0, 0), (6, 0, 0))
+    assert visibility.line_of_sight((0, 0, 0), (2, 0, 0))
+    assert high_visibility.line_of_sight((0, 5, 0), (6, 0, 0))
+
+
+def test_VisibilityEngine_team_visibility():
+    board = create_wall_board([0, 0, 0, 3, 0, 0, 0])
+    visibility = VisibilityEngine(board, sight_range=8)
+
+    assert (
+        visibility.update_units([("a", "t1", (0, 0, 0)), ("b", "t2", (6, 0, 0))]) == 2
+    )
+    assert visibility.is_visible_to_team("t1", (1, 0, 0))
+    assert not visibility.is_visible_to_team("t1", (5, 0, 0))
+    assert visibility.team_visible_tiles("t2") == {
+        (3, 3, 0),
+        (4, 0, 0),
+        (5, 0, 0),
+        (6, 0, 0),
+    }
+
+    # only units that moved are recomputed
+    assert (
+        visibility.update_units([("a", "t1", (0, 0, 0)), ("b", "t2", (6, 0, 0))]) == 0
+    )
+    assert (
+        visibility.update_units([("a", "t1", (0, 0, 0)), ("b", "t2", (3, 3, 0))]) == 1
+    )
+    assert visibility.is_visible_to_team("t2", (0, 0, 0))
+
+    # a second unit adds to the team's view, removing it takes its tiles away again
+    visibility.update_unit("c", "t1", (5, 0, 0))
+    assert visibility.is_visible_to_team("t1", (6, 0, 0))
+    visibility.update_units([("a", "t1", (0, 0, 0)), ("b", "t2", (3, 3, 0))])
+    assert not visibility.is_visible_to_team("t1", (6, 0, 0))
+    assert visibility.is_visible_to_team("t1", (0, 0, 0))
+
+
+def test_VisibilityEngine_invalidation():
+    board = BoardState([(x, 0, z) for x in range(30) for z in range(3)])
+    visibility = VisibilityEngine(board, sight_range=4)
+    near = visibility.visible_tiles((2, 0, 1))
+    far = visibility.visible_tiles((25, 0, 1))
+    visibility.update_units([("a", "t1", (2, 0, 1)), ("b", "t1", (25, 0, 1))])
+
+    # a wall next to "a" is out of sight for "b"
+    board.update_terrain(added=[(4, 3, 1)], removed=[(4, 0, 1)])
+    assert visibility.visible_tiles((25, 0, 1)) is far
+    assert visibility.visible_tiles((2, 0, 1)) != near
+    assert (6, 0, 1) not in visibility.visible_tiles((2, 0, 1))
+    assert (
+        visibility.update_units([("a", "t1", (2, 0, 1)), ("b", "t1", (25, 0, 1))]) == 1
+    )
+    assert not visibility.is_visible_to_team("t1", (6, 0, 1))